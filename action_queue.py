@@ -0,0 +1,154 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import Counter, defaultdict
+
+log = logging.getLogger(__name__)
+
+# Priorités des actions de modération : la plus petite valeur passe en premier
+BAN = 0
+DELETE = 1
+ALERT = 2
+NOTICE = 3
+ACTION_NAMES = {BAN: "ban", DELETE: "delete", ALERT: "alert", NOTICE: "notice"}
+
+class ModerationQueue:
+    """File partagée des appels REST de modération (bannissements, suppressions, alertes, avertissements).
+
+    - Les actions sont exécutées par ordre de priorité (ban > delete > alert > notice),
+      puis par ordre d'arrivée.
+    - Une action portant une clé de regroupement déjà vue depuis moins de
+      coalesce_window secondes est ignorée (une seule alerte ou un seul
+      avertissement par utilisateur pendant un raid). Avec pending_only, la clé
+      n'est retenue que tant que l'action n'a pas commencé : l'action en attente
+      traite alors aussi le travail des soumissions regroupées.
+    - Une seule action à la fois par bucket (salon, serveur) : les suivantes
+      attendent leur tour sans occuper de worker, afin qu'un salon limité par
+      Discord ne retarde pas les bannissements.
+    - La durée d'exécution de chaque action est transmise à perf, s'il est fourni.
+    """
+
+    def __init__(self, workers=4, coalesce_window=10, perf=None):
+        self.workers = workers
+        self.perf = perf
+        self.coalesce_window = coalesce_window
+        self.queue = asyncio.PriorityQueue()
+        self._sequence = itertools.count()
+        self._tasks = []
+        self._recent_keys = {}  # {clé de regroupement: instant de la dernière soumission}
+        self._pending_keys = set()  # clés pending_only des actions pas encore commencées
+        self._busy_buckets = set()
+        self._waiting = defaultdict(list)  # {bucket: tas des actions en attente}
+
+        self.submitted = Counter()
+        self.coalesced = Counter()
+        self.completed = Counter()
+        self.failed = Counter()
+        self.latency_total = Counter()  # secondes, de la soumission à la fin de l'action
+        self.latency_max = Counter()
+
+    def submit(self, priority, action, coalesce_key=None, bucket=None, pending_only=False):
+        """Planifie `action` (fonction sans argument renvoyant une coroutine).
+
+        Renvoie False si l'action a été regroupée avec une action récente (ou encore en attente, si pending_only).
+        """
+        now = time.monotonic()
+        pending_key = None
+        if pending_only:
+            if coalesce_key in self._pending_keys:
+                self.coalesced[priority] += 1
+                return False
+            self._pending_keys.add(coalesce_key)
+            pending_key = coalesce_key
+        elif coalesce_key is not None:
+            last = self._recent_keys.get(coalesce_key)
+            if last is not None and now - last < self.coalesce_window:
+                self.coalesced[priority] += 1
+                return False
+            self._recent_keys[coalesce_key] = now
+            if len(self._recent_keys) > 10000:
+                self._prune_keys(now)
+
+        self._start_workers()
+        self.submitted[priority] += 1
+        self.queue.put_nowait((priority, next(self._sequence), now, bucket, action, pending_key))
+        return True
+
+    def _prune_keys(self, now):
+        self._recent_keys = {key: last for key, last in self._recent_keys.items() if now - last < self.coalesce_window}
+
+    def _start_workers(self):
+        if not self._tasks:
+            loop = asyncio.get_running_loop()
+            self._tasks = [loop.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def _worker(self):
+        while True:
+            item = await self.queue.get()
+            priority, _, queued_at, bucket, action, pending_key = item
+            if bucket is not None and bucket in self._busy_buckets:
+                heapq.heappush(self._waiting[bucket], item)
+                self.queue.task_done()
+                continue
+
+            if bucket is not None:
+                self._busy_buckets.add(bucket)
+            if pending_key is not None:
+                self._pending_keys.discard(pending_key)
+            start = time.perf_counter()
+            try:
+                await action()
+                self.completed[priority] += 1
+            except Exception as e:
+                self.failed[priority] += 1
+                log.error("Action de modération '%s' échouée : %s", ACTION_NAMES[priority], e)
+            finally:
+                if self.perf is not None:
+                    self.perf.observe(f"action:{ACTION_NAMES[priority]}", time.perf_counter() - start)
+                latency = time.monotonic() - queued_at
+                self.latency_total[priority] += latency
+                self.latency_max[priority] = max(self.latency_max[priority], latency)
+                if bucket is not None:
+                    self._release(bucket)
+                self.queue.task_done()
+
+    def _release(self, bucket):
+        """Libère un bucket et remet en file sa prochaine action en attente."""
+        self._busy_buckets.discard(bucket)
+        waiting = self._waiting.get(bucket)
+        if waiting:
+            self.queue.put_nowait(heapq.heappop(waiting))
+            if not waiting:
+                del self._waiting[bucket]
+
+    def depth(self):
+        """Nombre d'actions en attente (file principale et buckets occupés)."""
+        return self.queue.qsize() + sum(len(waiting) for waiting in self._waiting.values())
+
+    def stats(self):
+        """Profondeur de la file et statistiques par type d'action."""
+        actions = {}
+        for priority, name in ACTION_NAMES.items():
+            done = self.completed[priority] + self.failed[priority]
+            actions[name] = {
+                "submitted": self.submitted[priority],
+                "coalesced": self.coalesced[priority],
+                "completed": self.completed[priority],
+                "failed": self.failed[priority],
+                "avg_latency": self.latency_total[priority] / done if done else 0.0,
+                "max_latency": self.latency_max[priority],
+            }
+        return {"depth": self.depth(), "actions": actions}
+
+    async def join(self):
+        """Attend que toutes les actions planifiées soient terminées."""
+        await self.queue.join()
+
+    async def close(self):
+        """Arrête les workers (les actions en attente sont abandonnées)."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
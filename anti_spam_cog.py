@@ -1,9 +1,39 @@
 import discord
 from discord import app_commands
-from discord.ext import commands
-import sqlite3
-from datetime import datetime, timedelta
+from discord.ext import commands, tasks
+import asyncio
+import itertools
+import logging
+import os
+import time
 from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from action_queue import ALERT, BAN, DELETE, NOTICE
+from near_duplicate import NearDuplicateIndex, minhash
+from raid_sketch import RaidSketch
+from snapshot import (
+    SNAPSHOT_DIR, SNAPSHOT_INTERVAL, SnapshotFile, decode_near_duplicates, decode_spam_windows, encode_blocks,
+    encode_near_duplicates, encode_spam_windows, wall_offset,
+)
+from spam_window import SpamRecord, SpamTracker
+from storage import SPAM_CONFIG_COLUMNS
+
+log = logging.getLogger(__name__)
+
+# Configuration par défaut : 3 messages, 10 secondes, désactivé, pas de salon, pas de rôle, max 5 salons avant ban,
+# seuil de similarité de 1.0 (seuls les messages identiques sont comptés), détection de raid désactivée
+DEFAULT_SPAM_CONFIG = (3, 10, False, None, None, 5, 1.0, 0)
+
+# Discord n'accepte la suppression groupée que pour 2 à 100 messages de moins de 14 jours
+BULK_DELETE_LIMIT = 100
+BULK_DELETE_MAX_AGE = timedelta(days=14)
+
+# Nombre maximum d'utilisateurs suivis simultanément (les moins récents sont évincés au-delà)
+MAX_TRACKED_USERS = int(os.getenv("ANTI_SPAM_MAX_TRACKED_USERS", "50000"))
+# Messages attendus par fenêtre sur un serveur : dimensionne les compteurs de détection de raid (RaidSketch)
+RAID_EXPECTED_MESSAGES = int(os.getenv("ANTI_SPAM_RAID_EXPECTED_MESSAGES", "1024"))
+# Fenêtres copiées entre deux retours à la boucle d'événements pendant la sauvegarde périodique
+SNAPSHOT_CHUNK = 1000
 
 # Vérification pour administrateurs uniquement
 def admin_only():
@@ -14,186 +44,344 @@ def admin_only():
 class AntiSpam(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.user_messages = defaultdict(lambda: defaultdict(list))  # {server_id: {user_id: [(message_content, message, timestamp)]}}
-        self.conn = sqlite3.connect("anti_spam_config.db")
-        self.cursor = self.conn.cursor()
-
-        # Création de la table pour les paramètres anti-spam au niveau serveur
-        self.cursor.execute("""
-            CREATE TABLE IF NOT EXISTS spam_config (
-                server_id INTEGER PRIMARY KEY,
-                spam_limit INTEGER DEFAULT 3,
-                time_window INTEGER DEFAULT 10,
-                is_enabled BOOLEAN DEFAULT 0,
-                alert_channel_id INTEGER,
-                staff_role_id INTEGER,
-                max_channels_before_ban INTEGER DEFAULT 4
-            )
-        """)
-        self.conn.commit()
+        self.queue = bot.moderation_queue
+        self.user_messages = SpamTracker(MAX_TRACKED_USERS)  # {(server_id, user_id): SpamWindow}
+        # Fenêtres et index des quasi-doublons enregistrés avant le dernier arrêt, repris serveur par serveur
+        # au premier message. Les esquisses de raid ne sont pas sauvegardées : elles se reconstruisent en une période.
+        self.snapshot = SnapshotFile(os.path.join(SNAPSHOT_DIR, "anti_spam.snap"))
+        self.near_snapshot = SnapshotFile(os.path.join(SNAPSHOT_DIR, "anti_spam_lsh.snap"))
+        self.storage = bot.storage
+
+        # Index LSH des messages récents par serveur, pour les quasi-doublons : {server_id: NearDuplicateIndex}
+        self.near_duplicates = {}
+
+        # Messages de spam à supprimer, par utilisateur, en attendant l'exécution de la suppression : {(server_id, user_id): [SpamRecord]}
+        self.pending_deletes = {}
+
+        # Détection des raids coordonnés : {server_id: RaidSketch} et {(server_id, empreinte): instant de l'alerte}
+        self.raid_sketches = {}
+        self.raid_alerts = {}
+
+        # Cache en mémoire des configurations, chargé une seule fois dans cog_load : {server_id: config}
+        self.config_cache = {}
+        self.config_cache_hits = 0
+        self.config_cache_misses = 0
+
+    async def load_config_cache(self):
+        """Charge toutes les configurations anti-spam en mémoire."""
+        self.config_cache = await self.storage.load_spam_configs()
 
     def get_server_config(self, server_id):
-        """Récupère la configuration anti-spam pour un serveur."""
-        self.cursor.execute(
-            "SELECT spam_limit, time_window, is_enabled, alert_channel_id, staff_role_id, max_channels_before_ban FROM spam_config WHERE server_id = ?",
-            (server_id,),
-        )
-        config = self.cursor.fetchone()
+        """Récupère la configuration anti-spam pour un serveur (depuis le cache, sans accès disque)."""
+        config = self.config_cache.get(server_id)
         if config is None:
-            # Si la configuration n'existe pas encore, la créer avec des valeurs par défaut
-            self.cursor.execute(
-                "INSERT INTO spam_config (server_id) VALUES (?)",
-                (server_id,),
-            )
-            self.conn.commit()
-            return 3, 10, False, None, None, 5  # Par défaut : 3 messages, 10 secondes, désactivé, pas de salon, max 5 salons avant ban
+            # Serveur jamais configuré : valeurs par défaut, sans écriture en base
+            self.config_cache_misses += 1
+            config = self.config_cache[server_id] = DEFAULT_SPAM_CONFIG
+        else:
+            self.config_cache_hits += 1
         return config
 
-    def update_server_config(self, server_id, **kwargs):
+    async def update_server_config(self, server_id, **kwargs):
         """Mise à jour des paramètres anti-spam d'un serveur."""
-        self.cursor.execute(
-            "SELECT 1 FROM spam_config WHERE server_id = ?",
-            (server_id,),
-        )
-        if self.cursor.fetchone() is None:
-            # Insérer une configuration par défaut si elle n'existe pas
-            self.cursor.execute(
-                "INSERT INTO spam_config (server_id) VALUES (?)",
-                (server_id,),
-            )
-            self.conn.commit()
-
-        # Mise à jour des paramètres existants
+        # Le cache est modifié immédiatement ; la ligne complète est écrite en différé par le stockage
+        config = list(self.config_cache.get(server_id, DEFAULT_SPAM_CONFIG))
         for key, value in kwargs.items():
             if value is not None:
-                self.cursor.execute(
-                    f"UPDATE spam_config SET {key} = ? WHERE server_id = ?",
-                    (value, server_id),
-                )
-        self.conn.commit()
+                config[SPAM_CONFIG_COLUMNS.index(key)] = value
+        self.config_cache[server_id] = tuple(config)
+        await self.storage.set_spam_config(server_id, config)
 
-    @commands.Cog.listener()
-    async def on_message(self, message):
-        if message.author.bot:
-            return
+    async def process_message(self, context):
+        """Étape du pipeline : détecte les spammeurs et les raids coordonnés."""
+        message = context.message
 
         # Récupérer la configuration pour le serveur
-        spam_limit, time_window, is_enabled, alert_channel_id, staff_role_id, max_channels_before_ban = self.get_server_config(message.guild.id)
+        spam_limit, time_window, is_enabled, alert_channel_id, staff_role_id, max_channels_before_ban, similarity_threshold, raid_author_threshold = self.get_server_config(context.guild_id)
 
         if not is_enabled:
-            return  # Anti-spam désactivé pour ce serveur
+            return False  # Anti-spam désactivé pour ce serveur
+
+        user_id = context.author_id
+        server_id = context.guild_id
+        now = time.monotonic()
 
-        user_id = message.author.id
-        server_id = message.guild.id
-        now = datetime.utcnow()
+        if server_id in self.snapshot or server_id in self.near_snapshot:
+            self.restore_snapshot(server_id, now, time_window)
 
-        # Filtrer les messages récents dans la période définie
-        self.user_messages[server_id][user_id] = [
-            (msg_content, msg_obj, timestamp)
-            for msg_content, msg_obj, timestamp in self.user_messages[server_id][user_id]
-            if now - timestamp <= timedelta(seconds=time_window)
-        ]
+        # La détection de raid ne produit qu'une alerte : inutile sans salon d'alerte
+        if raid_author_threshold > 0 and alert_channel_id:
+            self.check_raid(context, now, time_window, raid_author_threshold, alert_channel_id, staff_role_id)
 
-        # Ajouter le message actuel
-        self.user_messages[server_id][user_id].append((message.content, message, now))
+        # Retirer les messages sortis de la fenêtre, puis ajouter le message actuel
+        window = self.user_messages.window(server_id, user_id)
+        window.expire(now, time_window)
+        digest = context.content_hash
+        record = SpamRecord(message.id, context.channel_id, digest, now)
+        identical_count = window.add(record)
 
-        # Compter les messages identiques
-        identical_messages = [
-            (msg_obj, msg_obj.channel) for msg_content, msg_obj, _ in self.user_messages[server_id][user_id]
-            if msg_content == message.content
-        ]
+        if similarity_threshold < 1 and context.normalized:
+            # Quasi-doublons : recherche LSH parmi les messages récents du serveur. Les messages vides une fois
+            # normalisés (ponctuation, emojis) ne se ressemblent pas entre eux : seuls les identiques comptent.
+            index = self.near_duplicates.get(server_id)
+            if index is None:
+                index = self.near_duplicates[server_id] = NearDuplicateIndex()
+            index.expire(now, time_window)
+            signature = minhash(context.normalized)
+            identical_messages = index.similar(user_id, signature, similarity_threshold)
+            identical_messages.append(record)
+            index.add(user_id, record, signature)
+        elif identical_count > spam_limit:
+            identical_messages = window.matching(digest)
+        else:
+            identical_messages = []
 
         if len(identical_messages) > spam_limit:
-            # Supprimer tous les messages identiques, y compris les 3 premiers
-            for msg_to_delete, _ in identical_messages:
-                try:
-                    await msg_to_delete.delete()
-                except discord.Forbidden:
-                    print("ERREUR - Permissions insuffisantes pour supprimer un message.")
-                except discord.HTTPException as e:
-                    print(f"ERREUR - Problème lors de la suppression : {e}")
+            # Supprimer tous les messages identiques, y compris les 3 premiers, sauf ceux dont la suppression est déjà demandée.
+            # Une suppression encore en attente pour cet utilisateur reprend les nouveaux messages.
+            guild = message.guild
+            to_delete = [record for record in identical_messages if not record.deleted]
+            if to_delete:
+                for record in to_delete:
+                    record.deleted = True
+                key = (server_id, user_id)
+                self.pending_deletes.setdefault(key, []).extend(to_delete)
+                self.queue.submit(
+                    DELETE,
+                    lambda: self.delete_spam(guild, key),
+                    coalesce_key=("spam_delete", server_id, user_id),
+                    pending_only=True,
+                )
 
             # Construire la liste des salons
-            spam_channels = {channel.mention for _, channel in identical_messages}
+            spam_channels = {f"<#{record.channel_id}>" for record in identical_messages}
 
             # Préparer la mention du rôle
             staff_mention = f"<@&{staff_role_id}>" if staff_role_id else "le staff"
 
             # Si l'utilisateur a spammé dans plus de max_channels_before_ban salons, expulsion et bannissement
             if len(spam_channels) > max_channels_before_ban:
-                try:
-                    await message.guild.ban(message.author, reason="Spam détecté dans plusieurs salons")
-                    if alert_channel_id:
-                        alert_channel = message.guild.get_channel(alert_channel_id)
-                        if alert_channel:
-                            await alert_channel.send(
-                                f"🔔 **Alerte anti-spam** 🔔\n"
-                                f"{staff_mention}, l'utilisateur {message.author.mention} a été **banni** pour spam dans **{len(spam_channels)} salons**.\n"
-                                f"Message répété : `{message.content}`\n"
-                                f"Salons concernés : {', '.join(spam_channels)}"
-                            )
-                except discord.Forbidden:
-                    print("ERREUR - Impossible de bannir l'utilisateur.")
-                except discord.HTTPException as e:
-                    print(f"ERREUR - Problème lors du bannissement : {e}")
-            else:
-                # Envoyer une alerte au staff
-                if alert_channel_id:
-                    alert_channel = message.guild.get_channel(alert_channel_id)
-                    if alert_channel:
-                        await alert_channel.send(
-                            f"🔔 **Alerte anti-spam** 🔔\n"
-                            f"{staff_mention}, une activité suspecte a été détectée.\n"
-                            f"**Utilisateur** : {message.author.mention} (`{message.author.id}`)\n"
-                            f"**Message répété** : `{message.content}`\n"
-                            f"**Salons concernés** : {', '.join(spam_channels)}\n"
-                            f"Veuillez vérifier l'activité de cet utilisateur."
-                        )
-
-            await message.channel.send(
-                f"{message.author.mention}, vous êtes détecté comme spammeur. Veuillez ralentir.",
-                delete_after=4,
+                ban_alert = (
+                    f"🔔 **Alerte anti-spam** 🔔\n"
+                    f"{staff_mention}, l'utilisateur {message.author.mention} a été **banni** pour spam dans **{len(spam_channels)} salons**.\n"
+                    f"Message répété : `{message.content}`\n"
+                    f"Salons concernés : {', '.join(spam_channels)}"
+                )
+                self.queue.submit(
+                    BAN,
+                    lambda: self.ban_spammer(guild, message.author, alert_channel_id, ban_alert),
+                    coalesce_key=("ban", server_id, user_id),
+                    bucket=("guild", server_id),
+                )
+            elif alert_channel_id:
+                # Envoyer une alerte au staff (sans salon d'alerte configuré, rien à envoyer)
+                spam_alert = (
+                    f"🔔 **Alerte anti-spam** 🔔\n"
+                    f"{staff_mention}, une activité suspecte a été détectée.\n"
+                    f"**Utilisateur** : {message.author.mention} (`{message.author.id}`)\n"
+                    f"**Message répété** : `{message.content}`\n"
+                    f"**Salons concernés** : {', '.join(spam_channels)}\n"
+                    f"Veuillez vérifier l'activité de cet utilisateur."
+                )
+                self.queue.submit(
+                    ALERT,
+                    lambda: self.send_alert(guild, alert_channel_id, spam_alert),
+                    coalesce_key=("spam_alert", server_id, user_id),
+                    bucket=("channel", alert_channel_id),
+                )
+
+            channel = message.channel
+            self.queue.submit(
+                NOTICE,
+                lambda: channel.send(
+                    f"{message.author.mention}, vous êtes détecté comme spammeur. Veuillez ralentir.",
+                    delete_after=4,
+                ),
+                coalesce_key=("spam_notice", server_id, user_id),
+                bucket=("channel", channel.id),
             )
+            return True
+        return False
+
+    async def send_alert(self, guild, alert_channel_id, content):
+        """Envoie une alerte dans le salon d'alerte configuré, s'il existe."""
+        if not alert_channel_id:
+            return
+        alert_channel = guild.get_channel(alert_channel_id)
+        if alert_channel:
+            await alert_channel.send(content)
+
+    def check_raid(self, context, now, time_window, raid_author_threshold, alert_channel_id, staff_role_id):
+        """Signale un même message publié par de nombreux comptes différents dans la fenêtre."""
+        if not context.normalized:
+            return
+        message = context.message
+        server_id = context.guild_id
+        sketch = self.raid_sketches.get(server_id)
+        if sketch is None or sketch.time_window != max(time_window, 1) or sketch.author_threshold != raid_author_threshold:
+            sketch = self.raid_sketches[server_id] = RaidSketch(max(time_window, 1), raid_author_threshold, RAID_EXPECTED_MESSAGES)
+        fingerprint = context.normalized_hash
+        authors = sketch.add(now, fingerprint, context.author_id)
+        if authors < raid_author_threshold:
+            return
+
+        # Une seule alerte par message répété et par fenêtre
+        alert_key = (server_id, fingerprint)
+        alerted_at = self.raid_alerts.get(alert_key)
+        if alerted_at is not None and now - alerted_at < time_window:
+            return
+        self.raid_alerts[alert_key] = now
+
+        staff_mention = f"<@&{staff_role_id}>" if staff_role_id else "le staff"
+        raid_alert = (
+            f"🚨 **Alerte raid** 🚨\n"
+            f"{staff_mention}, le même message a été publié par au moins **{authors} comptes différents** en {time_window} secondes.\n"
+            f"**Dernier salon** : {message.channel.mention}\n"
+            f"**Message répété** : `{message.content}`\n"
+            f"Veuillez vérifier s'il s'agit d'un raid coordonné."
+        )
+        guild = message.guild
+        self.queue.submit(
+            ALERT,
+            lambda: self.send_alert(guild, alert_channel_id, raid_alert),
+            bucket=("channel", alert_channel_id),
+        )
+
+    async def delete_spam(self, guild, key):
+        """Supprime les messages en attente d'un utilisateur et journalise le coût de l'incident."""
+        user_id = key[1]
+        records = self.pending_deletes.pop(key, [])
+        if not records:
+            return
+        rest_calls = await self.delete_records(guild, records)
+        log.info("Spam supprimé pour %s sur le serveur %s : %d messages en %d appels REST", user_id, guild.id, len(records), rest_calls)
+
+    async def ban_spammer(self, guild, member, alert_channel_id, alert):
+        """Bannit un spammeur puis prévient le staff."""
+        try:
+            await guild.ban(member, reason="Spam détecté dans plusieurs salons")
+        except discord.Forbidden:
+            log.error("Impossible de bannir l'utilisateur %s sur le serveur %s : permissions insuffisantes.", member.id, guild.id)
+            return
+        except discord.HTTPException as e:
+            log.error("Problème lors du bannissement de %s sur le serveur %s : %s", member.id, guild.id, e)
+            return
+        if alert_channel_id:
+            self.queue.submit(ALERT, lambda: self.send_alert(guild, alert_channel_id, alert), bucket=("channel", alert_channel_id))
+
+    async def delete_records(self, guild, records):
+        """Supprime les messages par salon, en lots de 100 envoyés en parallèle.
+
+        Renvoie le nombre d'appels REST effectués.
+        """
+        by_channel = defaultdict(list)
+        for record in records:
+            by_channel[record.channel_id].append(record.message_id)
+
+        results = await asyncio.gather(*(
+            self.delete_channel_messages(guild.get_channel_or_thread(channel_id), message_ids)
+            for channel_id, message_ids in by_channel.items()
+        ))
+        return sum(results)
+
+    async def delete_channel_messages(self, channel, message_ids):
+        """Supprime des messages d'un même salon et renvoie le nombre d'appels REST."""
+        if channel is None:
+            return 0
+
+        # Les messages trop anciens ne peuvent être supprimés qu'un par un
+        oldest_allowed = datetime.now(timezone.utc) - BULK_DELETE_MAX_AGE
+        bulk_ids = []
+        single_ids = []
+        for message_id in message_ids:
+            if discord.utils.snowflake_time(message_id) > oldest_allowed:
+                bulk_ids.append(message_id)
+            else:
+                single_ids.append(message_id)
+
+        rest_calls = 0
+        for start in range(0, len(bulk_ids), BULK_DELETE_LIMIT):
+            batch = bulk_ids[start:start + BULK_DELETE_LIMIT]
+            if len(batch) == 1:
+                single_ids.extend(batch)
+                continue
+            rest_calls += 1
+            try:
+                await channel.delete_messages([discord.Object(id=message_id) for message_id in batch])
+            except discord.Forbidden:
+                log.error("Permissions insuffisantes pour supprimer des messages dans le salon %s.", channel.id)
+                return rest_calls
+            except discord.HTTPException as e:
+                log.warning("Suppression groupée refusée dans le salon %s, suppression individuelle : %s", channel.id, e)
+                single_ids.extend(batch)
+
+        for message_id in single_ids:
+            rest_calls += 1
+            try:
+                await channel.get_partial_message(message_id).delete()
+            except discord.NotFound:
+                pass
+            except discord.Forbidden:
+                log.error("Permissions insuffisantes pour supprimer un message dans le salon %s.", channel.id)
+                return rest_calls
+            except discord.HTTPException as e:
+                log.error("Problème lors de la suppression du message %s : %s", message_id, e)
+        return rest_calls
 
     @app_commands.command(name="set_spam_limit", description="Définit la limite de messages similaires pour tout le serveur.")
     @admin_only()
     async def set_spam_limit(self, interaction: discord.Interaction, limit: int):
-        self.update_server_config(interaction.guild.id, spam_limit=limit)
+        await self.update_server_config(interaction.guild.id, spam_limit=limit)
         await interaction.response.send_message(f"La limite de messages similaires a été fixée à {limit} pour ce serveur.", ephemeral=True)
 
     @app_commands.command(name="set_spam_timeframe", description="Définit la période de temps pour l'anti-spam.")
     @admin_only()
     async def set_spam_timeframe(self, interaction: discord.Interaction, seconds: int):
-        self.update_server_config(interaction.guild.id, time_window=seconds)
+        await self.update_server_config(interaction.guild.id, time_window=seconds)
         await interaction.response.send_message(f"La période de temps pour l'anti-spam a été fixée à {seconds} secondes pour ce serveur.", ephemeral=True)
 
     @app_commands.command(name="set_spam_alert_channel", description="Définit le salon pour les alertes anti-spam.")
     @admin_only()
     async def set_spam_alert_channel(self, interaction: discord.Interaction, channel: discord.TextChannel):
-        self.update_server_config(interaction.guild.id, alert_channel_id=channel.id)
+        await self.update_server_config(interaction.guild.id, alert_channel_id=channel.id)
         await interaction.response.send_message(f"Le salon d'alerte anti-spam a été défini sur {channel.mention}.", ephemeral=True)
 
     @app_commands.command(name="set_staff_role", description="Définit le rôle à mentionner pour les alertes anti-spam.")
     @admin_only()
     async def set_staff_role(self, interaction: discord.Interaction, role: discord.Role):
-        self.update_server_config(interaction.guild.id, staff_role_id=role.id)
+        await self.update_server_config(interaction.guild.id, staff_role_id=role.id)
         await interaction.response.send_message(f"Le rôle mentionné pour les alertes anti-spam est maintenant {role.mention}.", ephemeral=True)
 
     @app_commands.command(name="set_max_channels_before_ban", description="Définit le nombre maximum de salons avant bannissement.")
     @admin_only()
     async def set_max_channels_before_ban(self, interaction: discord.Interaction, max_channels: int):
-        self.update_server_config(interaction.guild.id, max_channels_before_ban=max_channels)
+        await self.update_server_config(interaction.guild.id, max_channels_before_ban=max_channels)
         await interaction.response.send_message(
             f"Le nombre maximum de salons avant bannissement a été fixé à {max_channels}.", ephemeral=True
         )
 
+    @app_commands.command(name="set_raid_threshold", description="Définit le nombre de comptes distincts publiant le même message avant une alerte de raid (0 pour désactiver).")
+    @admin_only()
+    async def set_raid_threshold(self, interaction: discord.Interaction, authors: int):
+        if authors < 0:
+            await interaction.response.send_message("Erreur : le seuil de raid doit être positif (0 pour désactiver).", ephemeral=True)
+            return
+        await self.update_server_config(interaction.guild.id, raid_author_threshold=authors)
+        if authors:
+            await interaction.response.send_message(f"Une alerte de raid sera envoyée dès que {authors} comptes différents publient le même message.", ephemeral=True)
+        else:
+            await interaction.response.send_message("La détection de raid a été désactivée pour ce serveur.", ephemeral=True)
+
     @app_commands.command(name="show_spam_config", description="Affiche la configuration anti-spam pour le serveur.")
     @admin_only()
     async def show_spam_config(self, interaction: discord.Interaction):
-        spam_limit, time_window, is_enabled, alert_channel_id, staff_role_id, max_channels_before_ban = self.get_server_config(interaction.guild.id)
+        spam_limit, time_window, is_enabled, alert_channel_id, staff_role_id, max_channels_before_ban, similarity_threshold, raid_author_threshold = self.get_server_config(interaction.guild.id)
         status = "activé" if is_enabled else "désactivé"
         alert_channel = f"<#{alert_channel_id}>" if alert_channel_id else "Aucun"
         staff_role = f"<@&{staff_role_id}>" if staff_role_id else "Aucun"
+        stats = self.user_messages.stats()
+        queue_stats = self.queue.stats()
+        storage_stats = self.storage.stats()
         await interaction.response.send_message(
             f"Configuration anti-spam pour ce serveur :\n"
             f"Limite : {spam_limit}\n"
@@ -201,24 +389,144 @@ class AntiSpam(commands.Cog):
             f"Statut : {status}\n"
             f"Salon d'alerte : {alert_channel}\n"
             f"Rôle mentionné : {staff_role}\n"
-            f"Nombre de salons avant bannissement : {max_channels_before_ban}",
+            f"Nombre de salons avant bannissement : {max_channels_before_ban}\n"
+            f"Seuil de similarité : {similarity_threshold:.0%}\n"
+            f"Seuil de raid : {f'{raid_author_threshold} comptes' if raid_author_threshold else 'désactivé'}\n"
+            f"Cache de configuration : {self.config_cache_hits} succès / {self.config_cache_misses} échecs\n"
+            f"Utilisateurs suivis : {stats['users']} ({stats['records']} messages, ~{stats['bytes'] // 1024} Kio, {stats['evicted']} évincés)\n"
+            f"File de modération : {queue_stats['depth']} action(s) en attente, "
+            f"{sum(action['coalesced'] for action in queue_stats['actions'].values())} regroupée(s)\n"
+            f"Stockage : {storage_stats['calls']} transactions, {storage_stats['worker_ms']:.1f} ms d'exécution, "
+            f"{storage_stats['loop_ms']:.2f} ms de blocage de la boucle, {storage_stats['pending']} modification(s) en attente d'écriture",
             ephemeral=True,
         )
 
     @app_commands.command(name="enable_anti_spam", description="Active l'anti-spam pour tout le serveur.")
     @admin_only()
     async def enable_anti_spam(self, interaction: discord.Interaction):
-        self.update_server_config(interaction.guild.id, is_enabled=True)
+        await self.update_server_config(interaction.guild.id, is_enabled=True)
         await interaction.response.send_message("L'anti-spam a été activé pour ce serveur.", ephemeral=True)
 
     @app_commands.command(name="disable_anti_spam", description="Désactive l'anti-spam pour tout le serveur.")
     @admin_only()
     async def disable_anti_spam(self, interaction: discord.Interaction):
-        self.update_server_config(interaction.guild.id, is_enabled=False)
+        await self.update_server_config(interaction.guild.id, is_enabled=False)
         await interaction.response.send_message("L'anti-spam a été désactivé pour ce serveur.", ephemeral=True)
 
-    def cog_unload(self):
-        self.conn.close()
+    async def cog_load(self):
+        await self.load_config_cache()
+        self.snapshot.open()
+        self.near_snapshot.open()
+        if any(config[7] for config in self.config_cache.values()):
+            log.info("Détection de raid : compteurs non sauvegardés, reconstruits pendant la première période de chaque serveur.")
+        self.bot.pipeline.register("anti_spam", self.process_message)
+        self.sweep_user_messages.start()
+        self.save_snapshot.start()
+
+    def restore_snapshot(self, server_id, now, time_window):
+        """Reprend les fenêtres et l'index des quasi-doublons d'un serveur enregistrés avant le redémarrage (messages expirés ignorés)."""
+        offset = wall_offset()
+        cutoff = now - time_window
+        restored = {}  # {message_id: SpamRecord} : l'index LSH partage les messages des fenêtres
+        data = self.snapshot.take(server_id) if server_id in self.snapshot else None
+        if data is not None:
+            for user_id, records in decode_spam_windows(data, offset):
+                records = [record for record in records if record.timestamp >= cutoff]
+                if records:
+                    window = self.user_messages.window(server_id, user_id)
+                    for record in records:
+                        window.add(record)
+                        restored[record.message_id] = record
+        data = self.near_snapshot.take(server_id) if server_id in self.near_snapshot else None
+        if data is not None:
+            entries = [entry for entry in decode_near_duplicates(data, offset) if entry[1].timestamp >= cutoff]
+            if entries:
+                index = self.near_duplicates.setdefault(server_id, NearDuplicateIndex())
+                for author_id, record, signature in entries:
+                    index.add(author_id, restored.get(record.message_id, record), tuple(signature))
+
+    def collect_windows(self, windows_by_server):
+        """Copie les fenêtres non vides par serveur ; s'interrompt (yield) toutes les SNAPSHOT_CHUNK fenêtres."""
+        items = list(self.user_messages.windows.items())
+        for start in range(0, len(items), SNAPSHOT_CHUNK):
+            for (server_id, user_id), window in items[start:start + SNAPSHOT_CHUNK]:
+                if window:
+                    windows_by_server.setdefault(server_id, []).append((user_id, tuple(window.entries)))
+            yield
+
+    def collect_near_duplicates(self, entries_by_server):
+        """Copie les index LSH non vides par serveur ; s'interrompt (yield) après chaque serveur."""
+        for server_id, index in list(self.near_duplicates.items()):
+            if index:
+                entries_by_server[server_id] = [(entry.author_id, entry.record, entry.signature) for entry in index.entries]
+                yield
+
+    def expiring_blocks(self, states_by_server, offset, last_timestamp):
+        """{server_id: (état, expiration en temps réel)} : un bloc expire une période après son dernier message."""
+        return {
+            server_id: (states, last_timestamp(states) + offset + self.config_cache.get(server_id, DEFAULT_SPAM_CONFIG)[1])
+            for server_id, states in states_by_server.items()
+        }
+
+    async def snapshot_state(self, offset, incremental=True):
+        """Copie des fenêtres et des index LSH : ({server_id: ([(user_id, messages)], expiration)},
+        {server_id: ([(author_id, message, signature)], expiration)}). En mode incrémental, la copie
+        rend la main à la boucle d'événements entre deux tranches."""
+        windows_by_server = {}
+        entries_by_server = {}
+        for _ in itertools.chain(self.collect_windows(windows_by_server), self.collect_near_duplicates(entries_by_server)):
+            if incremental:
+                await asyncio.sleep(0)
+        return (
+            self.expiring_blocks(windows_by_server, offset, lambda windows: max(records[-1].timestamp for _, records in windows)),
+            self.expiring_blocks(entries_by_server, offset, lambda entries: entries[-1][1].timestamp),
+        )
+
+    @tasks.loop(seconds=SNAPSHOT_INTERVAL)
+    async def save_snapshot(self):
+        """Sauvegarde périodique des fenêtres et des index LSH, pour reprendre après un arrêt brutal."""
+        offset = wall_offset()
+        try:
+            windows, near_duplicates = await self.snapshot_state(offset)
+            await self.snapshot.save(encode_spam_windows, windows, offset)
+            await self.near_snapshot.save(encode_near_duplicates, near_duplicates, offset)
+        except OSError as e:
+            log.error("Sauvegarde de l'instantané anti-spam : %s", e)
+
+    @save_snapshot.before_loop
+    async def before_save_snapshot(self):
+        await asyncio.sleep(SNAPSHOT_INTERVAL)
+
+    @tasks.loop(seconds=60)
+    async def sweep_user_messages(self):
+        """Libère périodiquement les fenêtres des utilisateurs inactifs."""
+        now = time.monotonic()
+        time_window_for = lambda server_id: self.config_cache.get(server_id, DEFAULT_SPAM_CONFIG)[1]
+        self.user_messages.sweep(now, time_window_for)
+        for server_id, index in list(self.near_duplicates.items()):
+            index.expire(now, time_window_for(server_id))
+            if not index:
+                del self.near_duplicates[server_id]
+        for server_id in list(self.raid_sketches):
+            if not self.config_cache.get(server_id, DEFAULT_SPAM_CONFIG)[7]:
+                del self.raid_sketches[server_id]
+        for alert_key, alerted_at in list(self.raid_alerts.items()):
+            if now - alerted_at >= time_window_for(alert_key[0]):
+                del self.raid_alerts[alert_key]
+
+    async def cog_unload(self):
+        self.bot.pipeline.unregister("anti_spam")
+        self.sweep_user_messages.cancel()
+        self.save_snapshot.cancel()
+        offset = wall_offset()
+        windows, near_duplicates = await self.snapshot_state(offset, incremental=False)
+        try:
+            self.snapshot.write(encode_blocks(encode_spam_windows, windows, offset))
+            self.near_snapshot.write(encode_blocks(encode_near_duplicates, near_duplicates, offset))
+        except OSError as e:
+            log.error("Sauvegarde de l'instantané anti-spam : %s", e)
+        self.snapshot.close()
+        self.near_snapshot.close()
 
 async def setup(bot):
     await bot.add_cog(AntiSpam(bot))
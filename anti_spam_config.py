@@ -24,7 +24,7 @@ class SpamLimitModal(discord.ui.Modal, title="Définir Limite de Messages Simila
     async def on_submit(self, interaction: discord.Interaction):
         try:
             limit = int(self.limit.value)
-            self.cog.update_server_config(interaction.guild_id, spam_limit=limit)
+            await self.cog.update_server_config(interaction.guild_id, spam_limit=limit)
             await interaction.response.send_message(f"Limite de messages similaires définie : {limit}.", ephemeral=True)
         except ValueError:
             await interaction.response.send_message("Erreur : Veuillez entrer un nombre entier.", ephemeral=True)
@@ -45,7 +45,7 @@ class SpamTimeWindowModal(discord.ui.Modal, title="Définir Période de Temps"):
     async def on_submit(self, interaction: discord.Interaction):
         try:
             time_window = int(self.time_window.value)
-            self.cog.update_server_config(interaction.guild_id, time_window=time_window)
+            await self.cog.update_server_config(interaction.guild_id, time_window=time_window)
             await interaction.response.send_message(f"Période de temps définie : {time_window} secondes.", ephemeral=True)
         except ValueError:
             await interaction.response.send_message("Erreur : Veuillez entrer un nombre entier.", ephemeral=True)
@@ -66,11 +66,60 @@ class MaxChannelsBeforeBanModal(discord.ui.Modal, title="Définir Nombre Maximum
     async def on_submit(self, interaction: discord.Interaction):
         try:
             max_channels = int(self.max_channels.value)
-            self.cog.update_server_config(interaction.guild_id, max_channels_before_ban=max_channels)
+            await self.cog.update_server_config(interaction.guild_id, max_channels_before_ban=max_channels)
             await interaction.response.send_message(f"Nombre maximum de salons défini : {max_channels}.", ephemeral=True)
         except ValueError:
             await interaction.response.send_message("Erreur : Veuillez entrer un nombre entier.", ephemeral=True)
 
+# Modal pour définir le seuil de similarité des quasi-doublons
+class SimilarityThresholdModal(discord.ui.Modal, title="Définir Seuil de Similarité"):
+    similarity_threshold = discord.ui.TextInput(
+        label="Similarité minimale (entre 0 et 1)",
+        style=discord.TextStyle.short,
+        placeholder="1 = identiques uniquement, 0.8 = quasi-doublons",
+        required=True
+    )
+
+    def __init__(self, cog):
+        super().__init__()
+        self.cog = cog
+
+    async def on_submit(self, interaction: discord.Interaction):
+        try:
+            threshold = float(self.similarity_threshold.value.replace(",", "."))
+            if not 0 < threshold <= 1:
+                raise ValueError
+            await self.cog.update_server_config(interaction.guild_id, similarity_threshold=threshold)
+            await interaction.response.send_message(f"Seuil de similarité défini : {threshold:.0%}.", ephemeral=True)
+        except ValueError:
+            await interaction.response.send_message("Erreur : Veuillez entrer un nombre entre 0 et 1.", ephemeral=True)
+
+# Modal pour définir le seuil de détection des raids coordonnés
+class RaidThresholdModal(discord.ui.Modal, title="Définir Seuil de Raid"):
+    raid_author_threshold = discord.ui.TextInput(
+        label="Nombre de comptes distincts (0 = désactivé)",
+        style=discord.TextStyle.short,
+        placeholder="Entrez un nombre entier",
+        required=True
+    )
+
+    def __init__(self, cog):
+        super().__init__()
+        self.cog = cog
+
+    async def on_submit(self, interaction: discord.Interaction):
+        try:
+            authors = int(self.raid_author_threshold.value)
+            if authors < 0:
+                raise ValueError
+            await self.cog.update_server_config(interaction.guild_id, raid_author_threshold=authors)
+            if authors:
+                await interaction.response.send_message(f"Seuil de raid défini : {authors} comptes.", ephemeral=True)
+            else:
+                await interaction.response.send_message("Détection de raid désactivée.", ephemeral=True)
+        except ValueError:
+            await interaction.response.send_message("Erreur : Veuillez entrer un nombre entier positif (0 pour désactiver).", ephemeral=True)
+
 # Modal pour définir le rôle staff
 class StaffRoleModal(discord.ui.Modal, title="Définir le Rôle Staff"):
     staff_role_id = discord.ui.TextInput(
@@ -92,7 +141,7 @@ class StaffRoleModal(discord.ui.Modal, title="Définir le Rôle Staff"):
             if not role:
                 await interaction.response.send_message("Rôle introuvable. Assurez-vous que l'ID est correct.", ephemeral=True)
                 return
-            self.cog.update_server_config(interaction.guild_id, staff_role_id=role_id)
+            await self.cog.update_server_config(interaction.guild_id, staff_role_id=role_id)
             await interaction.response.send_message(f"Le rôle Staff a été défini sur {role.mention}.", ephemeral=True)
         except ValueError:
             await interaction.response.send_message("Erreur : Veuillez entrer un ID numérique.", ephemeral=True)
@@ -118,7 +167,7 @@ class AlertChannelModal(discord.ui.Modal, title="Définir le Salon d'Alerte"):
             if not channel:
                 await interaction.response.send_message("Salon introuvable. Assurez-vous que l'ID est correct.", ephemeral=True)
                 return
-            self.cog.update_server_config(interaction.guild_id, alert_channel_id=channel_id)
+            await self.cog.update_server_config(interaction.guild_id, alert_channel_id=channel_id)
             await interaction.response.send_message(f"Le salon d'alerte a été défini sur {channel.mention}.", ephemeral=True)
         except ValueError:
             await interaction.response.send_message("Erreur : Veuillez entrer un ID numérique.", ephemeral=True)
@@ -141,6 +190,14 @@ class AntiSpamMainMenuView(discord.ui.View):
     async def set_max_channels(self, interaction: discord.Interaction, button: discord.ui.Button):
         await interaction.response.send_modal(MaxChannelsBeforeBanModal(self.cog))
 
+    @discord.ui.button(label="Définir Seuil de Similarité", style=discord.ButtonStyle.success, custom_id="set_similarity_threshold")
+    async def set_similarity_threshold(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await interaction.response.send_modal(SimilarityThresholdModal(self.cog))
+
+    @discord.ui.button(label="Définir Seuil de Raid", style=discord.ButtonStyle.success, custom_id="set_raid_threshold")
+    async def set_raid_threshold(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await interaction.response.send_modal(RaidThresholdModal(self.cog))
+
     @discord.ui.button(label="Définir le Rôle Staff", style=discord.ButtonStyle.primary, custom_id="set_staff_role")
     async def set_staff_role(self, interaction: discord.Interaction, button: discord.ui.Button):
         await interaction.response.send_modal(StaffRoleModal(self.cog))
@@ -151,17 +208,17 @@ class AntiSpamMainMenuView(discord.ui.View):
 
     @discord.ui.button(label="Activer l'Anti-Spam", style=discord.ButtonStyle.success, custom_id="enable_anti_spam")
     async def enable_anti_spam(self, interaction: discord.Interaction, button: discord.ui.Button):
-        self.cog.update_server_config(interaction.guild_id, is_enabled=True)
+        await self.cog.update_server_config(interaction.guild_id, is_enabled=True)
         await interaction.response.send_message("Anti-spam activé pour ce serveur.", ephemeral=True)
 
     @discord.ui.button(label="Désactiver l'Anti-Spam", style=discord.ButtonStyle.danger, custom_id="disable_anti_spam")
     async def disable_anti_spam(self, interaction: discord.Interaction, button: discord.ui.Button):
-        self.cog.update_server_config(interaction.guild_id, is_enabled=False)
+        await self.cog.update_server_config(interaction.guild_id, is_enabled=False)
         await interaction.response.send_message("Anti-spam désactivé pour ce serveur.", ephemeral=True)
 
     @discord.ui.button(label="Afficher Configuration", style=discord.ButtonStyle.secondary, custom_id="show_config")
     async def show_config(self, interaction: discord.Interaction, button: discord.ui.Button):
-        spam_limit, time_window, is_enabled, alert_channel_id, staff_role_id, max_channels_before_ban = self.cog.get_server_config(interaction.guild_id)
+        spam_limit, time_window, is_enabled, alert_channel_id, staff_role_id, max_channels_before_ban, similarity_threshold, raid_author_threshold = self.cog.get_server_config(interaction.guild_id)
         status = "activé" if is_enabled else "désactivé"
         alert_channel = f"<#{alert_channel_id}>" if alert_channel_id else "Aucun"
         staff_role = f"<@&{staff_role_id}>" if staff_role_id else "Aucun"
@@ -172,7 +229,9 @@ class AntiSpamMainMenuView(discord.ui.View):
             f"- Statut : {status}\n"
             f"- Salon d'alerte : {alert_channel}\n"
             f"- Rôle mentionné : {staff_role}\n"
-            f"- Salons avant bannissement : {max_channels_before_ban}",
+            f"- Salons avant bannissement : {max_channels_before_ban}\n"
+            f"- Seuil de similarité : {similarity_threshold:.0%}\n"
+            f"- Seuil de raid : {f'{raid_author_threshold} comptes' if raid_author_threshold else 'désactivé'}",
             ephemeral=True
         )
 
@@ -1,7 +1,28 @@
 import discord
 from discord import app_commands
 from discord.ext import commands
-import sqlite3
+import aiohttp
+import asyncio
+import logging
+import os
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from action_queue import DELETE, NOTICE
+from gif_identity import canonical_key, is_tenor_view, message_media_urls, tenor_page_keys
+from gif_matcher import AhoCorasick
+from gif_phash import BKTree, frame_hashes, to_signed, to_unsigned
+
+log = logging.getLogger(__name__)
+
+# Distance de Hamming maximale entre deux empreintes pour considérer deux images identiques
+PHASH_MAX_DISTANCE = int(os.getenv("BAN_GIF_PHASH_DISTANCE", "10"))
+# Nombre de fichiers dont les empreintes restent en cache, et taille maximale d'une pièce jointe analysée
+MEDIA_CACHE_SIZE = 2048
+MAX_MEDIA_BYTES = 8 * 1024 * 1024
+# Délai maximal (s) du téléchargement d'un fichier analysé
+MEDIA_TIMEOUT = 10
+# Taille maximale lue d'une page tenor.com/view/… (recherche des clés média du GIF)
+TENOR_PAGE_BYTES = 1024 * 1024
 
 # Fonction de vérification personnalisée pour autoriser les administrateurs ou les utilisateurs ayant la permission de gérer les messages
 def admin_or_manage_messages():
@@ -13,70 +34,266 @@ def admin_or_manage_messages():
 class BanGif(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.queue = bot.moderation_queue
+        self.storage = bot.storage
+
+        # GIF interdits par serveur : identifiants canoniques {server_id: Counter}, et automate
+        # de recherche pour les motifs qui ne sont pas des liens {server_id: AhoCorasick}
+        self.banned_keys = {}
+        self.matchers = {}
+        # Nombre de clés média Tenor interdites par serveur, et clés média déjà lues par lien tenor.com/view
+        self.media_key_bans = Counter()
+        self.tenor_media = OrderedDict()  # {identifiant "tenor:…": frozenset des clés "tenor-media:…"}
+
+        # Arbres BK des empreintes interdites {server_id: BKTree}, et empreintes déjà calculées par fichier
+        self.phash_trees = {}
+        self.media_hashes = OrderedDict()  # {lien du fichier sans paramètres: empreintes}
+        self.pending_hashes = {}  # {lien du fichier sans paramètres: Future}
+        self.media_checks = set()  # vérifications d'images en cours, hors du pipeline
+        self.hash_pool = ProcessPoolExecutor(max_workers=2)
+        self.session = None  # session des téléchargements bornés (créée au chargement)
+
+    async def cog_load(self):
+        """Charge les GIF interdits et leurs empreintes depuis la base."""
+        self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=MEDIA_TIMEOUT))
+        for server_id, gif_url, key in await self.storage.load_banned_gifs():
+            self.index_banned_gif(server_id, gif_url, key)
+        for server_id, source, phash in await self.storage.load_banned_gif_hashes():
+            self.phash_trees.setdefault(server_id, BKTree()).add(to_unsigned(phash), source)
+        self.bot.pipeline.register("ban_gif", self.process_message)
+
+    def index_banned_gif(self, server_id, gif_url, key):
+        """Ajoute un GIF interdit aux index en mémoire.
+
+        Les liens sans hébergeur reconnu ("url:…") restent aussi cherchés tels quels dans
+        le texte : un lien interdit comme https://example.com/ couvre ses sous-chemins.
+        """
+        if key is not None:
+            self.banned_keys.setdefault(server_id, Counter())[key] += 1
+            if key.startswith("tenor-media:"):
+                self.media_key_bans[server_id] += 1
+        if key is None or key.startswith("url:"):
+            self.matchers.setdefault(server_id, AhoCorasick()).add(gif_url)
 
-        # Connexion à la base de données pour les GIF interdits
-        self.conn = sqlite3.connect("banned_gifs.db")
-        self.cursor = self.conn.cursor()
-        
-        # Création de la table si elle n'existe pas
-        self.cursor.execute("""
-            CREATE TABLE IF NOT EXISTS banned_gifs (
-                server_id INTEGER,
-                gif_url TEXT,
-                PRIMARY KEY (server_id, gif_url)
-            )
-        """)
-        self.conn.commit()
-
-    def add_banned_gif(self, server_id, gif_url):
-        """Ajoute un GIF à la liste des GIF interdits pour un serveur."""
-        self.cursor.execute("INSERT OR IGNORE INTO banned_gifs (server_id, gif_url) VALUES (?, ?)", (server_id, gif_url))
-        self.conn.commit()
-        print(f"DEBUG - GIF interdit ajouté pour le serveur {server_id} : {gif_url}")
-
-    def remove_banned_gif(self, server_id, gif_url):
+    async def add_banned_gif(self, server_id, gif_url, aliases=()):
+        """Ajoute un GIF à la liste des GIF interdits pour un serveur, avec ses autres identifiants (resolve_aliases)."""
+        key = canonical_key(gif_url)
+        aliases = [alias for alias in aliases if alias != key]
+        if await self.storage.add_banned_gif(server_id, gif_url, key, aliases):
+            self.index_banned_gif(server_id, gif_url, key)
+            for alias in aliases:
+                self.index_banned_gif(server_id, gif_url, alias)
+        log.info("GIF interdit ajouté pour le serveur %s : %s", server_id, gif_url)
+
+    async def add_banned_gif_hashes(self, server_id, source, hashes):
+        """Interdit un fichier à partir des empreintes perceptuelles de ses images."""
+        await self.storage.add_banned_gif_hashes(server_id, source, [to_signed(phash) for phash in hashes])
+        tree = self.phash_trees.setdefault(server_id, BKTree())
+        for phash in hashes:
+            tree.add(phash, source)
+        log.info("Empreintes interdites ajoutées pour le serveur %s : %s (%d images)", server_id, source, len(hashes))
+
+    async def remove_banned_gif(self, server_id, gif_url):
         """Retire un GIF de la liste des GIF interdits pour un serveur."""
-        self.cursor.execute("DELETE FROM banned_gifs WHERE server_id = ? AND gif_url = ?", (server_id, gif_url))
-        self.conn.commit()
-        print(f"DEBUG - GIF interdit retiré pour le serveur {server_id} : {gif_url}")
+        deleted, remaining_hashes = await self.storage.remove_banned_gif(server_id, gif_url)
+        if remaining_hashes is not None:
+            # Un arbre BK ne permet pas de retirer un noeud : on le reconstruit pour ce serveur
+            self.phash_trees[server_id] = BKTree((to_unsigned(phash), source) for source, phash in remaining_hashes)
+        for key in deleted:
+            if key is not None:
+                keys = self.banned_keys[server_id]
+                keys[key] -= 1
+                if keys[key] <= 0:
+                    del keys[key]
+                if key.startswith("tenor-media:"):
+                    self.media_key_bans[server_id] -= 1
+            if key is None or key.startswith("url:"):
+                self.matchers[server_id].remove(gif_url)
+        log.info("GIF interdit retiré pour le serveur %s : %s", server_id, gif_url)
 
-    def get_banned_gifs(self, server_id):
+    async def get_banned_gifs(self, server_id):
         """Récupère la liste des GIF interdits pour un serveur."""
-        self.cursor.execute("SELECT gif_url FROM banned_gifs WHERE server_id = ?", (server_id,))
-        return [row[0] for row in self.cursor.fetchall()]
+        return await self.storage.get_banned_gifs(server_id)
+
+    async def download_media(self, url, max_bytes=MAX_MEDIA_BYTES):
+        """Télécharge un fichier en flux ; renvoie None s'il dépasse max_bytes (lecture interrompue)."""
+        async with self.session.get(url) as response:
+            response.raise_for_status()
+            if (response.content_length or 0) > max_bytes:
+                return None
+            data = bytearray()
+            async for chunk in response.content.iter_chunked(64 * 1024):
+                data += chunk
+                if len(data) > max_bytes:
+                    return None
+        return bytes(data)
+
+    async def tenor_media_keys(self, url):
+        """Clés média ("tenor-media:…") du GIF d'un lien tenor.com/view/…, lues une seule fois par GIF."""
+        key = canonical_key(url)
+        media_keys = self.tenor_media.get(key)
+        if media_keys is not None:
+            self.tenor_media.move_to_end(key)
+            return media_keys
+        media_keys = frozenset()
+        try:
+            page = await self.download_media(url, TENOR_PAGE_BYTES)
+            if page is not None:
+                media_keys = frozenset(tenor_page_keys(page.decode("utf-8", "replace")))
+        except Exception as e:
+            # Erreur passagère : rien n'est mis en cache, la page sera relue au prochain lien
+            log.warning("Impossible de lire la page Tenor %s : %s", url, e)
+            return media_keys
+        self.tenor_media[key] = media_keys
+        if len(self.tenor_media) > MEDIA_CACHE_SIZE:
+            self.tenor_media.popitem(last=False)
+        return media_keys
+
+    async def resolve_aliases(self, gif_url):
+        """Autres identifiants canoniques du même GIF : clés média d'un lien de partage Tenor."""
+        if is_tenor_view(gif_url):
+            return await self.tenor_media_keys(gif_url)
+        return frozenset()
+
+    async def matches_tenor_media(self, urls, keys):
+        """Vérifie si un lien de partage Tenor du message désigne un GIF interdit par sa clé média."""
+        for url in urls:
+            if is_tenor_view(url) and not keys.keys().isdisjoint(await self.tenor_media_keys(url)):
+                return True
+        return False
 
-    @commands.Cog.listener()
-    async def on_message(self, message):
-        if message.author.bot:
+    async def hash_media(self, url):
+        """Empreintes perceptuelles d'un fichier distant, calculées une seule fois par fichier.
+
+        Le téléchargement se fait sur la boucle d'événements (borné à MAX_MEDIA_BYTES),
+        le décodage et le calcul dans un processus séparé.
+        """
+        key = url.split("?", 1)[0]
+        hashes = self.media_hashes.get(key)
+        if hashes is not None:
+            self.media_hashes.move_to_end(key)
+            return hashes
+        pending = self.pending_hashes.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        loop = asyncio.get_running_loop()
+        future = self.pending_hashes[key] = loop.create_future()
+        hashes = ()
+        try:
+            data = await self.download_media(url)
+            if data is None:
+                log.debug("Fichier %s ignoré : plus de %d octets", url, MAX_MEDIA_BYTES)
+            else:
+                hashes = tuple(await loop.run_in_executor(self.hash_pool, frame_hashes, data))
+        except Exception as e:
+            # Erreur passagère (délai, 5xx, connexion) : rien n'est mis en cache, le fichier sera réessayé
+            log.warning("Impossible d'analyser le fichier %s : %s", url, e)
+            return hashes
+        finally:
+            del self.pending_hashes[key]
+            future.set_result(hashes)
+        self.media_hashes[key] = hashes
+        if len(self.media_hashes) > MEDIA_CACHE_SIZE:
+            self.media_hashes.popitem(last=False)
+        return hashes
+
+    async def matches_banned_media(self, message, tree):
+        """Vérifie si une image ou un GIF du message ressemble à un fichier interdit."""
+        # Les pièces jointes de taille connue trop grosses ne sont pas téléchargées
+        for url in message_media_urls(message, MAX_MEDIA_BYTES):
+            for phash in await self.hash_media(url):
+                if tree.find(phash, PHASH_MAX_DISTANCE) is not None:
+                    return True
+        return False
+
+    async def process_message(self, context):
+        """Étape du pipeline : supprime les messages contenant un GIF interdit."""
+        message = context.message
+
+        # Vérifie les identifiants canoniques des liens du message, puis les motifs libres en un seul parcours
+        keys = self.banned_keys.get(context.guild_id)
+        banned = bool(keys) and not keys.keys().isdisjoint(context.gif_keys)
+        if not banned:
+            matcher = self.matchers.get(context.guild_id)
+            banned = matcher is not None and matcher.search(context.content) is not None
+        if not banned:
+            # Pages Tenor (GIF interdit par sa clé média, posté par son lien de partage) et images :
+            # téléchargées et analysées hors du pipeline, les étapes suivantes ne les attendent pas
+            tenor_urls = [url for url in context.urls if is_tenor_view(url)] if self.media_key_bans[context.guild_id] else []
+            if tenor_urls or (self.phash_trees.get(context.guild_id) and message_media_urls(message, MAX_MEDIA_BYTES)):
+                task = asyncio.create_task(self.check_media(message, tenor_urls))
+                self.media_checks.add(task)
+                task.add_done_callback(self.media_checks.discard)
+            return False
+        self.submit_delete(message)
+        return True
+
+    async def check_media(self, message, tenor_urls):
+        """Vérifie en arrière-plan les liens de partage Tenor et les images d'un message,
+        et le supprime si l'un d'eux désigne un GIF interdit."""
+        guild_id = message.guild.id
+        try:
+            banned = bool(tenor_urls) and await self.matches_tenor_media(tenor_urls, self.banned_keys.get(guild_id) or Counter())
+            if not banned:
+                tree = self.phash_trees.get(guild_id)
+                banned = bool(tree) and await self.matches_banned_media(message, tree)
+        except Exception:
+            log.exception("Échec de l'analyse des images du message %s", message.id)
             return
+        if banned:
+            self.submit_delete(message)
 
-        # Vérifie si le message contient un GIF interdit pour le serveur
-        banned_gifs = self.get_banned_gifs(message.guild.id)
-        for gif_url in banned_gifs:
-            if gif_url in message.content:
-                try:
-                    await message.delete()
-                    await message.channel.send(f"{message.author.mention} Ce GIF est interdit sur ce serveur.", delete_after=5)
-                except discord.Forbidden:
-                    print("ERREUR - Le bot n'a pas la permission de supprimer des messages dans ce salon.")
-                except discord.HTTPException as e:
-                    print(f"ERREUR - Problème lors de la suppression du message: {e}")
-                break
+    def submit_delete(self, message):
+        self.queue.submit(DELETE, lambda: self.delete_message(message), bucket=("channel", message.channel.id))
+
+    async def delete_message(self, message):
+        """Supprime un message contenant un GIF interdit et prévient son auteur."""
+        try:
+            await message.delete()
+        except discord.Forbidden:
+            log.error("Le bot n'a pas la permission de supprimer des messages dans le salon %s.", message.channel.id)
+            return
+        except discord.HTTPException as e:
+            log.error("Problème lors de la suppression du message %s : %s", message.id, e)
+            return
+        self.queue.submit(
+            NOTICE,
+            lambda: message.channel.send(f"{message.author.mention} Ce GIF est interdit sur ce serveur.", delete_after=5),
+            coalesce_key=("ban_gif_notice", message.guild.id, message.author.id),
+            bucket=("channel", message.channel.id),
+        )
 
     @app_commands.command(name="ban_gif", description="Interdit un GIF spécifique sur le serveur")
     #@app_commands.checks.has_permissions(administrator=True)
     @admin_or_manage_messages()
-    async def ban_gif(self, interaction: discord.Interaction, gif_url: str):
-        """Interdit un GIF spécifique sur le serveur."""
-        self.add_banned_gif(interaction.guild.id, gif_url)
-        await interaction.response.send_message(f"Le GIF {gif_url} a été interdit sur ce serveur.", ephemeral=True)
+    async def ban_gif(self, interaction: discord.Interaction, gif_url: str = None, attachment: discord.Attachment = None):
+        """Interdit un GIF spécifique sur le serveur, par lien ou par fichier."""
+        if attachment is None:
+            if not gif_url:
+                await interaction.response.send_message("Veuillez indiquer le lien d'un GIF ou joindre un fichier.", ephemeral=True)
+                return
+            # La page d'un lien de partage Tenor est lue pour interdire aussi ses fichiers (clés média)
+            await interaction.response.defer(ephemeral=True)
+            await self.add_banned_gif(interaction.guild.id, gif_url, await self.resolve_aliases(gif_url))
+            await interaction.followup.send(f"Le GIF {gif_url} a été interdit sur ce serveur.", ephemeral=True)
+            return
+
+        # Fichier joint : interdiction par empreinte perceptuelle, y compris s'il est ré-encodé ou renvoyé en pièce jointe
+        await interaction.response.defer(ephemeral=True)
+        hashes = await self.hash_media(attachment.url) if attachment.size <= MAX_MEDIA_BYTES else ()
+        if not hashes:
+            await interaction.followup.send("Impossible d'analyser ce fichier. Veuillez joindre un GIF ou une image.", ephemeral=True)
+            return
+        await self.add_banned_gif_hashes(interaction.guild.id, attachment.url, hashes)
+        await interaction.followup.send(f"Le GIF {attachment.filename} a été interdit sur ce serveur.", ephemeral=True)
 
     @app_commands.command(name="unban_gif", description="Retire l'interdiction d'un GIF spécifique sur le serveur")
     #@app_commands.checks.has_permissions(administrator=True)
     @admin_or_manage_messages()
     async def unban_gif(self, interaction: discord.Interaction, gif_url: str):
         """Retire l'interdiction d'un GIF spécifique sur le serveur."""
-        self.remove_banned_gif(interaction.guild.id, gif_url)
+        await self.remove_banned_gif(interaction.guild.id, gif_url)
         await interaction.response.send_message(f"Le GIF {gif_url} n'est plus interdit sur ce serveur.", ephemeral=True)
 
     @app_commands.command(name="show_banned_gifs", description="Affiche la liste des GIF interdits sur ce serveur")
@@ -84,15 +301,21 @@ class BanGif(commands.Cog):
     @admin_or_manage_messages()
     async def show_banned_gifs(self, interaction: discord.Interaction):
         """Affiche la liste des GIF interdits sur le serveur."""
-        banned_gifs = self.get_banned_gifs(interaction.guild.id)
+        banned_gifs = await self.get_banned_gifs(interaction.guild.id)
         if banned_gifs:
             await interaction.response.send_message("GIFs interdits sur ce serveur:\n" + "\n".join(banned_gifs), ephemeral=True)
         else:
             await interaction.response.send_message("Aucun GIF interdit sur ce serveur.", ephemeral=True)
 
-    def cog_unload(self):
-        """Ferme la connexion à la base de données lors du déchargement du cog."""
-        self.conn.close()
+    async def cog_unload(self):
+        """Retire l'étape du pipeline, arrête les processus d'analyse et ferme la session de téléchargement."""
+        self.bot.pipeline.unregister("ban_gif")
+        for task in self.media_checks:
+            task.cancel()
+        await asyncio.gather(*self.media_checks, return_exceptions=True)
+        self.hash_pool.shutdown(wait=False, cancel_futures=True)
+        if self.session is not None:
+            await self.session.close()
 
 async def setup(bot):
     await bot.add_cog(BanGif(bot))
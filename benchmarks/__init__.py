@@ -0,0 +1 @@
+"""Benchmarks hors ligne des modules de modération (aucune connexion à Discord)."""
@@ -0,0 +1,193 @@
+"""Benchmark hors ligne des cogs de modération (BanGif, GifLimit, AntiSpam) sur un trafic synthétique.
+
+Les cogs sont chargés dans un vrai bot (sans connexion), configurés pour tous les
+serveurs factices, puis reçoivent les messages par le pipeline de modération. Pour
+chaque scénario : messages/s, latence par message (centiles), pic de mémoire
+(tracemalloc, mesuré dans une seconde passe) et appels REST simulés. Les résultats
+sont écrits en JSON ; --compare affiche l'écart avec un fichier précédent.
+
+Usage : python -m benchmarks.bench_cogs [--scenario all] [--messages 20000] [--guilds 20] [--ban-list 1000]
+                                        [--output bench_cogs.json] [--compare ancien.json]
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from benchmarks.fakes import FakeRest, World
+from benchmarks.traffic import ban_list, banned_gif_traffic, gif_flood, multi_channel_raid, normal_chat, single_user_spam
+from bot import create_bot
+
+COGS = ("ban_gif_cog", "gif_cog", "anti_spam_cog")
+
+# Seuil de détection de raid utilisé pour tous les serveurs (comptes distincts publiant le même message)
+RAID_AUTHOR_THRESHOLD = 10
+
+SCENARIOS = {
+    "normal_chat": lambda world, args, banned: normal_chat(world, args.messages),
+    "single_user_spam": lambda world, args, banned: single_user_spam(world, args.messages),
+    "multi_channel_raid": lambda world, args, banned: multi_channel_raid(world, args.messages),
+    "gif_flood": lambda world, args, banned: gif_flood(world, args.messages),
+    "ban_list": lambda world, args, banned: banned_gif_traffic(world, args.messages, banned),
+}
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * q / 100))]
+
+async def configure(bot, world, banned):
+    """Active les trois cogs sur tous les serveurs, avec leurs réglages par défaut."""
+    anti_spam = bot.get_cog("AntiSpam")
+    gif_limit = bot.get_cog("GifLimit")
+    ban_gif = bot.get_cog("BanGif")
+    for guild in world.guilds:
+        await anti_spam.update_server_config(
+            guild.id, is_enabled=True, alert_channel_id=world.alert_channels[guild.id], raid_author_threshold=RAID_AUTHOR_THRESHOLD,
+        )
+        await gif_limit.update_server_config(guild.id, is_enabled=True)
+        for entry in (banned or {}).get(guild.id, ()):
+            await ban_gif.add_banned_gif(guild.id, entry)
+    await bot.storage.flush()
+
+async def run_once(scenario, args, track_memory):
+    """Une passe : latence par message, ou pic de mémoire si track_memory."""
+    rest = FakeRest(args.rest_latency)
+    world = World(args.guilds, args.channels, args.users, rest)
+    banned = ban_list(world, args.ban_list) if scenario == "ban_list" else None
+    messages = SCENARIOS[scenario](world, args, banned)
+
+    bot = create_bot("none", "low")
+    await bot.storage.open()
+    try:
+        async with bot:
+            for extension in COGS:
+                await bot.load_extension(extension)
+            await configure(bot, world, banned)
+            dispatch = bot.pipeline.dispatch
+            latencies = None if track_memory else [0] * len(messages)
+            gc.collect()
+            if track_memory:
+                tracemalloc.start()
+            start = time.perf_counter()
+            if track_memory:
+                for message in messages:
+                    await dispatch(message)
+            else:
+                clock = time.perf_counter_ns
+                for i, message in enumerate(messages):
+                    message_start = clock()
+                    await dispatch(message)
+                    latencies[i] = clock() - message_start
+            detection = time.perf_counter() - start
+            await bot.moderation_queue.join()  # actions de modération (appels REST simulés)
+            elapsed = time.perf_counter() - start
+            if track_memory:
+                current, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                return {"peak_memory_kb": peak // 1024, "retained_memory_kb": current // 1024}
+            stats = bot.pipeline.stats()
+    finally:
+        await bot.moderation_queue.close()
+        await bot.storage.close()
+
+    latencies.sort()
+    return {
+        "messages": len(messages),
+        "messages_per_s": len(messages) / elapsed,
+        "pipeline_seconds": detection,
+        "total_seconds": elapsed,
+        "latency_us": {
+            "p50": percentile(latencies, 50) / 1000,
+            "p95": percentile(latencies, 95) / 1000,
+            "p99": percentile(latencies, 99) / 1000,
+            "max": latencies[-1] / 1000 if latencies else 0.0,
+        },
+        "deleted_by": {name: stage["stops"] for name, stage in stats.items()},
+        "rest_calls": dict(rest.calls),
+    }
+
+async def run_scenario(scenario, args):
+    result = await run_once(scenario, args, track_memory=False)
+    if not args.no_memory:
+        result.update(await run_once(scenario, args, track_memory=True))
+    return result
+
+def print_result(scenario, result):
+    latency = result["latency_us"]
+    memory = f", mémoire max {result['peak_memory_kb']:7d} Ko" if "peak_memory_kb" in result else ""
+    print(
+        f"{scenario:>18} : {result['messages_per_s']:9.0f} msg/s, p50 {latency['p50']:7.1f} µs, p95 {latency['p95']:7.1f} µs, "
+        f"p99 {latency['p99']:7.1f} µs{memory}, supprimés {result['deleted_by']}, REST {result['rest_calls']}"
+    )
+
+def print_comparison(results, previous):
+    print(f"Comparaison avec {previous['created']} :")
+    for scenario, result in results.items():
+        old = previous["scenarios"].get(scenario)
+        if old is None:
+            continue
+        line = (
+            f"{scenario:>18} : débit x{result['messages_per_s'] / old['messages_per_s']:.2f}, "
+            f"p99 x{result['latency_us']['p99'] / max(old['latency_us']['p99'], 1e-9):.2f}"
+        )
+        if "peak_memory_kb" in result and "peak_memory_kb" in old:
+            line += f", mémoire max x{result['peak_memory_kb'] / max(old['peak_memory_kb'], 1):.2f}"
+        print(line)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenario", choices=("all", *SCENARIOS), default="all", help="scénario à exécuter")
+    parser.add_argument("--messages", type=int, default=20000, help="messages par scénario")
+    parser.add_argument("--guilds", type=int, default=20, help="nombre de serveurs")
+    parser.add_argument("--channels", type=int, default=10, help="salons par serveur")
+    parser.add_argument("--users", type=int, default=200, help="membres actifs par serveur")
+    parser.add_argument("--ban-list", type=int, default=1000, help="GIF interdits par serveur (scénario ban_list)")
+    parser.add_argument("--rest-latency", type=float, default=0.0, help="latence simulée des appels REST (s)")
+    parser.add_argument("--no-memory", action="store_true", help="ne pas mesurer la mémoire (seconde passe)")
+    parser.add_argument("--output", default="bench_cogs.json", help="fichier JSON des résultats")
+    parser.add_argument("--compare", help="résultats JSON précédents à comparer")
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output)
+    previous = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            previous = json.load(f)
+    scenarios = list(SCENARIOS) if args.scenario == "all" else [args.scenario]
+
+    print(f"{args.messages} messages par scénario, {args.guilds} serveurs, {args.channels} salons et {args.users} membres par serveur")
+    results = {}
+    # Base de données et instantanés des cogs dans un dossier temporaire
+    repository = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            for scenario in scenarios:
+                results[scenario] = asyncio.run(run_scenario(scenario, args))
+                print_result(scenario, results[scenario])
+        finally:
+            os.chdir(repository)
+
+    report = {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "parameters": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "scenarios": results,
+    }
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"Résultats écrits dans {output}")
+    if previous is not None:
+        print_comparison(results, previous)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Compare l'ancienne fenêtre fixe par salon aux limites de GifLimiter.
+
+Usage : python -m benchmarks.bench_gif_limiter [--channels 200] [--users 20] [--gifs 200000] [--limit 5] [--window 60]
+"""
+import argparse
+import random
+import sys
+import time
+from collections import defaultdict
+
+from gif_limiter import GifLimiter
+
+def make_traffic(channels, users, gifs, seconds, seed=42):
+    """GIF répartis sur `channels` salons ; dans chaque salon, un utilisateur sur `users`
+    envoie la moitié des GIF (rafales), les autres se partagent le reste."""
+    rng = random.Random(seed)
+    step = seconds / gifs
+    traffic = []
+    for i in range(gifs):
+        channel_id = rng.randrange(channels)
+        user_id = 0 if rng.random() < 0.5 else rng.randrange(1, users)
+        traffic.append((i * step, channel_id, user_id))
+    return traffic
+
+def run_fixed_window(traffic, limit, window):
+    """Ancienne implémentation : un compteur par salon, remis à zéro à la fin de chaque fenêtre."""
+    gif_count = defaultdict(lambda: {"count": 0, "timestamp": 0.0})
+    blocked = defaultdict(int)
+    for now, channel_id, user_id in traffic:
+        channel_data = gif_count[channel_id]
+        if now - channel_data["timestamp"] > window:
+            channel_data["count"] = 0
+            channel_data["timestamp"] = now
+        channel_data["count"] += 1
+        if channel_data["count"] > limit:
+            blocked[user_id == 0] += 1
+    size = sys.getsizeof(gif_count) + sum(sys.getsizeof(data) for data in gif_count.values())
+    return blocked, len(gif_count), size
+
+def run_limiter(traffic, limit, window, scope, algorithm):
+    limiter = GifLimiter(len(traffic))
+    blocked = defaultdict(int)
+    last_sweep = 0.0
+    for now, channel_id, user_id in traffic:
+        if now - last_sweep >= 60:
+            limiter.sweep(now)
+            last_sweep = now
+        if not limiter.allow(1, channel_id, user_id, scope, algorithm, limit, window, now):
+            blocked[user_id == 0] += 1
+    stats = limiter.stats()
+    return blocked, stats["entries"], stats["bytes"]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--channels", type=int, default=200, help="nombre de salons")
+    parser.add_argument("--users", type=int, default=20, help="utilisateurs par salon")
+    parser.add_argument("--gifs", type=int, default=200000, help="nombre de GIF simulés")
+    parser.add_argument("--seconds", type=int, default=3600, help="durée simulée")
+    parser.add_argument("--limit", type=int, default=5, help="gif_limit")
+    parser.add_argument("--window", type=int, default=60, help="time_window en secondes")
+    args = parser.parse_args()
+
+    traffic = make_traffic(args.channels, args.users, args.gifs, args.seconds)
+    print(f"{len(traffic)} GIF, {args.channels} salons, {args.users} utilisateurs par salon, limite {args.limit} / {args.window} s")
+    runs = [("fenêtre fixe (salon)", lambda: run_fixed_window(traffic, args.limit, args.window))]
+    for scope in ("channel", "user"):
+        for algorithm in ("sliding", "bucket"):
+            runs.append((f"{algorithm} ({scope})", lambda scope=scope, algorithm=algorithm: run_limiter(traffic, args.limit, args.window, scope, algorithm)))
+    for name, run in runs:
+        start = time.perf_counter()
+        blocked, entries, size = run()
+        elapsed = time.perf_counter() - start
+        print(
+            f"{name:>22} : {elapsed / len(traffic) * 1e6:6.2f} µs/GIF, {entries:7d} états ({size // 1024:6d} Ko), "
+            f"bloqués : {blocked[True]:6d} de l'utilisateur en rafale, {blocked[False]:6d} des autres"
+        )
+
+if __name__ == "__main__":
+    main()
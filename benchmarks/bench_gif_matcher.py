@@ -0,0 +1,97 @@
+"""Compare le parcours linéaire des GIF interdits au chemin de ban_gif_cog : clés canoniques puis Aho-Corasick.
+
+Usage : python -m benchmarks.bench_gif_matcher [--banned 10000] [--patterns 1000] [--messages 2000]
+
+Comme dans le cog, les liens interdits sont indexés par identifiant canonique
+(gif_identity.canonical_key) et cherchés parmi les clés des liens du message ;
+seuls les motifs libres (entrées qui ne sont pas des liens) passent par l'automate.
+La moitié des GIF interdits postés le sont sous une autre forme du même lien
+(www.tenor.com au lieu de tenor.com) : le parcours linéaire, qui compare le texte brut, les manque.
+"""
+import argparse
+import random
+import time
+from collections import Counter
+
+from gif_identity import canonical_key, extract_urls
+from gif_matcher import AhoCorasick
+
+WORDS = ["cat", "dog", "happy", "dance", "meme", "lol", "anime", "wow", "party", "funny", "hello", "sad"]
+
+def make_url(rng):
+    return f"https://tenor.com/view/{'-'.join(rng.choice(WORDS) for _ in range(3))}-gif-{rng.randrange(10**7, 10**8)}"
+
+def make_pattern(rng):
+    return f"{rng.choice(WORDS)}{rng.choice(WORDS)}{rng.randrange(10**4, 10**5)}"
+
+def make_messages(rng, banned, patterns, count):
+    """Messages ordinaires, avec un lien de GIF dans la moitié des cas, un GIF interdit dans 5 % et un motif libre dans 2 %."""
+    messages = []
+    for _ in range(count):
+        text = " ".join(rng.choice(WORDS) for _ in range(rng.randrange(3, 15)))
+        roll = rng.random()
+        if roll < 0.05:
+            url = rng.choice(banned)
+            text += " " + (url.replace("://tenor.com", "://www.tenor.com") if rng.random() < 0.5 else url)
+        elif roll < 0.07 and patterns:
+            text += " " + rng.choice(patterns)
+        elif roll < 0.5:
+            text += " " + make_url(rng)
+        messages.append(text)
+    return messages
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--banned", type=int, default=10000, help="nombre de liens de GIF interdits")
+    parser.add_argument("--patterns", type=int, default=1000, help="nombre de motifs libres interdits (hors liens)")
+    parser.add_argument("--messages", type=int, default=2000, help="nombre de messages analysés")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    banned = [make_url(rng) for _ in range(args.banned)]
+    patterns = [make_pattern(rng) for _ in range(args.patterns)]
+    messages = make_messages(rng, banned, patterns, args.messages)
+
+    start = time.perf_counter()
+    keys = Counter(canonical_key(url) for url in banned)
+    matcher = AhoCorasick(patterns)
+    matcher.search("")
+    build = time.perf_counter() - start
+    print(
+        f"{args.banned} liens et {args.patterns} motifs interdits, {args.messages} messages "
+        f"(index construits en {build * 1000:.0f} ms, automate de {len(matcher.fail)} noeuds)"
+    )
+
+    entries = banned + patterns
+    start = time.perf_counter()
+    linear = sum(any(entry in text for entry in entries) for text in messages)
+    linear_time = time.perf_counter() - start
+
+    # Clés des liens : calculées une fois par message par le pipeline (MessageContext.gif_keys)
+    start = time.perf_counter()
+    message_keys = [{canonical_key(url) for url in extract_urls(text)} for text in messages]
+    extract_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    by_key = [not keys.keys().isdisjoint(gif_keys) for gif_keys in message_keys]
+    key_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    by_pattern = [matcher.search(text) is not None for text in messages]
+    automaton_time = time.perf_counter() - start
+
+    cog_time = extract_time + key_time + automaton_time
+    rows = (
+        ("parcours linéaire", linear_time, linear),
+        ("clés des liens", extract_time, None),
+        ("recherche des clés", key_time, sum(by_key)),
+        ("Aho-Corasick (motifs)", automaton_time, sum(by_pattern)),
+        ("total du cog", cog_time, sum(a or b for a, b in zip(by_key, by_pattern))),
+    )
+    for name, elapsed, matches in rows:
+        found = "" if matches is None else f", {matches} correspondances"
+        print(f"{name:>22} : {elapsed * 1000:9.1f} ms, {elapsed / len(messages) * 1e6:9.2f} µs/message{found}")
+    print(f"Gain : x{linear_time / cog_time:.1f} (x{linear_time / (key_time + automaton_time):.1f} sans le calcul des clés, partagé avec les autres étapes)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Compare l'ancienne reconstruction de liste à la fenêtre glissante SpamWindow.
+
+Usage : python -m benchmarks.bench_spam_window [--rate 200] [--window 10] [--seconds 20]
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from spam_window import SpamRecord, SpamWindow, content_hash
+
+def make_traffic(rate, seconds, seed=42):
+    """Messages d'un seul utilisateur à `rate` messages/s, avec des contenus répétés."""
+    rng = random.Random(seed)
+    contents = [f"message numéro {i}" for i in range(20)]
+    step = 1.0 / rate
+    return [(i * step, rng.choice(contents)) for i in range(int(rate * seconds))]
+
+def run_list_rebuild(traffic, time_window):
+    """Ancienne implémentation : liste reconstruite et reparcourue à chaque message."""
+    base = datetime(2024, 1, 1)
+    messages = []
+    flagged = 0
+    for offset, content in traffic:
+        now = base + timedelta(seconds=offset)
+        messages = [
+            (msg_content, msg_obj, timestamp)
+            for msg_content, msg_obj, timestamp in messages
+            if now - timestamp <= timedelta(seconds=time_window)
+        ]
+        messages.append((content, None, now))
+        identical = [msg_obj for msg_content, msg_obj, _ in messages if msg_content == content]
+        flagged += len(identical) > 3
+    return flagged
+
+def run_spam_window(traffic, time_window):
+    """Nouvelle implémentation : expiration et comptage amortis en O(1)."""
+    window = SpamWindow()
+    flagged = 0
+    for message_id, (offset, content) in enumerate(traffic):
+        window.expire(offset, time_window)
+        flagged += window.add(SpamRecord(message_id, 0, content_hash(content), offset)) > 3
+    return flagged
+
+def measure(func, traffic, time_window):
+    start = time.perf_counter()
+    flagged = func(traffic, time_window)
+    elapsed = time.perf_counter() - start
+    return flagged, elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rate", type=int, default=200, help="messages par seconde pour un utilisateur")
+    parser.add_argument("--window", type=int, default=10, help="time_window en secondes")
+    parser.add_argument("--seconds", type=int, default=20, help="durée simulée")
+    args = parser.parse_args()
+
+    traffic = make_traffic(args.rate, args.seconds)
+    print(f"{len(traffic)} messages, {args.rate} msg/s, fenêtre de {args.window} s")
+    results = {}
+    for name, func in (("liste reconstruite", run_list_rebuild), ("SpamWindow", run_spam_window)):
+        flagged, elapsed = measure(func, traffic, args.window)
+        results[name] = elapsed
+        print(f"{name:>20} : {elapsed * 1000:9.1f} ms, {elapsed / len(traffic) * 1e6:8.2f} µs/message, {flagged} détections")
+    print(f"Gain : x{results['liste reconstruite'] / results['SpamWindow']:.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+"""Test de charge de bout en bout : le vrai bot (toutes les extensions) contre un faux Discord local.
+
+Le bot se connecte à benchmarks.fake_discord (passerelle et API REST locales, limites
+de débit simulées), puis chaque incident scénarisé est joué sur son propre serveur :
+spam d'un utilisateur dans plusieurs salons, raid coordonné, avalanche de GIF et
+GIF interdits. Les incidents sont joués en même temps, avec un peu de conversation
+normale. Pour chaque incident : appels REST par type (et 429), délai entre le
+premier message et la première action de modération, latence d'envoi à
+suppression par message (centiles). Les résultats sont écrits en JSON.
+
+Usage : python -m benchmarks.e2e_harness [--scale 1] [--interval 0.02] [--rate-limit 5] [--rate-window 1]
+                                         [--blind] [--rest-latency 0] [--settle 6] [--output e2e.json]
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+import discord
+
+from benchmarks.fake_discord import FakeDiscord
+from benchmarks.traffic import chat_line, gif_url
+from bot import create_bot, load_extensions
+
+log = logging.getLogger("e2e_harness")
+
+# Seuil de détection de raid (comptes distincts publiant le même message)
+RAID_AUTHOR_THRESHOLD = 10
+
+# Noms courts des routes REST dans le rapport
+ROUTE_NAMES = {
+    "DELETE /channels/{channel_id}/messages/{message_id}": "delete_message",
+    "POST /channels/{channel_id}/messages/bulk-delete": "bulk_delete",
+    "POST /channels/{channel_id}/messages": "send_message",
+    "PUT /guilds/{guild_id}/bans/{user_id}": "ban",
+}
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * q / 100))]
+
+class Incident:
+    """Serveur dédié à un incident et son script : liste de (salon, auteur, contenu)."""
+
+    def __init__(self, name, guild_id, channel_ids, script, banned=()):
+        self.name = name
+        self.guild_id = guild_id
+        self.channel_ids = channel_ids
+        self.script = script
+        self.banned = banned
+        self.message_ids = []
+        self.started_at = None
+
+def build_incidents(scale, seed=7):
+    rng = random.Random(seed)
+    ids = itertools.count(10**6)
+    incidents = []
+
+    def guild(channels):
+        return next(ids), [next(ids) for _ in range(channels)]
+
+    def users(count):
+        return [next(ids) for _ in range(count)]
+
+    # Un spammeur répète le même message dans 8 salons (bannissement au-delà de 5), au milieu de 4 membres normaux
+    guild_id, channels = guild(8)
+    spammer, regulars = next(ids), users(4)
+    line = chat_line(rng)
+    script = []
+    for i in range(16 * scale):
+        script.append((channels[i % len(channels)], spammer, line))
+        script.append((rng.choice(channels), rng.choice(regulars), chat_line(rng)))
+    incidents.append(Incident("single_user_spam", guild_id, channels, script))
+
+    # Raid : 15 comptes publient 5 fois la même invitation dans 4 salons
+    guild_id, channels = guild(4)
+    raiders = users(15 * scale)
+    line = chat_line(rng) + " rejoignez https://discord.gg/raid"
+    script = [(rng.choice(channels), raider, line) for _ in range(5) for raider in raiders]
+    incidents.append(Incident("multi_channel_raid", guild_id, channels, script))
+
+    # Avalanche de GIF dans un salon (limite par défaut : 5 GIF par minute)
+    guild_id, channels = guild(3)
+    posters = users(8)
+    script = [(channels[0], rng.choice(posters), gif_url(rng)) for _ in range(40 * scale)]
+    incidents.append(Incident("gif_flood", guild_id, channels, script))
+
+    # GIF interdits mêlés à d'autres GIF et à la conversation
+    guild_id, channels = guild(3)
+    posters = users(10)
+    banned = [gif_url(rng, 10**9 + i) for i in range(20)]
+    script = []
+    for _ in range(40 * scale):
+        roll = rng.random()
+        content = rng.choice(banned) if roll < 0.3 else gif_url(rng) if roll < 0.5 else chat_line(rng)
+        script.append((rng.choice(channels), rng.choice(posters), content))
+    incidents.append(Incident("banned_gif", guild_id, channels, script, banned))
+    return incidents
+
+async def configure(bot, incidents):
+    """Active l'anti-spam, la limite de GIF et la liste de GIF interdits sur les serveurs des incidents."""
+    anti_spam = bot.get_cog("AntiSpam")
+    gif_limit = bot.get_cog("GifLimit")
+    ban_gif = bot.get_cog("BanGif")
+    for incident in incidents:
+        await anti_spam.update_server_config(
+            incident.guild_id, is_enabled=True, alert_channel_id=incident.channel_ids[0], raid_author_threshold=RAID_AUTHOR_THRESHOLD,
+        )
+        await gif_limit.update_server_config(incident.guild_id, is_enabled=True)
+        for entry in incident.banned:
+            await ban_gif.add_banned_gif(incident.guild_id, entry)
+    await bot.storage.flush()
+
+async def play(fake, incident, interval):
+    incident.started_at = time.monotonic()
+    for channel_id, author_id, content in incident.script:
+        incident.message_ids.append(await fake.send_message(incident.guild_id, channel_id, author_id, content))
+        await asyncio.sleep(interval)
+
+async def settle(bot, fake, quiet):
+    """Attend la fin des actions de modération puis `quiet` secondes sans appel REST (suppressions différées)."""
+    while True:
+        await bot.moderation_queue.join()
+        count = len(fake.calls)
+        await asyncio.sleep(quiet)
+        if len(fake.calls) == count and not bot.moderation_queue.depth():
+            return
+
+def incident_report(fake, incident):
+    calls = [call for call in fake.calls if call.guild_id == incident.guild_id and call.route in ROUTE_NAMES]
+    sent = set(incident.message_ids)
+    rest_calls = Counter()
+    deleted_at = {}
+    first_action = None
+    for call in calls:
+        name = ROUTE_NAMES[call.route]
+        if name == "delete_message" and call.message_ids[0] in fake.posted:
+            name = "notice_cleanup"
+        if call.status == 429:
+            rest_calls["rate_limited"] += 1
+            continue
+        rest_calls[name] += 1
+        if name in ("delete_message", "bulk_delete", "ban") and first_action is None:
+            first_action = call.at
+        for message_id in call.message_ids:
+            if message_id in sent and message_id not in deleted_at:
+                deleted_at[message_id] = call.at
+    latencies = sorted((at - fake.sent_at[message_id]) * 1000 for message_id, at in deleted_at.items())
+    actions = sum(count for name, count in rest_calls.items() if name != "rate_limited")
+    return {
+        "messages": len(incident.message_ids),
+        "deleted": len(deleted_at),
+        "rest_calls": dict(rest_calls),
+        "rest_calls_per_deleted_message": actions / len(deleted_at) if deleted_at else None,
+        "first_action_ms": (first_action - incident.started_at) * 1000 if first_action is not None else None,
+        "delete_latency_ms": {
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "max": latencies[-1] if latencies else 0.0,
+        },
+    }
+
+async def run(args):
+    fake = FakeDiscord(args.rate_limit, args.rate_window, not args.blind, args.rest_latency)
+    incidents = build_incidents(args.scale)
+    for incident in incidents:
+        fake.add_guild(incident.guild_id, incident.channel_ids)
+    await fake.start()
+    fake.patch_discord()
+
+    bot = create_bot("none", "low")
+    await bot.storage.open()
+    runner = None
+    try:
+        async with bot:
+            failed = await load_extensions(bot)
+            if failed:
+                raise RuntimeError(f"Extensions non chargées : {', '.join(sorted(failed))}")
+            bot.extensions_ready = True
+            await configure(bot, incidents)
+            runner = asyncio.create_task(bot.start("fake-token"))
+            await asyncio.wait_for(bot.wait_until_ready(), timeout=30)
+            log.info("Bot connecté au faux Discord (port %s), %d incidents", fake.port, len(incidents))
+
+            start = time.monotonic()
+            await asyncio.gather(*(play(fake, incident, args.interval) for incident in incidents))
+            await settle(bot, fake, args.settle)
+            elapsed = time.monotonic() - start
+            results = {incident.name: incident_report(fake, incident) for incident in incidents}
+            await bot.close()
+            await runner
+    finally:
+        if runner is not None and not runner.done():
+            runner.cancel()
+        await bot.moderation_queue.close()
+        await bot.storage.close()
+        await fake.stop()
+    return results, elapsed, fake.stats(start)
+
+def print_result(name, result):
+    latency = result["delete_latency_ms"]
+    first_action = result["first_action_ms"]
+    first_action = "-" if first_action is None else f"{first_action:7.0f} ms"
+    print(
+        f"{name:>18} : {result['messages']:4d} messages, {result['deleted']:4d} supprimés, première action {first_action}, "
+        f"suppression p50 {latency['p50']:6.0f} ms, p95 {latency['p95']:6.0f} ms, max {latency['max']:6.0f} ms, REST {result['rest_calls']}"
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", type=int, default=1, help="multiplie la taille des incidents")
+    parser.add_argument("--interval", type=float, default=0.02, help="délai entre deux messages d'un incident (s)")
+    parser.add_argument("--rate-limit", type=int, default=5, help="requêtes par bucket et par fenêtre")
+    parser.add_argument("--rate-window", type=float, default=1.0, help="durée de la fenêtre des buckets (s)")
+    parser.add_argument("--blind", action="store_true", help="sans en-têtes X-RateLimit : le bot ne découvre les limites que par des 429")
+    parser.add_argument("--rest-latency", type=float, default=0.0, help="latence simulée des réponses REST (s)")
+    parser.add_argument("--settle", type=float, default=6.0, help="silence REST attendu avant la fin (s), au-delà des delete_after")
+    parser.add_argument("--output", default="e2e.json", help="fichier JSON des résultats")
+    args = parser.parse_args()
+
+    discord.utils.setup_logging(level=logging.WARNING)
+    output = os.path.abspath(args.output)
+    # Base de données et instantanés des cogs dans un dossier temporaire
+    repository = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            results, elapsed, routes = asyncio.run(run(args))
+        finally:
+            os.chdir(repository)
+
+    for name, result in results.items():
+        print_result(name, result)
+    print(f"Durée totale {elapsed:.1f} s, appels REST par route et statut : {routes}")
+
+    report = {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "parameters": {key: value for key, value in vars(args).items() if key != "output"},
+        "elapsed_seconds": elapsed,
+        "routes": routes,
+        "incidents": results,
+    }
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"Résultats écrits dans {output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+"""Faux Discord local (API REST et passerelle) pour les tests de charge de bout en bout.
+
+Le serveur aiohttp répond aux appels REST utilisés par le bot, applique des limites
+de débit par bucket (429 comme Discord, en-têtes X-RateLimit facultatifs) et
+enregistre chaque appel. La passerelle accepte une connexion, envoie READY et les
+GUILD_CREATE, répond aux heartbeats, puis transmet les événements injectés par le
+harnais (compression zlib-stream, comme Discord).
+
+Le bot s'y connecte après patch_discord(), qui redirige discord.py vers ce serveur.
+"""
+import asyncio
+import itertools
+import json
+import re
+import time
+import zlib
+from collections import defaultdict
+from datetime import datetime, timezone
+
+import discord
+import yarl
+from aiohttp import WSMsgType, web
+
+BOT_USER_ID = 10**17
+APPLICATION_ID = 10**17 + 1
+TIMESTAMP = "2024-01-01T00:00:00+00:00"
+
+# Routes REST : (méthode, motif, modèle de route, paramètre majeur du bucket)
+ROUTES = (
+    ("GET", r"/users/@me", "GET /users/@me", None),
+    ("GET", r"/oauth2/applications/@me", "GET /oauth2/applications/@me", None),
+    ("PUT", r"/applications/(?P<application_id>\d+)/commands", "PUT /applications/{application_id}/commands", None),
+    ("DELETE", r"/channels/(?P<channel_id>\d+)/messages/(?P<message_id>\d+)", "DELETE /channels/{channel_id}/messages/{message_id}", "channel_id"),
+    ("POST", r"/channels/(?P<channel_id>\d+)/messages/bulk-delete", "POST /channels/{channel_id}/messages/bulk-delete", "channel_id"),
+    ("POST", r"/channels/(?P<channel_id>\d+)/messages", "POST /channels/{channel_id}/messages", "channel_id"),
+    ("PUT", r"/guilds/(?P<guild_id>\d+)/bans/(?P<user_id>\d+)", "PUT /guilds/{guild_id}/bans/{user_id}", "guild_id"),
+)
+COMPILED_ROUTES = [(method, re.compile(pattern + "$"), template, major) for method, pattern, template, major in ROUTES]
+
+def user_payload(user_id, bot=False):
+    return {"id": str(user_id), "username": f"utilisateur{user_id}", "discriminator": "0", "avatar": None,
+            "global_name": f"Utilisateur {user_id}", "bot": bot}
+
+def member_payload(user_id):
+    return {"user": user_payload(user_id), "roles": [], "joined_at": TIMESTAMP, "deaf": False, "mute": False, "flags": 0}
+
+def guild_payload(guild_id, channel_ids):
+    return {
+        "id": str(guild_id),
+        "name": f"Serveur {guild_id}",
+        "owner_id": str(guild_id + 1),
+        "unavailable": False,
+        "roles": [{"id": str(guild_id), "name": "@everyone", "permissions": "0", "position": 0, "color": 0,
+                   "hoist": False, "managed": False, "mentionable": False}],
+        "channels": [
+            {"id": str(channel_id), "type": 0, "name": f"salon-{position}", "position": position, "permission_overwrites": []}
+            for position, channel_id in enumerate(channel_ids)
+        ],
+        "members": [member_payload(BOT_USER_ID)],
+        "voice_states": [],
+        "member_count": 1000,
+        "large": False,
+        "emojis": [],
+        "stickers": [],
+        "features": [],
+        "threads": [],
+        "stage_instances": [],
+        "guild_scheduled_events": [],
+    }
+
+def message_payload(message_id, guild_id, channel_id, author_id, content, bot=False):
+    member = member_payload(author_id)
+    author = member.pop("user")
+    author["bot"] = bot
+    return {
+        "id": str(message_id), "channel_id": str(channel_id), "guild_id": str(guild_id), "author": author, "member": member,
+        "content": content, "timestamp": TIMESTAMP, "edited_timestamp": None, "tts": False, "mention_everyone": False,
+        "mentions": [], "mention_roles": [], "attachments": [], "embeds": [], "pinned": False, "type": 0,
+    }
+
+class Bucket:
+    """Fenêtre fixe de `limit` requêtes toutes les `per` secondes."""
+
+    __slots__ = ("limit", "per", "remaining", "reset_at")
+
+    def __init__(self, limit, per):
+        self.limit = limit
+        self.per = per
+        self.remaining = limit
+        self.reset_at = 0.0
+
+    def acquire(self, now):
+        """Renvoie 0 si la requête passe, sinon le délai (s) avant la prochaine fenêtre."""
+        if now >= self.reset_at:
+            self.remaining = self.limit
+            self.reset_at = now + self.per
+        if self.remaining == 0:
+            return self.reset_at - now
+        self.remaining -= 1
+        return 0.0
+
+class CallRecord:
+    __slots__ = ("at", "method", "route", "channel_id", "guild_id", "user_id", "message_ids", "status")
+
+    def __init__(self, at, method, route, channel_id, guild_id, user_id, message_ids, status):
+        self.at = at
+        self.method = method
+        self.route = route
+        self.channel_id = channel_id
+        self.guild_id = guild_id
+        self.user_id = user_id
+        self.message_ids = message_ids
+        self.status = status
+
+class FakeDiscord:
+    """Serveur REST et passerelle. Les instants (at, sent_at) sont en temps monotone (time.monotonic)."""
+
+    def __init__(self, rate_limit=5, rate_window=1.0, ratelimit_headers=True, rest_latency=0.0, heartbeat_interval=41.25):
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self.ratelimit_headers = ratelimit_headers
+        self.rest_latency = rest_latency
+        self.heartbeat_interval = heartbeat_interval
+        self.buckets = {}
+        self.calls = []
+        self.guilds = {}  # {guild_id: [channel_id]}
+        self.channel_guilds = {}
+        self.sent_at = {}  # {message_id: instant d'envoi par la passerelle}
+        self.posted = set()  # messages envoyés par le bot (avertissements, alertes)
+        self.message_ids = itertools.count(discord.utils.time_snowflake(datetime.now(timezone.utc)))
+        self.sequence = itertools.count(1)
+        self.ws = None
+        self.compressor = None
+        self.connected = asyncio.Event()
+        self.runner = None
+        self.port = None
+
+    def add_guild(self, guild_id, channel_ids):
+        self.guilds[guild_id] = list(channel_ids)
+        for channel_id in channel_ids:
+            self.channel_guilds[channel_id] = guild_id
+
+    async def start(self, host="127.0.0.1", port=0):
+        app = web.Application()
+        app.router.add_get("/gateway", self.gateway)
+        app.router.add_route("*", "/api/v10/{path:.*}", self.rest)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, host, port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        return self.port
+
+    async def stop(self):
+        if self.ws is not None:
+            await self.ws.close()
+        if self.runner is not None:
+            await self.runner.cleanup()
+
+    def patch_discord(self):
+        """Redirige l'API REST et la passerelle de discord.py vers ce serveur."""
+        discord.http.Route.BASE = f"http://127.0.0.1:{self.port}/api/v10"
+        discord.gateway.DiscordWebSocket.DEFAULT_GATEWAY = yarl.URL(f"ws://127.0.0.1:{self.port}/gateway")
+
+    # Passerelle
+
+    async def send(self, payload):
+        data = self.compressor.compress(json.dumps(payload).encode("utf-8")) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+        await self.ws.send_bytes(data)
+
+    async def dispatch(self, event, data):
+        await self.send({"op": 0, "t": event, "s": next(self.sequence), "d": data})
+
+    async def send_message(self, guild_id, channel_id, author_id, content):
+        """Injecte un MESSAGE_CREATE et renvoie l'identifiant du message."""
+        message_id = next(self.message_ids)
+        self.sent_at[message_id] = time.monotonic()
+        await self.dispatch("MESSAGE_CREATE", message_payload(message_id, guild_id, channel_id, author_id, content))
+        return message_id
+
+    async def gateway(self, request):
+        ws = web.WebSocketResponse(autoclose=False)
+        await ws.prepare(request)
+        self.ws = ws
+        self.compressor = zlib.compressobj()
+        await self.send({"op": 10, "d": {"heartbeat_interval": int(self.heartbeat_interval * 1000)}})
+        async for message in ws:
+            if message.type not in (WSMsgType.TEXT, WSMsgType.BINARY):
+                break
+            payload = json.loads(message.data)
+            if payload["op"] == 1:  # HEARTBEAT
+                await self.send({"op": 11})
+            elif payload["op"] == 2:  # IDENTIFY
+                await self.dispatch("READY", {
+                    "v": 10,
+                    "user": user_payload(BOT_USER_ID, bot=True),
+                    "guilds": [{"id": str(guild_id), "unavailable": True} for guild_id in self.guilds],
+                    "session_id": "fake-session",
+                    "resume_gateway_url": f"ws://127.0.0.1:{self.port}/gateway",
+                    "application": {"id": str(APPLICATION_ID), "flags": 0},
+                })
+                for guild_id, channel_ids in self.guilds.items():
+                    await self.dispatch("GUILD_CREATE", guild_payload(guild_id, channel_ids))
+                self.connected.set()
+        self.ws = None
+        return ws
+
+    # API REST
+
+    def match(self, method, path):
+        for route_method, pattern, template, major in COMPILED_ROUTES:
+            if route_method == method:
+                match = pattern.match(path)
+                if match:
+                    return template, major, match.groupdict()
+        return None, None, {}
+
+    async def rest(self, request):
+        now = time.monotonic()
+        path = "/" + request.match_info["path"]
+        template, major, params = self.match(request.method, path)
+        body = await request.json() if request.can_read_body else None
+        channel_id = int(params["channel_id"]) if "channel_id" in params else None
+        guild_id = int(params["guild_id"]) if "guild_id" in params else self.channel_guilds.get(channel_id)
+        message_ids = ()
+        if "message_id" in params:
+            message_ids = (int(params["message_id"]),)
+        elif template and template.endswith("bulk-delete"):
+            message_ids = tuple(int(message_id) for message_id in body["messages"])
+
+        status, payload, headers = 200, None, {}
+        if template is None:
+            status, payload = 404, {"message": "404: Not Found", "code": 0}
+        elif major is not None:
+            key = (template, params[major])
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                bucket = self.buckets[key] = Bucket(self.rate_limit, self.rate_window)
+            retry_after = bucket.acquire(now)
+            if self.ratelimit_headers:
+                headers = {
+                    "X-RateLimit-Limit": str(bucket.limit),
+                    "X-RateLimit-Remaining": str(bucket.remaining),
+                    "X-RateLimit-Reset-After": f"{max(bucket.reset_at - now, 0):.3f}",
+                    "X-RateLimit-Bucket": template,
+                }
+            if retry_after:
+                status = 429
+                payload = {"message": "You are being rate limited.", "retry_after": round(retry_after, 3), "global": False}
+                headers.update({"Retry-After": f"{retry_after:.3f}", "X-RateLimit-Scope": "user", "Via": "1.1 fake-discord"})
+                headers.setdefault("X-RateLimit-Remaining", "0")
+
+        if status == 200:
+            status, payload = self.respond(template, params, channel_id, guild_id, body)
+        self.calls.append(CallRecord(now, request.method, template or path, channel_id, guild_id,
+                                     int(params["user_id"]) if "user_id" in params else None, message_ids, status))
+        if self.rest_latency:
+            await asyncio.sleep(self.rest_latency)
+        if payload is None:
+            return web.Response(status=status, headers=headers)
+        # discord.py ne décode le JSON que pour un Content-Type exact (sans charset)
+        headers["Content-Type"] = "application/json"
+        return web.Response(body=json.dumps(payload).encode("utf-8"), status=status, headers=headers)
+
+    def respond(self, template, params, channel_id, guild_id, body):
+        if template == "GET /users/@me":
+            return 200, user_payload(BOT_USER_ID, bot=True)
+        if template == "GET /oauth2/applications/@me":
+            return 200, {
+                "id": str(APPLICATION_ID), "name": "Youm'bot", "description": "", "icon": None, "bot_public": True,
+                "bot_require_code_grant": False, "owner": user_payload(1), "team": None, "verify_key": "0", "flags": 0,
+            }
+        if template == "PUT /applications/{application_id}/commands":
+            return 200, []
+        if template == "POST /channels/{channel_id}/messages":
+            message_id = next(self.message_ids)
+            self.posted.add(message_id)
+            return 200, message_payload(message_id, guild_id, channel_id, BOT_USER_ID, body.get("content", ""), bot=True)
+        # Suppressions et bannissements : pas de contenu
+        return 204, None
+
+    def stats(self, since=0.0):
+        """Appels enregistrés depuis `since`, par route et par statut."""
+        counts = defaultdict(lambda: defaultdict(int))
+        for call in self.calls:
+            if call.at >= since:
+                counts[call.route][call.status] += 1
+        return {route: dict(statuses) for route, statuses in counts.items()}
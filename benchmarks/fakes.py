@@ -0,0 +1,125 @@
+"""Objets minimaux imitant Message, Guild, Channel et Member de discord.py pour les benchmarks.
+
+Seuls les attributs et méthodes utilisés par le pipeline et les cogs de modération
+sont fournis. Les appels REST (suppression, bannissement, envoi) sont comptés par
+FakeRest au lieu d'être envoyés, avec une latence simulée facultative.
+"""
+import asyncio
+import itertools
+from collections import Counter
+from datetime import datetime, timezone
+
+import discord
+
+class FakeRest:
+    """Compte les appels REST simulés, par type."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = Counter()
+
+    async def call(self, name):
+        self.calls[name] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+class FakePermissions:
+    __slots__ = ("administrator", "manage_messages")
+
+    def __init__(self, administrator=False, manage_messages=False):
+        self.administrator = administrator
+        self.manage_messages = manage_messages
+
+class FakeMember:
+    __slots__ = ("id", "bot", "mention", "guild_permissions")
+
+    def __init__(self, member_id, administrator=False):
+        self.id = member_id
+        self.bot = False
+        self.mention = f"<@{member_id}>"
+        self.guild_permissions = FakePermissions(administrator=administrator)
+
+class FakePartialMessage:
+    __slots__ = ("channel", "id")
+
+    def __init__(self, channel, message_id):
+        self.channel = channel
+        self.id = message_id
+
+    async def delete(self):
+        await self.channel.rest.call("delete_message")
+
+class FakeChannel:
+    __slots__ = ("id", "guild", "mention", "rest")
+
+    def __init__(self, channel_id, guild, rest):
+        self.id = channel_id
+        self.guild = guild
+        self.mention = f"<#{channel_id}>"
+        self.rest = rest
+
+    async def send(self, content, delete_after=None):
+        await self.rest.call("send_message")
+
+    async def delete_messages(self, messages):
+        await self.rest.call("bulk_delete")
+
+    def get_partial_message(self, message_id):
+        return FakePartialMessage(self, message_id)
+
+class FakeGuild:
+    __slots__ = ("id", "channels", "rest")
+
+    def __init__(self, guild_id, rest):
+        self.id = guild_id
+        self.channels = {}
+        self.rest = rest
+
+    def get_channel(self, channel_id):
+        return self.channels.get(channel_id)
+
+    get_channel_or_thread = get_channel
+
+    def get_role(self, role_id):
+        return None
+
+    async def ban(self, user, reason=None):
+        await self.rest.call("ban")
+
+class FakeMessage:
+    __slots__ = ("id", "guild", "channel", "author", "content", "attachments", "embeds")
+
+    def __init__(self, message_id, guild, channel, author, content):
+        self.id = message_id
+        self.guild = guild
+        self.channel = channel
+        self.author = author
+        self.content = content
+        self.attachments = []
+        self.embeds = []
+
+    async def delete(self):
+        await self.channel.rest.call("delete_message")
+
+class World:
+    """Serveurs, salons et membres factices. Le premier salon de chaque serveur sert de salon d'alerte."""
+
+    def __init__(self, guilds, channels, users, rest):
+        self.rest = rest
+        self.guilds = []
+        self.members = {}  # {guild_id: [FakeMember]}
+        self.alert_channels = {}
+        ids = itertools.count(1000)
+        for _ in range(guilds):
+            guild = FakeGuild(next(ids), rest)
+            for _ in range(channels):
+                channel = FakeChannel(next(ids), guild, rest)
+                guild.channels[channel.id] = channel
+            self.guilds.append(guild)
+            self.alert_channels[guild.id] = next(iter(guild.channels))
+            self.members[guild.id] = [FakeMember(next(ids)) for _ in range(users)]
+        # Identifiants de messages datés d'aujourd'hui : la suppression groupée les accepte
+        self.message_ids = itertools.count(discord.utils.time_snowflake(datetime.now(timezone.utc)))
+
+    def message(self, guild, channel, author, content):
+        return FakeMessage(next(self.message_ids), guild, channel, author, content)
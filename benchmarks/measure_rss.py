@@ -0,0 +1,158 @@
+"""Mesure la mémoire (RSS) du cache de la passerelle selon le profil MEMORY_PROFILE.
+
+Chaque profil est mesuré dans un processus séparé : le bot reçoit des événements
+GUILD_CREATE puis MESSAGE_CREATE synthétiques (sans connexion à Discord), passés
+directement à l'état de connexion de discord.py.
+
+Usage : python -m benchmarks.measure_rss [--guilds 500] [--voice 20] [--authors 200] [--messages 50000]
+"""
+import argparse
+import asyncio
+import gc
+import json
+import random
+import resource
+import subprocess
+import sys
+
+import discord
+from discord.ext import commands
+
+from memory_profile import PROFILES, bot_options
+
+BOT_USER_ID = 1 << 40
+TIMESTAMP = "2024-01-01T00:00:00+00:00"
+
+def rss_kb():
+    """RSS actuelle du processus en Ko (pic de RSS si /proc n'est pas disponible)."""
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def user_payload(user_id):
+    return {"id": str(user_id), "username": f"utilisateur{user_id}", "discriminator": "0", "avatar": None, "global_name": f"Utilisateur {user_id}"}
+
+def member_payload(user_id):
+    return {"user": user_payload(user_id), "roles": [], "joined_at": TIMESTAMP, "deaf": False, "mute": False, "flags": 0}
+
+def guild_payload(guild_id, voice, voice_states):
+    """Serveur tel qu'envoyé sans l'intent members : le bot et les membres en vocal (si voice_states)."""
+    text_channel = guild_id + 1
+    voice_channel = guild_id + 2
+    voice_users = [guild_id + 1000 + i for i in range(voice)] if voice_states else []
+    return {
+        "id": str(guild_id),
+        "name": f"Serveur {guild_id}",
+        "owner_id": str(guild_id + 1000),
+        "roles": [{"id": str(guild_id), "name": "@everyone", "permissions": "0", "position": 0, "color": 0,
+                   "hoist": False, "managed": False, "mentionable": False}],
+        "channels": [
+            {"id": str(text_channel), "type": 0, "name": "général", "position": 0, "permission_overwrites": []},
+            {"id": str(voice_channel), "type": 2, "name": "vocal", "position": 1, "permission_overwrites": [], "bitrate": 64000, "user_limit": 0},
+        ],
+        "members": [member_payload(BOT_USER_ID)] + [member_payload(user_id) for user_id in voice_users],
+        "voice_states": [
+            {"user_id": str(user_id), "channel_id": str(voice_channel), "session_id": "session", "deaf": False, "mute": False,
+             "self_deaf": False, "self_mute": False, "self_video": False, "suppress": False, "request_to_speak_timestamp": None}
+            for user_id in voice_users
+        ],
+        "member_count": 10000,
+        "large": True,
+        "emojis": [],
+        "stickers": [],
+        "features": [],
+        "threads": [],
+        "stage_instances": [],
+        "guild_scheduled_events": [],
+    }
+
+def message_payload(message_id, guild_id, author_id, rng):
+    member = member_payload(author_id)
+    return {
+        "id": str(message_id),
+        "channel_id": str(guild_id + 1),
+        "guild_id": str(guild_id),
+        "author": member.pop("user"),
+        "member": member,
+        "content": " ".join(rng.choice(("salut", "gif", "merci", "https://tenor.com/view/chat-123", "ok")) for _ in range(12)),
+        "timestamp": TIMESTAMP,
+        "edited_timestamp": None,
+        "tts": False,
+        "mention_everyone": False,
+        "mentions": [],
+        "mention_roles": [],
+        "attachments": [],
+        "embeds": [],
+        "pinned": False,
+        "type": 0,
+    }
+
+async def measure(profile, guilds, voice, authors, messages):
+    """Mesures (Ko) pour un profil, dans le processus courant."""
+    intents = discord.Intents.default()
+    intents.message_content = True
+    bot = commands.Bot(command_prefix="!", **bot_options(intents, profile))
+    async with bot:  # prépare la boucle d'événements du bot, sans se connecter
+        state = bot._connection
+        state.user = discord.ClientUser(state=state, data=user_payload(BOT_USER_ID))
+        guild_ids = [(i + 1) << 22 for i in range(guilds)]
+        rng = random.Random(42)
+        gc.collect()
+        result = {"profile": profile, "base": rss_kb()}
+
+        for guild_id in guild_ids:
+            state.parse_guild_create(guild_payload(guild_id, voice, intents.voice_states))
+        await asyncio.sleep(0)
+        gc.collect()
+        result["guilds"] = rss_kb()
+
+        for message_id in range(messages):
+            guild_id = rng.choice(guild_ids)
+            state.parse_message_create(message_payload((1 << 50) + message_id, guild_id, guild_id + 10000 + rng.randrange(authors), rng))
+            if message_id % 1000 == 0:
+                await asyncio.sleep(0)  # laisser s'exécuter les on_message programmés
+        await asyncio.sleep(0)
+        gc.collect()
+        result["messages"] = rss_kb()
+        result["cached_members"] = sum(len(guild.members) for guild in bot.guilds)
+        result["cached_messages"] = len(bot.cached_messages)
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--guilds", type=int, default=500, help="nombre de serveurs")
+    parser.add_argument("--voice", type=int, default=20, help="membres en vocal par serveur")
+    parser.add_argument("--authors", type=int, default=200, help="auteurs distincts par serveur")
+    parser.add_argument("--messages", type=int, default=50000, help="nombre de messages reçus")
+    parser.add_argument("--profile", choices=PROFILES, help=argparse.SUPPRESS)  # mesure d'un seul profil (processus enfant)
+    args = parser.parse_args()
+
+    if args.profile:
+        print(json.dumps(asyncio.run(measure(args.profile, args.guilds, args.voice, args.authors, args.messages))))
+        return
+
+    print(f"{args.guilds} serveurs, {args.voice} membres en vocal par serveur, {args.messages} messages de {args.authors} auteurs par serveur")
+    results = []
+    for profile in PROFILES:
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.measure_rss", "--profile", profile, "--guilds", str(args.guilds),
+             "--voice", str(args.voice), "--authors", str(args.authors), "--messages", str(args.messages)],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        result = json.loads(output.splitlines()[-1])
+        results.append(result)
+        print(
+            f"{profile:>5} : RSS {result['base'] // 1024:4d} Mo au départ, {result['guilds'] // 1024:4d} Mo après les serveurs, "
+            f"{result['messages'] // 1024:4d} Mo après les messages ; {result['cached_members']} membres et "
+            f"{result['cached_messages']} messages en cache"
+        )
+    full, low = (next(result for result in results if result["profile"] == profile) for profile in ("full", "low"))
+    print(f"Écart full - low : {(full['messages'] - full['base'] - low['messages'] + low['base']) // 1024} Mo")
+
+if __name__ == "__main__":
+    main()
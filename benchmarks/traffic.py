@@ -0,0 +1,113 @@
+"""Générateurs de trafic reproductibles (graine fixe) pour les benchmarks des cogs de modération.
+
+Chaque générateur renvoie une liste de FakeMessage construite à l'avance, afin que
+la génération ne soit pas comptée dans les mesures.
+"""
+import random
+
+WORDS = (
+    "salut", "bonjour", "merci", "oui", "non", "peut-être", "demain", "ce", "soir", "jeu", "partie",
+    "serveur", "musique", "film", "vraiment", "trop", "bien", "mdr", "quelqu'un", "dispo", "pour", "un",
+    "vocal", "stream", "nouveau", "message", "photo", "incroyable", "pourquoi", "comment", "ça", "va",
+)
+
+def chat_line(rng):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 14)))
+
+def gif_url(rng, gif_id=None):
+    """Lien Tenor ou Giphy (reconnus comme GIF par le classifieur)."""
+    gif_id = rng.randrange(10**9) if gif_id is None else gif_id
+    if gif_id % 2:
+        return f"https://tenor.com/view/reaction-{gif_id}"
+    return f"https://giphy.com/gifs/reaction-{gif_id:x}abcdef"
+
+def _pick(world, rng):
+    guild = rng.choice(world.guilds)
+    channel = rng.choice(list(guild.channels.values()))
+    author = rng.choice(world.members[guild.id])
+    return guild, channel, author
+
+def normal_chat(world, count, seed=1, gif_ratio=0.05):
+    """Conversation ordinaire : contenus variés, quelques GIF."""
+    rng = random.Random(seed)
+    messages = []
+    for _ in range(count):
+        guild, channel, author = _pick(world, rng)
+        content = gif_url(rng) if rng.random() < gif_ratio else chat_line(rng)
+        messages.append(world.message(guild, channel, author, content))
+    return messages
+
+def single_user_spam(world, count, seed=2, spam_ratio=0.3):
+    """Un spammeur par serveur répète le même message dans tous les salons, au milieu du trafic normal."""
+    rng = random.Random(seed)
+    spammers = {guild.id: (world.members[guild.id][0], chat_line(rng)) for guild in world.guilds}
+    messages = []
+    for _ in range(count):
+        guild, channel, author = _pick(world, rng)
+        if rng.random() < spam_ratio:
+            author, content = spammers[guild.id]
+        else:
+            content = chat_line(rng)
+        messages.append(world.message(guild, channel, author, content))
+    return messages
+
+def multi_channel_raid(world, count, seed=3, raid_ratio=0.5, raiders=50):
+    """Raid coordonné : `raiders` comptes publient le même message (légèrement varié) dans plusieurs salons."""
+    rng = random.Random(seed)
+    raids = {}
+    for guild in world.guilds:
+        members = world.members[guild.id]
+        raids[guild.id] = (rng.sample(members, min(raiders, len(members))), chat_line(rng) + " rejoignez https://discord.gg/raid")
+    messages = []
+    for _ in range(count):
+        guild, channel, author = _pick(world, rng)
+        if rng.random() < raid_ratio:
+            accounts, content = raids[guild.id]
+            author = rng.choice(accounts)
+            if rng.random() < 0.3:
+                content = content.upper()
+        else:
+            content = chat_line(rng)
+        messages.append(world.message(guild, channel, author, content))
+    return messages
+
+def gif_flood(world, count, seed=4, flooded_channels=2):
+    """Avalanche de GIF concentrée sur quelques salons par serveur."""
+    rng = random.Random(seed)
+    targets = {guild.id: list(guild.channels.values())[:flooded_channels] for guild in world.guilds}
+    messages = []
+    for _ in range(count):
+        guild = rng.choice(world.guilds)
+        channel = rng.choice(targets[guild.id])
+        author = rng.choice(world.members[guild.id])
+        messages.append(world.message(guild, channel, author, gif_url(rng, rng.randrange(500))))
+    return messages
+
+def banned_gif_traffic(world, count, banned, seed=5, banned_ratio=0.1):
+    """GIF dont une partie figure dans la liste des GIF interdits `banned` ({guild_id: [lien]})."""
+    rng = random.Random(seed)
+    messages = []
+    for _ in range(count):
+        guild, channel, author = _pick(world, rng)
+        if rng.random() < banned_ratio:
+            content = rng.choice(banned[guild.id])
+        elif rng.random() < 0.5:
+            content = gif_url(rng)
+        else:
+            content = chat_line(rng)
+        messages.append(world.message(guild, channel, author, content))
+    return messages
+
+def ban_list(world, size, seed=6, pattern_ratio=0.05):
+    """Liste de GIF interdits par serveur : liens Tenor/Giphy, et quelques motifs libres (sans lien)."""
+    rng = random.Random(seed)
+    banned = {}
+    for guild in world.guilds:
+        entries = []
+        for i in range(size):
+            if rng.random() < pattern_ratio:
+                entries.append(f"motif-interdit-{guild.id}-{i}")
+            else:
+                entries.append(gif_url(rng, 10**9 + rng.randrange(10**9)))
+        banned[guild.id] = entries
+    return banned
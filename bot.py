@@ -1,80 +1,266 @@
 import os
 from dotenv import load_dotenv
-from keep_alive import keep_alive
 import discord
 from discord.ext import commands
 import asyncio
+import hashlib
+import json
+import logging
+import signal
+import time
+from action_queue import ModerationQueue
+from pipeline import ModerationPipeline
+from storage import Storage
+from memory_profile import MEMORY_PROFILE, bot_options, require_cache
+from health_server import HEALTH_HOST, HealthServer, RestLatency, health_port
+from perf import InstrumentedTree, PerfMonitor
+from event_trace import TRACE_DIR, TraceRecorder
+
+log = logging.getLogger("bot")
 
 # Charger le token depuis le fichier .env
 load_dotenv()
 token = os.getenv("DISCORD_TOKEN")
+# Niveau de journalisation (DEBUG, INFO, WARNING, ERROR)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
 
-# Initialisation des intents pour lire le contenu des messages
-intents = discord.Intents.default()
-intents.message_content = True
+# Mode de connexion : "none" (une seule connexion), "auto" (toutes les shards dans ce processus),
+# "process" (shards SHARD_IDS sur SHARD_COUNT, processus lancé par launcher.py)
+SHARD_MODE = os.getenv("SHARD_MODE", "none").lower()
+# Délai maximal (s) accordé à l'arrêt pour exécuter les actions de modération en attente (bannissements, suppressions, alertes)
+SHUTDOWN_DRAIN_TIMEOUT = float(os.getenv("SHUTDOWN_DRAIN_TIMEOUT", "10"))
 
-# Initialisation du bot avec un préfixe de commande
-bot = commands.Bot(command_prefix="!", intents=intents)
+# Manifeste des extensions : {extension: dépendances}. Les extensions sans dépendance entre elles
+# sont chargées en parallèle ; les panneaux de configuration attendent les cogs qu'ils pilotent.
+EXTENSIONS = {
+    "clear_cog": (),
+    "gif_cog": (),
+    "ban_gif_cog": (),
+    "anti_spam_cog": (),
+    "shard_cog": (),
+    "perf_cog": (),
+    "config_gif_cog": ("gif_cog", "ban_gif_cog"),
+    "anti_spam_config": ("anti_spam_cog",),
+}
 
-@bot.event
-async def on_ready():
-    print(f"Bot connecté en tant que {bot.user}")
-    print("Extensions actuellement chargées :", bot.extensions)
+# Caches de la passerelle lus par une extension : {extension: {"members" | "messages" | "voice_states": True}}.
+# Vérifiés avant le chargement : avec MEMORY_PROFILE=low, une extension qui en a besoin échoue clairement.
+# Les extensions actuelles ne lisent que les données de l'événement ou de l'interaction (auteur, permissions) :
+# toute nouvelle lecture de guild.members, du cache des messages ou des états vocaux doit être déclarée ici.
+EXTENSION_CACHES = {}
 
-    # Définir l'activité du bot
-    activity = discord.Game(name="Surveiller les serveurs")
-    await bot.change_presence(status=discord.Status.online, activity=activity)
+def parse_shard_ids(value):
+    """ "0-3,8" -> [0, 1, 2, 3, 8] """
+    shard_ids = []
+    for part in value.split(","):
+        first, _, last = part.strip().partition("-")
+        shard_ids.extend(range(int(first), int(last or first) + 1))
+    return shard_ids
 
-    # Synchroniser les commandes slash avec Discord
-    print("Synchronisation des commandes slash...")
-    try:
-        synced = await bot.tree.sync()
-        print(f"Commandes slash synchronisées avec succès : {[command.name for command in synced]}")
-    except Exception as e:
-        print(f"Erreur lors de la synchronisation des commandes slash : {e}")
+def create_bot(shard_mode=SHARD_MODE, memory_profile=MEMORY_PROFILE):
+    """Construit le bot et ses objets partagés selon le mode de connexion.
 
-async def load_extensions():
-    """Fonction pour charger les extensions"""
-    try:
-        await bot.load_extension("clear_cog")
-        print("Extension clear_cog chargée.")
-    except Exception as e:
-        print(f"Erreur de chargement clear_cog: {e}")
+    Chaque serveur appartient à une seule shard, donc à un seul processus : l'état par
+    serveur des cogs (fenêtres anti-spam, limites de GIF, caches de configuration)
+    reste correct quel que soit le découpage.
+    """
+    # Initialisation des intents pour lire le contenu des messages
+    intents = discord.Intents.default()
+    intents.message_content = True
+    # Caches de la passerelle (membres, messages, états vocaux) selon le profil mémoire
+    options = bot_options(intents, memory_profile)
+    # Durée des appels REST, exposée par le serveur de santé
+    rest_latency = RestLatency()
+    options["http_trace"] = rest_latency.trace_config()
+    # Arbre des commandes slash instrumenté (durée de chaque commande, visible avec /perf)
+    options["tree_cls"] = InstrumentedTree
 
-    try:
-        await bot.load_extension("gif_cog")
-        print("Extension gif_cog chargée.")
-    except Exception as e:
-        print(f"Erreur de chargement gif_cog: {e}")
+    # Initialisation du bot avec un préfixe de commande
+    if shard_mode == "none":
+        bot = commands.Bot(command_prefix="!", **options)
+    elif shard_mode == "auto":
+        shard_count = os.getenv("SHARD_COUNT")
+        bot = commands.AutoShardedBot(command_prefix="!", shard_count=int(shard_count) if shard_count else None, **options)
+    elif shard_mode == "process":
+        bot = commands.AutoShardedBot(
+            command_prefix="!",
+            shard_ids=parse_shard_ids(os.environ["SHARD_IDS"]),
+            shard_count=int(os.environ["SHARD_COUNT"]),
+            **options,
+        )
+    else:
+        raise ValueError(f"SHARD_MODE invalide : {shard_mode!r} (attendu : none, auto ou process)")
 
-    try:
-        await bot.load_extension("ban_gif_cog")
-        print("Extension ban_gif_cog chargée.")
-    except Exception as e:
-        print(f"Erreur de chargement ban_gif_cog: {e}")
+    # Profil mémoire, comparé aux caches déclarés dans EXTENSION_CACHES au chargement des extensions
+    bot.memory_profile = memory_profile
+    bot.rest_latency = rest_latency
+    # Histogrammes de latence par gestionnaire et sonde de retard de la boucle d'événements
+    bot.perf = PerfMonitor()
+
+    # File partagée des actions de modération (bannissements, suppressions, alertes, avertissements)
+    bot.moderation_queue = ModerationQueue(perf=bot.perf)
+
+    # Pipeline unique de modération : chaque message est analysé une fois puis passé aux cogs dans un ordre fixe
+    bot.pipeline = ModerationPipeline(perf=bot.perf)
+
+    # Base de données unique, interrogée depuis un thread dédié pour ne jamais bloquer la boucle d'événements
+    bot.storage = Storage()
 
+    # Début de la connexion à la passerelle, et vérification des commandes slash déjà faite pour ce processus
+    bot.started_at = None
+    bot.commands_checked = False
+    # Toutes les extensions du manifeste chargées (condition de /readyz)
+    bot.extensions_ready = False
+
+    @bot.event
+    async def on_ready():
+        log.info("Bot connecté en tant que %s", bot.user)
+        log.info("Extensions actuellement chargées : %s", ", ".join(bot.extensions))
+        if bot.started_at is not None:
+            log.info("Démarrage : connexion à la passerelle en %.2f s", time.perf_counter() - bot.started_at)
+            bot.started_at = None
+
+        # Définir l'activité du bot
+        activity = discord.Game(name="Surveiller les serveurs")
+        await bot.change_presence(status=discord.Status.online, activity=activity)
+
+        # Synchroniser les commandes slash avec Discord (une fois par processus, et seulement si elles ont changé).
+        # Les commandes sont globales : seul le processus de la shard 0 s'en charge.
+        shard_ids = getattr(bot, "shard_ids", None)
+        owns_first_shard = shard_ids is None or 0 in shard_ids
+        if not bot.commands_checked and owns_first_shard:
+            bot.commands_checked = True
+            await sync_commands(bot)
+
+    @bot.event
+    async def on_message(message):
+        await bot.pipeline.dispatch(message)
+        await bot.process_commands(message)
+
+    bot.add_listener(bot.tree.on_app_command_completion)
+
+    return bot
+
+def command_tree_hash(bot):
+    """Empreinte des commandes slash telles qu'envoyées à Discord."""
+    payload = sorted(
+        (command.to_dict(bot.tree) for command in bot.tree.get_commands()),
+        key=lambda command: (command.get("type", 1), command["name"]),
+    )
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+async def sync_commands(bot):
+    """Synchronise les commandes slash si leur empreinte diffère de celle de la dernière synchronisation."""
+    start = time.perf_counter()
+    meta_key = f"command_tree_hash:{bot.application_id}"
+    tree_hash = command_tree_hash(bot)
+    if await bot.storage.get_meta(meta_key) == tree_hash:
+        log.info("Démarrage : commandes slash inchangées, synchronisation ignorée (%.3f s)", time.perf_counter() - start)
+        return
+    log.info("Synchronisation des commandes slash...")
     try:
-        await bot.load_extension("config_gif_cog")
-        print("Extension config_gif_cog chargée.")
+        synced = await bot.tree.sync()
+        await bot.storage.set_meta(meta_key, tree_hash)
+        log.info("Commandes slash synchronisées avec succès : %s", ", ".join(command.name for command in synced))
     except Exception as e:
-        print(f"Erreur de chargement config_gif_cog: {e}")
+        log.error("Erreur lors de la synchronisation des commandes slash : %s", e)
+    log.info("Démarrage : synchronisation des commandes en %.2f s", time.perf_counter() - start)
 
+async def load_extension(bot, name):
+    start = time.perf_counter()
     try:
-        await bot.load_extension("anti_spam_cog")
-        print("Extension anti_spam_cog chargée.")
+        require_cache(bot, name, **EXTENSION_CACHES.get(name, {}))
+        await bot.load_extension(name)
     except Exception as e:
-        print(f"Erreur de chargement anti_spam_cog: {e}")
+        log.error("Erreur de chargement %s : %s", name, e)
+        return False
+    log.info("Extension %s chargée (%.2f s).", name, time.perf_counter() - start)
+    return True
+
+async def load_extensions(bot, extensions=EXTENSIONS):
+    """Charge les extensions du manifeste par vagues : chaque vague est chargée en parallèle,
+    une extension ne l'est qu'après toutes ses dépendances. Renvoie les extensions non chargées."""
+    loaded = set()
+    failed = set()
+    remaining = dict(extensions)
+    wave_number = 0
+    while remaining:
+        wave_number += 1
+        # Extensions dont une dépendance n'a pas pu être chargée (ou n'existe pas) : ignorées
+        for name, dependencies in list(remaining.items()):
+            missing = [dependency for dependency in dependencies if dependency in failed or dependency not in extensions]
+            if missing:
+                log.error("Erreur de chargement %s : dépendance(s) non chargée(s) : %s", name, ", ".join(missing))
+                failed.add(name)
+                del remaining[name]
+        wave = [name for name, dependencies in remaining.items() if all(dependency in loaded for dependency in dependencies)]
+        if not wave:
+            if remaining:
+                log.error("Erreur de chargement : dépendances circulaires entre %s", ", ".join(remaining))
+            break
+        start = time.perf_counter()
+        results = await asyncio.gather(*(load_extension(bot, name) for name in wave))
+        for name, ok in zip(wave, results):
+            (loaded if ok else failed).add(name)
+            del remaining[name]
+        log.info("Démarrage : vague %d (%s) en %.2f s", wave_number, ", ".join(wave), time.perf_counter() - start)
+    return failed | set(remaining)
 
+async def drain_moderation_queue(bot):
+    """Exécute les actions de modération en attente, dans la limite de SHUTDOWN_DRAIN_TIMEOUT."""
     try:
-        await bot.load_extension("anti_spam_config_cog")
-        print("Extension anti_spam_config_cog chargée.")
-    except Exception as e:
-        print(f"Erreur lors du chargement de l'extension anti_spam_config_cog : {e}")
+        await asyncio.wait_for(bot.moderation_queue.join(), SHUTDOWN_DRAIN_TIMEOUT)
+    except asyncio.TimeoutError:
+        log.warning(
+            "Arrêt : actions de modération non terminées après %g s (%d encore en attente), abandonnées.",
+            SHUTDOWN_DRAIN_TIMEOUT, bot.moderation_queue.depth(),
+        )
+
+async def shutdown(bot):
+    """Arrêt sur SIGTERM : vide la file de modération tant que la connexion est ouverte, puis ferme le bot."""
+    await drain_moderation_queue(bot)
+    await bot.close()
 
 async def main():
-    await load_extensions()  # Charger toutes les extensions
-    #keep_alive()  # Démarrer le service keep_alive si nécessaire
-    await bot.start(token)  # Démarrer le bot avec le token
+    discord.utils.setup_logging(level=LOG_LEVEL)
+    bot = create_bot()
+    start = time.perf_counter()
+    await bot.storage.open()  # Ouvrir la base (et reprendre les anciennes bases au premier démarrage)
+    log.info("Démarrage : base de données ouverte en %.2f s", time.perf_counter() - start)
+    port = health_port()
+    health = HealthServer(bot, HEALTH_HOST, port) if port else None
+    # Trace anonymisée des messages, pour rejouer les réglages hors ligne (replay.py)
+    trace = TraceRecorder(TRACE_DIR) if TRACE_DIR else None
+    try:
+        async with bot:  # Décharge les extensions à l'arrêt du bot
+            # Arrêt propre sur SIGTERM (redéploiement) : les actions de modération en attente sont exécutées,
+            # puis les cogs enregistrent leurs instantanés en se déchargeant
+            try:
+                asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, lambda: asyncio.create_task(shutdown(bot)))
+            except NotImplementedError:
+                pass  # Windows
+            if health is not None:
+                await health.start()  # /livez répond dès maintenant, /readyz une fois connecté
+            bot.perf.start()
+            if trace is not None:
+                trace.start()
+                bot.pipeline.register("trace", trace.record)
+            start = time.perf_counter()
+            failed = await load_extensions(bot)  # Charger toutes les extensions
+            bot.extensions_ready = not failed
+            log.info("Démarrage : extensions chargées en %.2f s", time.perf_counter() - start)
+            bot.started_at = time.perf_counter()
+            await bot.start(token)  # Démarrer le bot avec le token
+    finally:
+        await drain_moderation_queue(bot)
+        await bot.moderation_queue.close()
+        await bot.perf.stop()
+        if trace is not None:
+            await trace.stop()
+        if health is not None:
+            await health.stop()
+        await bot.storage.close()
 
 # Démarrage du bot avec la fonction main
-asyncio.run(main())
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,7 +1,11 @@
+import logging
+
 import discord
 from discord import app_commands
 from discord.ext import commands
 
+log = logging.getLogger(__name__)
+
 class ClearCommand(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
@@ -28,9 +32,9 @@ class ClearCommand(commands.Cog):
             # Supprime le nombre de messages spécifié
             deleted = await interaction.channel.purge(limit=amount)
             deleted_count = len(deleted)
-            print(f"DEBUG: {deleted_count} messages supprimés.")
+            log.info("%d messages supprimés dans le salon %s par %s.", deleted_count, interaction.channel.id, interaction.user.id)
         except Exception as e:
-            print(f"Erreur lors de la suppression des messages : {e}")
+            log.error("Erreur lors de la suppression des messages : %s", e)
             await interaction.followup.send("Une erreur s'est produite lors de la suppression des messages.")
             return
 
@@ -19,7 +19,7 @@ class LimitGifModal(discord.ui.Modal, title="Définir Limite de GIF"):
     async def on_submit(self, interaction: discord.Interaction):
         try:
             limit = int(self.limit.value)
-            self.gif_cog.update_channel_config(interaction.guild_id, interaction.channel_id, gif_limit=limit)
+            await self.gif_cog.update_channel_config(interaction.guild_id, interaction.channel_id, gif_limit=limit)
             await interaction.response.send_message(f"La limite de GIF a été définie sur {limit} pour ce salon.", ephemeral=True)
         except ValueError:
             await interaction.response.send_message("Valeur invalide. Veuillez entrer un nombre entier.", ephemeral=True)
@@ -34,7 +34,7 @@ class SetTimeWindowModal(discord.ui.Modal, title="Définir Période de Temps"):
     async def on_submit(self, interaction: discord.Interaction):
         try:
             time_window = int(self.time_window.value)
-            self.gif_cog.update_channel_config(interaction.guild_id, interaction.channel_id, time_window=time_window)
+            await self.gif_cog.update_channel_config(interaction.guild_id, interaction.channel_id, time_window=time_window)
             await interaction.response.send_message(f"La période de temps pour les GIF a été définie sur {time_window} secondes pour ce salon.", ephemeral=True)
         except ValueError:
             await interaction.response.send_message("Valeur invalide. Veuillez entrer un nombre entier.", ephemeral=True)
@@ -48,7 +48,7 @@ class BanGifModal(discord.ui.Modal, title="Interdire un GIF"):
 
     async def on_submit(self, interaction: discord.Interaction):
         gif_url = self.gif_url.value
-        self.ban_gif_cog.add_banned_gif(interaction.guild_id, gif_url)
+        await self.ban_gif_cog.add_banned_gif(interaction.guild_id, gif_url)
         await interaction.response.send_message(f"Le GIF {gif_url} a été interdit.", ephemeral=True)
 
 class UnbanGifModal(discord.ui.Modal, title="Autoriser un GIF"):
@@ -60,7 +60,7 @@ class UnbanGifModal(discord.ui.Modal, title="Autoriser un GIF"):
 
     async def on_submit(self, interaction: discord.Interaction):
         gif_url = self.gif_url.value
-        self.ban_gif_cog.remove_banned_gif(interaction.guild_id, gif_url)
+        await self.ban_gif_cog.remove_banned_gif(interaction.guild_id, gif_url)
         await interaction.response.send_message(f"Le GIF {gif_url} a été autorisé.", ephemeral=True)
 
 class MainMenuView(discord.ui.View):
@@ -93,22 +93,23 @@ class GifLimitSubMenuView(discord.ui.View):
     @discord.ui.button(label="Activer Limite de GIF (Salon)", style=discord.ButtonStyle.success, custom_id="enable_gif_limit")
     async def enable_gif_limit(self, interaction: discord.Interaction, button: discord.ui.Button):
         if self.gif_cog:
-            self.gif_cog.update_channel_config(interaction.guild_id, interaction.channel_id, is_enabled=True)
+            await self.gif_cog.update_channel_config(interaction.guild_id, interaction.channel_id, is_enabled=True)
             await interaction.response.send_message("La limitation de GIF a été activée pour ce salon.", ephemeral=True)
 
     @discord.ui.button(label="Désactiver Limite de GIF (Salon)", style=discord.ButtonStyle.danger, custom_id="disable_gif_limit")
     async def disable_gif_limit(self, interaction: discord.Interaction, button: discord.ui.Button):
         if self.gif_cog:
-            self.gif_cog.update_channel_config(interaction.guild_id, interaction.channel_id, is_enabled=False)
+            await self.gif_cog.update_channel_config(interaction.guild_id, interaction.channel_id, is_enabled=False)
             await interaction.response.send_message("La limitation de GIF a été désactivée pour ce salon.", ephemeral=True)
 
     @discord.ui.button(label="Afficher la configuration GIF", style=discord.ButtonStyle.secondary, custom_id="show_gif_config")
     async def show_gif_config(self, interaction: discord.Interaction, button: discord.ui.Button):
         if self.gif_cog:
-            gif_limit, time_window, is_enabled = self.gif_cog.get_channel_config(interaction.guild_id, interaction.channel_id)
+            gif_limit, time_window, is_enabled, limit_scope, limit_algorithm = self.gif_cog.get_channel_config(interaction.guild_id, interaction.channel_id)
             status = "activée" if is_enabled else "désactivée"
             await interaction.response.send_message(
-                f"Configuration actuelle pour ce salon :\nLimite de GIF : {gif_limit}\nPériode de temps : {time_window} secondes\nStatut : {status}", 
+                f"Configuration actuelle pour ce salon :\nLimite de GIF : {gif_limit}\nPériode de temps : {time_window} secondes\nStatut : {status}"
+                f"\nPortée : {limit_scope}\nAlgorithme : {limit_algorithm}",
                 ephemeral=True
             )
 
@@ -128,7 +129,7 @@ class GifManagementSubMenuView(discord.ui.View):
     @discord.ui.button(label="Afficher les GIFs Interdits", style=discord.ButtonStyle.secondary, custom_id="show_banned_gifs")
     async def show_banned_gifs(self, interaction: discord.Interaction, button: discord.ui.Button):
         if self.ban_gif_cog:
-            banned_gifs = self.ban_gif_cog.get_banned_gifs(interaction.guild_id)
+            banned_gifs = await self.ban_gif_cog.get_banned_gifs(interaction.guild_id)
             if banned_gifs:
                 gif_list = "\n".join(banned_gifs)
                 await interaction.response.send_message(f"GIFs interdits pour ce serveur:\n{gif_list}", ephemeral=True)
@@ -0,0 +1,177 @@
+"""Enregistrement des messages vus par le pipeline de modération, pour rejouer les réglages hors ligne (replay.py).
+
+Activé seulement si TRACE_DIR est défini. Chaque message devient un enregistrement
+binaire de taille fixe, sans contenu ni identifiant Discord : serveur, salon et
+auteur sont remplacés par une empreinte à clé (blake2b), le contenu par les
+empreintes à clé de content_hash et normalized_hash. Les fichiers ne sont jamais
+réécrits : les enregistrements sont ajoutés en fin de fichier, par lots, et un
+nouveau fichier est commencé au-delà de TRACE_MAX_BYTES.
+
+Avec la même TRACE_KEY, les empreintes sont identiques d'un fichier et d'un
+processus à l'autre. Sans TRACE_KEY, une clé aléatoire est tirée au démarrage :
+les traces ne peuvent alors pas être reliées entre deux redémarrages.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import struct
+import time
+
+log = logging.getLogger(__name__)
+
+TRACE_DIR = os.getenv("TRACE_DIR", "")
+TRACE_KEY = os.getenv("TRACE_KEY", "")
+TRACE_MAX_BYTES = int(os.getenv("TRACE_MAX_BYTES", str(64 * 1024 * 1024)))
+TRACE_FLUSH_INTERVAL = float(os.getenv("TRACE_FLUSH_INTERVAL", "5"))
+# Taille du tampon au-delà de laquelle un lot est écrit sans attendre l'intervalle
+TRACE_BUFFER_BYTES = 64 * 1024
+
+# Fichier : en-tête, puis enregistrements jusqu'à la fin (un dernier enregistrement tronqué est ignoré).
+# L'horodatage d'un enregistrement est l'écart en millisecondes avec le précédent (ou avec l'en-tête).
+MAGIC = b"YBTR"
+VERSION = 1
+HEADER = struct.Struct("<4sHd")  # magic, version, date de début (time.time())
+RECORD = struct.Struct("<IQQQQQB")  # écart (ms), serveur, salon, auteur, contenu, contenu normalisé, drapeaux
+SUFFIX = ".ybtr"
+
+# Drapeaux
+IS_GIF = 1
+HAS_NORMALIZED = 2  # contenu normalisé non vide (pris en compte par la détection de raid)
+ADMINISTRATOR = 4  # auteur administrateur (ignoré par la limite de GIF)
+
+def keyed_hash(key, value):
+    """Empreinte à clé (64 bits) d'un entier."""
+    return int.from_bytes(hashlib.blake2b(value.to_bytes(8, "big"), key=key, digest_size=8).digest(), "big")
+
+class TraceRecorder:
+    """Étape « trace » du pipeline : enregistre chaque message, puis le laisse aux étapes suivantes."""
+
+    def __init__(self, directory, key=TRACE_KEY, max_bytes=TRACE_MAX_BYTES, flush_interval=TRACE_FLUSH_INTERVAL):
+        self.directory = directory
+        if key:
+            self.key = hashlib.blake2b(key.encode("utf-8"), digest_size=32).digest()
+        else:
+            self.key = os.urandom(32)
+            log.warning("TRACE_KEY non défini : clé aléatoire, traces non reliables entre deux redémarrages")
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self.buffer = bytearray()
+        self.last = None  # instant du dernier enregistrement (time.time()) ; None : prochain enregistrement dans un nouveau fichier
+        self.new_file = False  # le tampon commence par l'en-tête d'un nouveau fichier
+        self.file = None
+        self.files = 0
+        self.written = 0
+        self.records = 0
+        self.lock = asyncio.Lock()  # un seul lot écrit à la fois, dans l'ordre
+        self.task = None
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self.task = asyncio.create_task(self.flush_loop(), name="trace_flush")
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        await self.flush()
+        if self.file is not None:
+            await asyncio.to_thread(self.file.close)
+            self.file = None
+        log.info("Trace : %d messages enregistrés dans %s", self.records, self.directory)
+
+    async def record(self, context):
+        """Étape du pipeline (ne supprime jamais le message)."""
+        now = time.time()
+        if self.last is None:
+            # Nouveau fichier : l'écart du premier enregistrement est compté depuis l'en-tête
+            self.buffer += HEADER.pack(MAGIC, VERSION, now)
+            self.new_file = True
+            self.last = now
+        # Écart arrondi à la milliseconde : on avance du temps enregistré pour ne pas dériver
+        delta = min(int((now - self.last) * 1000), 0xFFFFFFFF)
+        self.last += delta / 1000
+        flags = (
+            (IS_GIF if context.is_gif else 0)
+            | (HAS_NORMALIZED if context.normalized else 0)
+            | (ADMINISTRATOR if getattr(context.message.author.guild_permissions, "administrator", False) else 0)
+        )
+        key = self.key
+        self.buffer += RECORD.pack(
+            delta,
+            keyed_hash(key, context.guild_id),
+            keyed_hash(key, context.channel_id),
+            keyed_hash(key, context.author_id),
+            keyed_hash(key, context.content_hash),
+            keyed_hash(key, context.normalized_hash),
+            flags,
+        )
+        self.records += 1
+        if len(self.buffer) >= TRACE_BUFFER_BYTES and not self.lock.locked():
+            asyncio.create_task(self.flush())
+        return False
+
+    async def flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except OSError as e:
+                log.error("Trace : écriture impossible dans %s : %s", self.directory, e)
+
+    async def flush(self):
+        async with self.lock:
+            if not self.buffer:
+                return
+            data = bytes(self.buffer)
+            new_file = self.new_file
+            self.buffer.clear()
+            self.new_file = False
+            if self.written + len(data) > self.max_bytes:
+                # Le lot suivant commencera un nouveau fichier, avec son propre en-tête
+                self.last = None
+            await asyncio.to_thread(self.write, data, new_file)
+
+    def write(self, data, new_file):
+        if new_file:
+            if self.file is not None:
+                self.file.close()
+            self.files += 1
+            name = f"trace-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{self.files:04d}{SUFFIX}"
+            self.file = open(os.path.join(self.directory, name), "ab")
+            self.written = 0
+        self.file.write(data)
+        self.file.flush()
+        self.written += len(data)
+
+def read_trace(path):
+    """Parcourt un fichier de trace : (horodatage, serveur, salon, auteur, contenu, contenu normalisé, drapeaux)."""
+    with open(path, "rb") as f:
+        header = f.read(HEADER.size)
+        if len(header) < HEADER.size:
+            return
+        magic, version, now = HEADER.unpack(header)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} : format inconnu ({magic!r}, version {version})")
+        # Lecture par blocs d'enregistrements entiers
+        chunk_size = RECORD.size * 4096
+        while True:
+            data = f.read(chunk_size)
+            usable = len(data) - len(data) % RECORD.size
+            for delta, guild, channel, author, content, normalized, flags in RECORD.iter_unpack(data[:usable]):
+                now += delta / 1000
+                yield now, guild, channel, author, content, normalized, flags
+            if len(data) < chunk_size:
+                if usable < len(data):
+                    log.warning("%s : dernier enregistrement tronqué ignoré", path)
+                return
+
+def trace_files(paths):
+    """Fichiers de trace désignés par `paths` (fichiers ou dossiers), dans l'ordre chronologique des noms."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(os.path.join(path, name) for name in os.listdir(path) if name.endswith(SUFFIX))
+        else:
+            files.append(path)
+    return sorted(files, key=os.path.basename)
@@ -0,0 +1,51 @@
+from functools import lru_cache
+from urllib.parse import urlsplit
+
+from gif_identity import extract_urls
+
+# Hébergeurs dont les liens sont toujours des GIF (ou des vidéos affichées comme des GIF)
+GIF_PROVIDER_DOMAINS = ("tenor.com", "giphy.com", "gfycat.com", "klipy.com")
+GIF_EXTENSIONS = (".gif", ".gifv")
+GIF_CONTENT_TYPES = ("image/gif",)
+GIF_EMBED_TYPES = ("gifv",)
+GIF_PROVIDER_NAMES = ("tenor", "giphy", "gfycat", "klipy")
+
+@lru_cache(maxsize=4096)
+def _classify_url(url):
+    parts = urlsplit(url)
+    host = (parts.hostname or "").lower()
+    if any(host == domain or host.endswith("." + domain) for domain in GIF_PROVIDER_DOMAINS):
+        return True
+    return parts.path.lower().endswith(GIF_EXTENSIONS)
+
+def is_gif_url(url):
+    """Indique si un lien pointe vers un GIF (verdict mis en cache par lien)."""
+    return _classify_url(url.split("?", 1)[0])
+
+def is_gif_attachment(attachment):
+    return (attachment.content_type or "").lower() in GIF_CONTENT_TYPES or attachment.filename.lower().endswith(GIF_EXTENSIONS)
+
+def is_gif_embed(embed):
+    if embed.type in GIF_EMBED_TYPES:
+        return True
+    provider = (embed.provider.name or "").lower()
+    if provider in GIF_PROVIDER_NAMES:
+        return True
+    return any(url and is_gif_url(url) for url in (embed.url, embed.image.url, embed.video.url))
+
+def is_gif_message(message, urls=None):
+    """Indique si un message contient un GIF : pièce jointe, embed ou lien.
+
+    urls : liens du contenu déjà extraits (sinon ils sont extraits ici).
+    """
+    if any(is_gif_attachment(attachment) for attachment in message.attachments):
+        return True
+    if any(is_gif_embed(embed) for embed in message.embeds):
+        return True
+    if urls is None:
+        urls = extract_urls(message.content)
+    return any(is_gif_url(url) for url in urls)
+
+def cache_info():
+    """Statistiques du cache des verdicts par lien."""
+    return _classify_url.cache_info()
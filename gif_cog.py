@@ -1,10 +1,23 @@
 import discord
 from discord import app_commands
-from discord.ext import commands
-import sqlite3
+from discord.ext import commands, tasks
+import asyncio
+import logging
+import os
 import time
-from collections import defaultdict
-import re
+from typing import Literal
+from action_queue import DELETE, NOTICE
+from gif_limiter import GifLimiter
+from snapshot import SNAPSHOT_DIR, SNAPSHOT_INTERVAL, SnapshotFile, copy_gif_state, decode_gif_states, encode_blocks, encode_gif_states, wall_offset
+from storage import DEFAULT_GIF_CONFIG, GIF_CONFIG_COLUMNS, GUILD_DEFAULT_CHANNEL
+
+log = logging.getLogger(__name__)
+
+# Nombre maximum d'états de limite (salon ou utilisateur) gardés en mémoire
+MAX_LIMITER_ENTRIES = int(os.getenv("GIF_LIMIT_MAX_ENTRIES", "100000"))
+
+SCOPE_LABELS = {"channel": "à tout le salon", "user": "à chaque utilisateur"}
+ALGORITHM_LABELS = {"sliding": "une fenêtre glissante", "bucket": "un seau à jetons"}
 
 # Fonction de vérification personnalisée pour autoriser les administrateurs ou les utilisateurs ayant la permission de gérer les messages
 def admin_or_manage_messages():
@@ -16,112 +29,204 @@ def admin_or_manage_messages():
 class GifLimit(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.gif_count = defaultdict(lambda: {"count": 0, "timestamp": time.time()})
-
-        # Connexion à la base de données
-        self.conn = sqlite3.connect("server_config.db")
-        self.cursor = self.conn.cursor()
-        
-        # Création de la table si elle n'existe pas
-        self.cursor.execute("""
-            CREATE TABLE IF NOT EXISTS gif_config (
-                server_id INTEGER,
-                channel_id INTEGER,
-                gif_limit INTEGER DEFAULT 5,
-                time_window INTEGER DEFAULT 60,
-                is_enabled BOOLEAN DEFAULT 0,
-                PRIMARY KEY (server_id, channel_id)
-            )
-        """)
-        self.conn.commit()
+        self.queue = bot.moderation_queue
+        self.limiter = GifLimiter(MAX_LIMITER_ENTRIES)
+        # États enregistrés avant le dernier arrêt, repris serveur par serveur au premier GIF
+        self.snapshot = SnapshotFile(os.path.join(SNAPSHOT_DIR, "gif_limit.snap"))
+
+        self.storage = bot.storage
+
+        # Réglages par défaut des serveurs {server_id: valeurs}, réglages propres aux salons
+        # {server_id: {channel_id: valeurs, None = hérité}} et serveurs ayant au moins un salon limité
+        self.guild_defaults = {}
+        self.channel_overrides = {}
+        self.enabled_guilds = set()
+
+    async def load_config(self):
+        """Charge en mémoire les réglages par défaut des serveurs et les réglages propres aux salons."""
+        self.guild_defaults = {}
+        self.channel_overrides = {}
+        for server_id, channel_id, *values in await self.storage.load_gif_configs():
+            if channel_id == GUILD_DEFAULT_CHANNEL:
+                self.guild_defaults[server_id] = [
+                    default if value is None else value for value, default in zip(values, DEFAULT_GIF_CONFIG)
+                ]
+            else:
+                self.channel_overrides.setdefault(server_id, {})[channel_id] = values
+        self.enabled_guilds = set()
+        for server_id in self.guild_defaults.keys() | self.channel_overrides.keys():
+            self.refresh_enabled(server_id)
+
+    def refresh_enabled(self, server_id):
+        """Un serveur est actif si la limitation est activée par défaut ou dans au moins un salon."""
+        defaults = self.guild_defaults.get(server_id, DEFAULT_GIF_CONFIG)
+        overrides = self.channel_overrides.get(server_id, {})
+        if defaults[2] or any(values[2] for values in overrides.values()):
+            self.enabled_guilds.add(server_id)
+        else:
+            self.enabled_guilds.discard(server_id)
 
     def get_channel_config(self, server_id, channel_id):
-        """Récupère la configuration de limite de GIF pour un salon spécifique."""
-        self.cursor.execute("SELECT gif_limit, time_window, is_enabled FROM gif_config WHERE server_id = ? AND channel_id = ?", (server_id, channel_id))
-        config = self.cursor.fetchone()
-        if config is None:
-            # Si le salon n'a pas encore de configuration, on utilise les valeurs par défaut
-            self.cursor.execute("INSERT INTO gif_config (server_id, channel_id) VALUES (?, ?)", (server_id, channel_id))
-            self.conn.commit()
-            print(f"DEBUG - Nouvelle configuration créée pour le serveur {server_id}, salon {channel_id} avec valeurs par défaut.")
-            return 5, 60, False  # valeurs par défaut : 5 GIF, 60 secondes, désactivé
-        print(f"DEBUG - Configuration récupérée pour le serveur {server_id}, salon {channel_id}: {config}")
-        return config
-
-    def update_channel_config(self, server_id, channel_id, gif_limit=None, time_window=None, is_enabled=None):
-        """Mise à jour de la configuration pour un salon spécifique. Crée une entrée si elle n'existe pas."""
-        # Vérifier si l'entrée existe déjà pour le salon
-        self.cursor.execute("SELECT 1 FROM gif_config WHERE server_id = ? AND channel_id = ?", (server_id, channel_id))
-        if self.cursor.fetchone() is None:
-            # Insérer une nouvelle entrée si elle n'existe pas
-            self.cursor.execute("INSERT INTO gif_config (server_id, channel_id) VALUES (?, ?)", (server_id, channel_id))
-            self.conn.commit()
-            print(f"DEBUG - Nouvelle entrée créée pour le serveur {server_id}, salon {channel_id}")
-
-        # Mise à jour des paramètres
-        if gif_limit is not None:
-            print(f"DEBUG - Mise à jour de la limite de GIF pour le serveur {server_id}, salon {channel_id} à {gif_limit}")
-            self.cursor.execute("UPDATE gif_config SET gif_limit = ? WHERE server_id = ? AND channel_id = ?", (gif_limit, server_id, channel_id))
-        if time_window is not None:
-            print(f"DEBUG - Mise à jour de la période de temps pour le serveur {server_id}, salon {channel_id} à {time_window}")
-            self.cursor.execute("UPDATE gif_config SET time_window = ? WHERE server_id = ? AND channel_id = ?", (time_window, server_id, channel_id))
+        """Configuration effective d'un salon : réglages du salon, sinon ceux du serveur, sinon les valeurs par défaut.
+
+        Renvoie (gif_limit, time_window, is_enabled, limit_scope, limit_algorithm). Lecture en mémoire uniquement.
+        """
+        defaults = self.guild_defaults.get(server_id, DEFAULT_GIF_CONFIG)
+        overrides = self.channel_overrides.get(server_id)
+        values = overrides.get(channel_id) if overrides else None
+        if values is None:
+            return tuple(defaults)
+        return tuple(default if value is None else value for value, default in zip(values, defaults))
+
+    def inherited_fields(self, server_id, channel_id):
+        """Noms des réglages du salon hérités du serveur."""
+        values = self.channel_overrides.get(server_id, {}).get(channel_id, (None,) * len(GIF_CONFIG_COLUMNS))
+        return [column for column, value in zip(GIF_CONFIG_COLUMNS, values) if value is None]
+
+    async def update_channel_config(self, server_id, channel_id, gif_limit=None, time_window=None, is_enabled=None, limit_scope=None, limit_algorithm=None):
+        """Mise à jour des réglages propres à un salon. Les réglages non précisés restent inchangés."""
+        overrides = self.channel_overrides.setdefault(server_id, {})
+        values = list(overrides.get(channel_id, (None,) * len(GIF_CONFIG_COLUMNS)))
+        for index, value in enumerate((gif_limit, time_window, is_enabled, limit_scope, limit_algorithm)):
+            if value is not None:
+                values[index] = value
+        overrides[channel_id] = values
+        self.refresh_enabled(server_id)
+        await self.storage.set_gif_config(server_id, channel_id, values)
+
+    async def reset_channel_config(self, server_id, channel_id):
+        """Supprime les réglages propres à un salon, qui hérite alors de ceux du serveur."""
+        overrides = self.channel_overrides.get(server_id, {})
+        if overrides.pop(channel_id, None) is None:
+            return False
+        if not overrides:
+            del self.channel_overrides[server_id]
+        self.refresh_enabled(server_id)
+        await self.storage.delete_gif_config(server_id, channel_id)
+        return True
+
+    async def update_server_config(self, server_id, is_enabled=None, gif_limit=None, time_window=None, limit_scope=None, limit_algorithm=None):
+        """Mise à jour des réglages par défaut d'un serveur, hérités par tous ses salons.
+
+        Activer ou désactiver la limitation s'applique à tous les salons : leurs réglages
+        d'activation propres sont effacés.
+        """
+        values = self.guild_defaults.setdefault(server_id, list(DEFAULT_GIF_CONFIG))
+        for index, value in enumerate((gif_limit, time_window, is_enabled, limit_scope, limit_algorithm)):
+            if value is not None:
+                values[index] = value
+        cleared = []
         if is_enabled is not None:
-            print(f"DEBUG - Activation de la limite de GIF pour le serveur {server_id}, salon {channel_id} : {is_enabled}")
-            self.cursor.execute("UPDATE gif_config SET is_enabled = ? WHERE server_id = ? AND channel_id = ?", (is_enabled, server_id, channel_id))
-        self.conn.commit()
-
-    def update_server_config(self, server_id, is_enabled):
-        """Active ou désactive la limitation de GIF pour tous les salons d'un serveur."""
-        print(f"DEBUG - Mise à jour de la limite de GIF pour tous les salons du serveur {server_id} : {is_enabled}")
-        self.cursor.execute("UPDATE gif_config SET is_enabled = ? WHERE server_id = ?", (is_enabled, server_id))
-        self.conn.commit()
-
-    @commands.Cog.listener()
-    async def on_message(self, message):
-        if message.author.bot:
+            for channel_id, channel_values in self.channel_overrides.get(server_id, {}).items():
+                if channel_values[2] is not None:
+                    channel_values[2] = None
+                    cleared.append((channel_id, channel_values))
+        self.refresh_enabled(server_id)
+        await self.storage.set_gif_config(server_id, GUILD_DEFAULT_CHANNEL, values)
+        for channel_id, channel_values in cleared:
+            await self.storage.set_gif_config(server_id, channel_id, channel_values)
+
+    async def cog_load(self):
+        await self.load_config()
+        self.bot.pipeline.register("gif_limit", self.process_message)
+        self.sweep_limiter.start()
+        self.snapshot.open()
+        self.save_snapshot.start()
+
+    @tasks.loop(seconds=60)
+    async def sweep_limiter(self):
+        """Libère périodiquement les états des salons et utilisateurs inactifs."""
+        self.limiter.sweep(time.monotonic())
+
+    def restore_snapshot(self, server_id, now):
+        """Reprend les états d'un serveur enregistrés avant le redémarrage (états inactifs ignorés)."""
+        data = self.snapshot.take(server_id)
+        if data is None:
             return
+        for channel_id, user_id, state in decode_gif_states(data, wall_offset()):
+            if now - state.updated <= 2 * state.window:
+                self.limiter.restore(server_id, channel_id, user_id, state)
+
+    def snapshot_states(self, offset):
+        """Copie des états regroupés par serveur : {server_id: ([(channel_id, user_id, valeurs)], expiration en temps réel)}."""
+        states_by_server = {}
+        expirations = {}
+        for (server_id, channel_id, user_id), state in self.limiter.states.items():
+            states_by_server.setdefault(server_id, []).append((channel_id, user_id, copy_gif_state(state)))
+            expirations[server_id] = max(expirations.get(server_id, 0), state.updated + 2 * state.window + offset)
+        return {server_id: (states, expirations[server_id]) for server_id, states in states_by_server.items()}
+
+    @tasks.loop(seconds=SNAPSHOT_INTERVAL)
+    async def save_snapshot(self):
+        """Sauvegarde périodique des limites en cours, pour reprendre après un arrêt brutal."""
+        offset = wall_offset()
+        try:
+            await self.snapshot.save(encode_gif_states, self.snapshot_states(offset), offset)
+        except OSError as e:
+            log.error("Sauvegarde de l'instantané des limites de GIF : %s", e)
+
+    @save_snapshot.before_loop
+    async def before_save_snapshot(self):
+        await asyncio.sleep(SNAPSHOT_INTERVAL)
 
+    async def process_message(self, context):
+        """Étape du pipeline : supprime les GIF au-delà de la limite du salon."""
+        # Serveur sans aucun salon limité : rejet immédiat
+        if context.guild_id not in self.enabled_guilds or not context.is_gif:
+            return False
+        message = context.message
         if message.author.guild_permissions.administrator:
-            return
+            return False
 
         # Récupérer la configuration pour le salon
-        gif_limit, time_window, is_enabled = self.get_channel_config(message.guild.id, message.channel.id)
+        gif_limit, time_window, is_enabled, limit_scope, limit_algorithm = self.get_channel_config(context.guild_id, context.channel_id)
 
         # Si la limitation de GIF n'est pas activée pour ce salon, on ignore le message
         if not is_enabled:
-            return
+            return False
 
-        gif_pattern = re.compile(r"gif", re.IGNORECASE)
-        
-        if gif_pattern.search(message.content):
-            channel_id = message.channel.id
-            current_time = time.time()
-            channel_data = self.gif_count[channel_id]
-
-            if current_time - channel_data["timestamp"] > time_window:
-                channel_data["count"] = 0
-                channel_data["timestamp"] = current_time
-
-            channel_data["count"] += 1
-
-            if channel_data["count"] > gif_limit:
-                try:
-                    await message.delete()
-                    await message.channel.send(
-                        f"{message.author.mention} Le nombre maximum de GIF autorisés dans ce salon a été atteint. Veuillez patienter avant d'envoyer d'autres GIF.",
-                        delete_after=5
-                    )
-                except discord.Forbidden:
-                    print("ERREUR - Le bot n'a pas la permission de supprimer des messages dans ce salon.")
-                except discord.HTTPException as e:
-                    print(f"ERREUR - Problème lors de la suppression du message: {e}")
+        now = time.monotonic()
+        if context.guild_id in self.snapshot:
+            self.restore_snapshot(context.guild_id, now)
+        allowed = self.limiter.allow(
+            context.guild_id, context.channel_id, context.author_id,
+            limit_scope, limit_algorithm, gif_limit, time_window, now,
+        )
+        if not allowed:
+            self.queue.submit(DELETE, lambda: self.delete_message(message, limit_scope), bucket=("channel", context.channel_id))
+            return True
+        return False
+
+    async def delete_message(self, message, limit_scope="channel"):
+        """Supprime un GIF au-delà de la limite et prévient son auteur."""
+        try:
+            await message.delete()
+        except discord.Forbidden:
+            log.error("Le bot n'a pas la permission de supprimer des messages dans le salon %s.", message.channel.id)
+            return
+        except discord.HTTPException as e:
+            log.error("Problème lors de la suppression du message %s : %s", message.id, e)
+            return
+        if limit_scope == "user":
+            notice = f"{message.author.mention} Vous avez atteint le nombre maximum de GIF autorisés par personne dans ce salon. Veuillez patienter avant d'envoyer d'autres GIF."
+        else:
+            notice = f"{message.author.mention} Le nombre maximum de GIF autorisés dans ce salon a été atteint. Veuillez patienter avant d'envoyer d'autres GIF."
+        self.queue.submit(
+            NOTICE,
+            lambda: message.channel.send(
+                notice,
+                delete_after=5
+            ),
+            coalesce_key=("gif_limit_notice", message.guild.id, message.author.id),
+            bucket=("channel", message.channel.id),
+        )
 
     @app_commands.command(name="enable_gif_limit", description="Active la limitation de GIF pour le salon actuel")
     #@app_commands.checks.has_permissions(administrator=True)
     @admin_or_manage_messages()
     async def enable_gif_limit(self, interaction: discord.Interaction):
         """Active la limitation de GIF pour le salon actuel."""
-        self.update_channel_config(interaction.guild.id, interaction.channel_id, is_enabled=True)
+        await self.update_channel_config(interaction.guild.id, interaction.channel_id, is_enabled=True)
         await interaction.response.send_message("La limitation de GIF a été activée pour ce salon.", ephemeral=True)
 
     @app_commands.command(name="disable_gif_limit", description="Désactive la limitation de GIF pour le salon actuel")
@@ -129,7 +234,7 @@ class GifLimit(commands.Cog):
     @admin_or_manage_messages()
     async def disable_gif_limit(self, interaction: discord.Interaction):
         """Désactive la limitation de GIF pour le salon actuel."""
-        self.update_channel_config(interaction.guild.id, interaction.channel_id, is_enabled=False)
+        await self.update_channel_config(interaction.guild.id, interaction.channel_id, is_enabled=False)
         await interaction.response.send_message("La limitation de GIF a été désactivée pour ce salon.", ephemeral=True)
 
     @app_commands.command(name="enable_gif_limit_server", description="Active la limitation de GIF pour tous les salons du serveur")
@@ -137,7 +242,7 @@ class GifLimit(commands.Cog):
     @admin_or_manage_messages()
     async def enable_gif_limit_server(self, interaction: discord.Interaction):
         """Active la limitation de GIF pour tous les salons du serveur."""
-        self.update_server_config(interaction.guild.id, is_enabled=True)
+        await self.update_server_config(interaction.guild.id, is_enabled=True)
         await interaction.response.send_message("La limitation de GIF a été activée pour tous les salons du serveur.", ephemeral=True)
 
     @app_commands.command(name="disable_gif_limit_server", description="Désactive la limitation de GIF pour tous les salons du serveur")
@@ -145,7 +250,7 @@ class GifLimit(commands.Cog):
     @admin_or_manage_messages()
     async def disable_gif_limit_server(self, interaction: discord.Interaction):
         """Désactive la limitation de GIF pour tous les salons du serveur."""
-        self.update_server_config(interaction.guild.id, is_enabled=False)
+        await self.update_server_config(interaction.guild.id, is_enabled=False)
         await interaction.response.send_message("La limitation de GIF a été désactivée pour tous les salons du serveur.", ephemeral=True)
 
     @app_commands.command(name="set_gif_limit", description="Définit une nouvelle limite de GIF pour le salon actuel")
@@ -153,7 +258,7 @@ class GifLimit(commands.Cog):
     @admin_or_manage_messages()
     async def set_gif_limit(self, interaction: discord.Interaction, limit: int):
         """Définit une nouvelle limite de GIF pour le salon actuel."""
-        self.update_channel_config(interaction.guild.id, interaction.channel_id, gif_limit=limit)
+        await self.update_channel_config(interaction.guild.id, interaction.channel_id, gif_limit=limit)
         await interaction.response.send_message(f"La limite de GIF pour ce salon a été fixée à {limit}.", ephemeral=True)
 
     @app_commands.command(name="set_time_window", description="Définit une nouvelle période de temps pour le comptage des GIF")
@@ -161,21 +266,59 @@ class GifLimit(commands.Cog):
     @admin_or_manage_messages()
     async def set_time_window(self, interaction: discord.Interaction, seconds: int):
         """Définit une nouvelle période de temps pour le comptage des GIF pour le salon actuel."""
-        self.update_channel_config(interaction.guild.id, interaction.channel_id, time_window=seconds)
+        await self.update_channel_config(interaction.guild.id, interaction.channel_id, time_window=seconds)
         await interaction.response.send_message(f"La période de vérification pour les GIF a été définie à {seconds} secondes pour ce salon.", ephemeral=True)
 
+    @app_commands.command(name="set_gif_limit_mode", description="Choisit la portée et l'algorithme de la limite de GIF pour le salon actuel")
+    #@app_commands.checks.has_permissions(administrator=True)
+    @admin_or_manage_messages()
+    @app_commands.describe(
+        scope="channel : limite commune au salon, user : limite par utilisateur",
+        algorithm="sliding : fenêtre glissante, bucket : seau à jetons (rafale puis recharge continue)",
+    )
+    async def set_gif_limit_mode(self, interaction: discord.Interaction, scope: Literal["channel", "user"], algorithm: Literal["sliding", "bucket"]):
+        """Choisit la portée et l'algorithme de la limite de GIF pour le salon actuel."""
+        await self.update_channel_config(interaction.guild.id, interaction.channel_id, limit_scope=scope, limit_algorithm=algorithm)
+        await interaction.response.send_message(f"La limite de GIF de ce salon s'applique désormais {SCOPE_LABELS[scope]}, avec {ALGORITHM_LABELS[algorithm]}.", ephemeral=True)
+
+    @app_commands.command(name="reset_gif_config", description="Supprime les réglages GIF propres au salon actuel (il hérite de ceux du serveur)")
+    #@app_commands.checks.has_permissions(administrator=True)
+    @admin_or_manage_messages()
+    async def reset_gif_config(self, interaction: discord.Interaction):
+        """Supprime les réglages GIF propres au salon actuel."""
+        if await self.reset_channel_config(interaction.guild.id, interaction.channel_id):
+            await interaction.response.send_message("Ce salon utilise désormais la configuration GIF du serveur.", ephemeral=True)
+        else:
+            await interaction.response.send_message("Ce salon utilise déjà la configuration GIF du serveur.", ephemeral=True)
+
     @app_commands.command(name="show_gif_config", description="Affiche la configuration actuelle de GIF pour le salon actuel")
     #@app_commands.checks.has_permissions(administrator=True)
     @admin_or_manage_messages()
     async def show_gif_config(self, interaction: discord.Interaction):
         """Affiche la configuration actuelle de GIF pour le salon actuel."""
-        gif_limit, time_window, is_enabled = self.get_channel_config(interaction.guild.id, interaction.channel_id)
+        gif_limit, time_window, is_enabled, limit_scope, limit_algorithm = self.get_channel_config(interaction.guild.id, interaction.channel_id)
         status = "activée" if is_enabled else "désactivée"
-        await interaction.response.send_message(f"Configuration actuelle pour ce salon :\nLimite de GIF : {gif_limit}\nPériode de temps : {time_window} secondes\nStatut : {status}", ephemeral=True)
+        inherited = self.inherited_fields(interaction.guild.id, interaction.channel_id)
+        stats = self.limiter.stats()
+        await interaction.response.send_message(
+            f"Configuration actuelle pour ce salon :\nLimite de GIF : {gif_limit}\nPériode de temps : {time_window} secondes\nStatut : {status}"
+            f"\nPortée : {SCOPE_LABELS.get(limit_scope, limit_scope)}\nAlgorithme : {ALGORITHM_LABELS.get(limit_algorithm, limit_algorithm)}"
+            f"\nHérité du serveur : {', '.join(inherited) if inherited else 'rien'}"
+            f"\nÉtats en mémoire : {stats['entries']} ({stats['bytes'] // 1024} Ko, {stats['evicted']} évincés)",
+            ephemeral=True
+        )
 
     def cog_unload(self):
-        """Fermer la connexion à la base de données à la fermeture du Cog."""
-        self.conn.close()
+        """Retire l'étape du pipeline et enregistre l'instantané des limites à la fermeture du Cog."""
+        self.bot.pipeline.unregister("gif_limit")
+        self.sweep_limiter.cancel()
+        self.save_snapshot.cancel()
+        offset = wall_offset()
+        try:
+            self.snapshot.write(encode_blocks(encode_gif_states, self.snapshot_states(offset), offset))
+        except OSError as e:
+            log.error("Sauvegarde de l'instantané des limites de GIF : %s", e)
+        self.snapshot.close()
 
 async def setup(bot):
     await bot.add_cog(GifLimit(bot))
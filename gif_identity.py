@@ -0,0 +1,125 @@
+import re
+from urllib.parse import unquote, urlsplit
+
+URL_PATTERN = re.compile(r"https?://[^\s<>]+", re.IGNORECASE)
+MEDIA_EXTENSIONS = (".gif", ".png", ".jpg", ".jpeg", ".webp")
+
+_TRAILING_ID = re.compile(r"-(\d+)$")
+_GIPHY_ID = re.compile(r"(?:^|-)([A-Za-z0-9]{6,})$")
+_FILE_EXTENSION = re.compile(r"\.\w+$")
+# Les 4 derniers caractères d'une clé média Tenor encodent le format (gif, mp4, webp...)
+_TENOR_FORMAT_SUFFIX = 4
+# Fichiers d'un GIF cités dans sa page tenor.com/view/… (balises og:image, og:video, données JSON)
+_TENOR_MEDIA_URL = re.compile(r"https://media\d*\.tenor\.com/[^\s\"'<>\\]+")
+
+def extract_urls(text):
+    """Liens http(s) présents dans un texte."""
+    return [url.rstrip(").,>") for url in URL_PATTERN.findall(text)]
+
+def message_urls(message):
+    """Liens d'un message : contenu, pièces jointes et embeds."""
+    urls = extract_urls(message.content)
+    urls.extend(attachment.url for attachment in message.attachments)
+    for embed in message.embeds:
+        for url in (embed.url, embed.image.url, embed.thumbnail.url, embed.video.url):
+            if url:
+                urls.append(url)
+    return urls
+
+def message_media_urls(message, max_bytes=None):
+    """Images et GIF d'un message pouvant être analysés : pièces jointes et aperçus d'embeds.
+
+    Les pièces jointes de plus de max_bytes octets sont ignorées (la taille des embeds n'est pas connue).
+    """
+    urls = [
+        attachment.url for attachment in message.attachments
+        if ((attachment.content_type or "").startswith("image/") or attachment.filename.lower().endswith(MEDIA_EXTENSIONS))
+        and (max_bytes is None or attachment.size <= max_bytes)
+    ]
+    for embed in message.embeds:
+        for media in (embed.image, embed.thumbnail):
+            url = media.proxy_url or media.url
+            if url:
+                urls.append(url)
+    return urls
+
+def is_tenor_view(url):
+    """Lien vers la page d'un GIF Tenor (tenor.com/view/…), dont la clé média n'est connue qu'en lisant la page."""
+    key = canonical_key(url)
+    return key is not None and key.startswith("tenor:") and (urlsplit(url.strip()).hostname or "").lower().removeprefix("www.") == "tenor.com"
+
+def tenor_page_keys(html):
+    """Identifiants "tenor-media:…" des fichiers cités dans la page tenor.com/view/… d'un GIF.
+
+    Un même GIF a un identifiant numérique (lien de partage) et une clé média (fichiers,
+    aperçus Discord) : la page les relie. Vérification (python -m doctest gif_identity.py) :
+
+    >>> page = '<meta property="og:image" content="https://media1.tenor.com/m/AbCdEfGhIjkAAAAC/chat-danse.gif">'
+    >>> media = "https://images-ext-1.discordapp.net/external/sig/https/media.tenor.com/AbCdEfGhIjkAAAAe/chat-danse.png"
+    >>> canonical_key(media) in tenor_page_keys(page)
+    True
+    """
+    keys = set()
+    for url in _TENOR_MEDIA_URL.findall(html):
+        key = canonical_key(url)
+        if key is not None and key.startswith("tenor-media:"):
+            keys.add(key)
+    return keys
+
+def canonical_key(url):
+    """Identifiant canonique d'un GIF, identique pour toutes les variantes d'un même lien.
+
+    Exemples : "tenor:12345", "tenor-media:AbCdEf", "giphy:xT9IgG50Fb7Mi0prBC",
+    "discord:1234567890" (pièce jointe), sinon "url:hôte/chemin".
+    Renvoie None si le texte n'est pas un lien http(s).
+    """
+    url = url.strip()
+    if not url.lower().startswith(("http://", "https://")):
+        return None
+    parts = urlsplit(url)
+    host = (parts.hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+    segments = [segment for segment in unquote(parts.path).split("/") if segment]
+
+    if host == "tenor.com":
+        # tenor.com/view/<slug>-<id> ou tenor.com/<langue>/view/<slug>-<id>
+        if "view" in segments and segments[-1] != "view":
+            match = _TRAILING_ID.search(segments[-1])
+            if match:
+                return f"tenor:{match.group(1)}"
+    elif host.endswith(".tenor.com") and segments:
+        # media.tenor.com/[m/]<clé média>/<nom>.gif : la clé identifie le GIF, quel que soit le format
+        if segments[0] == "m" and len(segments) > 1:
+            segments = segments[1:]
+        stem = _FILE_EXTENSION.sub("", segments[-1])
+        match = _TRAILING_ID.search(stem)
+        if match or stem.isdigit():
+            return f"tenor:{match.group(1) if match else stem}"
+        if len(segments) >= 2 and len(segments[0]) > _TENOR_FORMAT_SUFFIX:
+            return f"tenor-media:{segments[0][:-_TENOR_FORMAT_SUFFIX]}"
+    elif host == "giphy.com" and len(segments) >= 2 and segments[0] in ("gifs", "embed", "stickers"):
+        # giphy.com/gifs/<slug>-<id>, giphy.com/embed/<id>
+        match = _GIPHY_ID.search(segments[1] if segments[0] == "embed" else segments[-1])
+        if match:
+            return f"giphy:{match.group(1)}"
+    elif (host == "giphy.com" or host.endswith(".giphy.com")) and segments:
+        # media*.giphy.com/media/[v1.xxx/]<id>/giphy.gif, i.giphy.com/<id>.gif
+        if "media" in segments and len(segments) >= 2:
+            return f"giphy:{segments[-2]}"
+        return f"giphy:{_FILE_EXTENSION.sub('', segments[-1])}"
+    elif host in ("cdn.discordapp.com", "media.discordapp.net") and len(segments) >= 3 and segments[0] in ("attachments", "ephemeral-attachments"):
+        # <hôte>/attachments/<salon>/<pièce jointe>/<nom>
+        return f"discord:{segments[2]}"
+    elif host.startswith("images-ext-") and host.endswith(".discordapp.net") and "external" in segments:
+        # Proxy Discord : .../external/<signature>/[<paramètres>/]<schéma>/<hôte>/<chemin>
+        rest = segments[segments.index("external") + 2:]
+        for index, segment in enumerate(rest):
+            if segment in ("http", "https"):
+                original = canonical_key(f"{segment}://" + "/".join(rest[index + 1:]))
+                if original is not None:
+                    return original
+                break
+
+    path = "/".join(segments)
+    return f"url:{host}/{path}" if path else f"url:{host}"
@@ -0,0 +1,103 @@
+import sys
+from collections import OrderedDict
+
+# Portée de la limite : tout le salon, ou chaque utilisateur dans le salon
+SCOPES = ("channel", "user")
+# Algorithmes : fenêtre glissante (compteur pondéré sur deux fenêtres) ou seau à jetons
+ALGORITHMS = ("sliding", "bucket")
+
+class SlidingWindowState:
+    """Compteur à fenêtre glissante : le compte de la fenêtre précédente est pondéré
+    par la part de celle-ci encore couverte, ce qui évite la remise à zéro brutale."""
+
+    __slots__ = ("window", "window_start", "current", "previous", "updated")
+
+    def __init__(self, window, now):
+        self.window = window
+        self.window_start = now
+        self.current = 0
+        self.previous = 0
+        self.updated = now
+
+    def allow(self, limit, now):
+        elapsed = now - self.window_start
+        if elapsed >= self.window:
+            windows = int(elapsed // self.window)
+            self.previous = self.current if windows == 1 else 0
+            self.current = 0
+            self.window_start += windows * self.window
+            elapsed = now - self.window_start
+        self.updated = now
+        estimate = self.previous * (1 - elapsed / self.window) + self.current
+        if estimate + 1 > limit:
+            return False
+        self.current += 1
+        return True
+
+class TokenBucketState:
+    """Seau à jetons : `limit` GIF d'un coup au maximum, rechargés en continu sur la fenêtre."""
+
+    __slots__ = ("window", "tokens", "updated")
+
+    def __init__(self, window, now, limit):
+        self.window = window
+        self.tokens = float(limit)
+        self.updated = now
+
+    def allow(self, limit, now):
+        self.tokens = min(float(limit), self.tokens + (now - self.updated) * limit / self.window)
+        self.updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+class GifLimiter:
+    """États des limites de GIF, indexés par (server_id, channel_id, user_id ou 0).
+
+    Les états sont rangés du moins au plus récemment utilisé : au-delà de
+    max_entries le plus ancien est évincé, et sweep() retire ceux qui sont
+    revenus à leur état initial.
+    """
+
+    def __init__(self, max_entries):
+        self.states = OrderedDict()
+        self.max_entries = max_entries
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self.states)
+
+    def allow(self, server_id, channel_id, user_id, scope, algorithm, limit, window, now):
+        """Enregistre un GIF et indique s'il respecte la limite."""
+        window = max(window, 1)
+        key = (server_id, channel_id, user_id if scope == "user" else 0)
+        state = self.states.get(key)
+        expected = TokenBucketState if algorithm == "bucket" else SlidingWindowState
+        if state is None or type(state) is not expected or state.window != window:
+            state = TokenBucketState(window, now, limit) if algorithm == "bucket" else SlidingWindowState(window, now)
+            self.states[key] = state
+            if len(self.states) > self.max_entries:
+                self.states.popitem(last=False)
+                self.evicted += 1
+        else:
+            self.states.move_to_end(key)
+        return state.allow(limit, now)
+
+    def restore(self, server_id, channel_id, user_id, state):
+        """Réinsère un état sauvegardé (user_id vaut 0 pour une limite commune au salon)."""
+        self.states[(server_id, channel_id, user_id)] = state
+        if len(self.states) > self.max_entries:
+            self.states.popitem(last=False)
+            self.evicted += 1
+
+    def sweep(self, now):
+        """Supprime les états inactifs depuis plus de deux fenêtres. Renvoie leur nombre."""
+        idle = [key for key, state in self.states.items() if now - state.updated > 2 * state.window]
+        for key in idle:
+            del self.states[key]
+        return len(idle)
+
+    def stats(self):
+        size = sys.getsizeof(self.states) + sum(sys.getsizeof(key) + sys.getsizeof(state) for key, state in self.states.items())
+        return {"entries": len(self.states), "bytes": size, "evicted": self.evicted}
@@ -0,0 +1,108 @@
+from collections import deque
+
+class AhoCorasick:
+    """Automate d'Aho-Corasick : recherche simultanée de tous les motifs en un seul
+    parcours du texte, quel que soit leur nombre.
+
+    Les transitions sont stockées dans un unique dictionnaire {(noeud, caractère): noeud}
+    pour limiter la mémoire. L'ajout d'un motif insère seulement son chemin dans le
+    trie et marque les liens d'échec à recalculer (au plus une fois par lot d'ajouts,
+    à la recherche suivante) ; le retrait d'un motif efface simplement sa sortie.
+    """
+
+    __slots__ = ("goto", "fail", "output", "suffix_output", "patterns", "dirty")
+
+    def __init__(self, patterns=()):
+        self.goto = {}  # {(noeud, caractère): noeud}
+        self.fail = [0]
+        self.output = [None]  # motif se terminant sur ce noeud
+        self.suffix_output = [0]  # noeud suffixe le plus proche portant une sortie (0 si aucun)
+        self.patterns = {}  # {motif: noeud}
+        self.dirty = False
+        for pattern in patterns:
+            self.add(pattern)
+
+    def __len__(self):
+        return len(self.patterns)
+
+    def __contains__(self, pattern):
+        return pattern in self.patterns
+
+    def add(self, pattern):
+        """Ajoute un motif au trie."""
+        if not pattern or pattern in self.patterns:
+            return
+        goto = self.goto
+        node = 0
+        for char in pattern:
+            child = goto.get((node, char))
+            if child is None:
+                child = len(self.fail)
+                goto[(node, char)] = child
+                self.fail.append(0)
+                self.output.append(None)
+                self.suffix_output.append(0)
+            node = child
+        self.output[node] = pattern
+        self.patterns[pattern] = node
+        self.dirty = True
+
+    def remove(self, pattern):
+        """Retire un motif : son chemin reste dans le trie mais ne produit plus de correspondance."""
+        node = self.patterns.pop(pattern, None)
+        if node is not None:
+            self.output[node] = None
+
+    def _build(self):
+        """Recalcule les liens d'échec et de sortie par un parcours en largeur du trie."""
+        children = {}
+        for (node, char), child in self.goto.items():
+            children.setdefault(node, []).append((char, child))
+
+        goto = self.goto
+        fail = self.fail
+        output = self.output
+        suffix_output = self.suffix_output
+        queue = deque()
+        for _, child in children.get(0, ()):
+            fail[child] = 0
+            suffix_output[child] = 0
+            queue.append(child)
+        while queue:
+            node = queue.popleft()
+            for char, child in children.get(node, ()):
+                state = fail[node]
+                while state and (state, char) not in goto:
+                    state = fail[state]
+                target = goto.get((state, char), 0)
+                fail[child] = target
+                suffix_output[child] = target if output[target] is not None else suffix_output[target]
+                queue.append(child)
+        self.dirty = False
+
+    def search(self, text):
+        """Renvoie le premier motif trouvé dans le texte, ou None."""
+        if not self.patterns:
+            return None
+        if self.dirty:
+            self._build()
+        goto = self.goto
+        fail = self.fail
+        output = self.output
+        suffix_output = self.suffix_output
+        node = 0
+        for char in text:
+            child = goto.get((node, char))
+            while child is None and node:
+                node = fail[node]
+                child = goto.get((node, char))
+            node = child or 0
+            if output[node] is not None:
+                return output[node]
+            # Motifs plus courts se terminant ici (les sorties retirées sont ignorées)
+            match = suffix_output[node]
+            while match:
+                if output[match] is not None:
+                    return output[match]
+                match = suffix_output[match]
+        return None
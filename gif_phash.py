@@ -0,0 +1,85 @@
+import io
+
+from PIL import Image
+
+# Nombre maximum d'images échantillonnées par GIF, et taille du dHash (8 x 8 = 64 bits)
+FRAME_SAMPLES = 8
+HASH_SIZE = 8
+
+def frame_hashes(data):
+    """Empreintes perceptuelles (dHash 64 bits) d'images échantillonnées dans un GIF ou une image.
+
+    Exécutée dans un processus séparé : ne dépend que des octets du fichier.
+    """
+    with Image.open(io.BytesIO(data)) as image:
+        frame_count = getattr(image, "n_frames", 1)
+        step = max(frame_count / FRAME_SAMPLES, 1)
+        hashes = []
+        for index in sorted({int(i * step) for i in range(min(frame_count, FRAME_SAMPLES))}):
+            image.seek(index)
+            hashes.append(dhash(image))
+        return sorted(set(hashes))
+
+def dhash(image):
+    """Différence de luminosité entre pixels voisins sur une image réduite à 9 x 8."""
+    pixels = list(image.convert("L").resize((HASH_SIZE + 1, HASH_SIZE), Image.Resampling.LANCZOS).getdata())
+    value = 0
+    for row in range(HASH_SIZE):
+        offset = row * (HASH_SIZE + 1)
+        for column in range(HASH_SIZE):
+            value = (value << 1) | (pixels[offset + column] > pixels[offset + column + 1])
+    return value
+
+def hamming(a, b):
+    return (a ^ b).bit_count()
+
+def to_signed(value):
+    """Empreinte 64 bits vers un entier signé stockable dans SQLite."""
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+def to_unsigned(value):
+    return value + (1 << 64) if value < 0 else value
+
+class BKTree:
+    """Arbre BK sur la distance de Hamming : recherche des empreintes proches sans
+    parcourir toute la liste."""
+
+    __slots__ = ("root", "size")
+
+    def __init__(self, items=()):
+        self.root = None  # [empreinte, valeur, {distance: noeud}]
+        self.size = 0
+        for value, payload in items:
+            self.add(value, payload)
+
+    def __len__(self):
+        return self.size
+
+    def add(self, value, payload):
+        self.size += 1
+        if self.root is None:
+            self.root = [value, payload, {}]
+            return
+        node = self.root
+        while True:
+            distance = hamming(value, node[0])
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [value, payload, {}]
+                return
+            node = child
+
+    def find(self, value, max_distance):
+        """Renvoie la valeur associée à une empreinte à moins de max_distance, ou None."""
+        if self.root is None:
+            return None
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            distance = hamming(value, node[0])
+            if distance <= max_distance:
+                return node[1]
+            for child_distance, child in node[2].items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    stack.append(child)
+        return None
@@ -0,0 +1,192 @@
+import logging
+import math
+import os
+import time
+from collections import Counter, defaultdict
+
+import aiohttp
+from aiohttp import web
+
+from action_queue import ACTION_NAMES
+
+log = logging.getLogger(__name__)
+
+# Serveur de santé et de métriques : démarré seulement si HEALTH_PORT est défini.
+# Avec launcher.py, le processus n déclare le port HEALTH_PORT + n.
+HEALTH_PORT = os.getenv("HEALTH_PORT")
+HEALTH_HOST = os.getenv("HEALTH_HOST", "0.0.0.0")
+
+# Bornes (s) de l'histogramme de latence des appels REST
+REST_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def health_port():
+    """Port du serveur pour ce processus, ou None s'il est désactivé."""
+    if not HEALTH_PORT:
+        return None
+    return int(HEALTH_PORT) + int(os.getenv("SHARD_WORKER", "0"))
+
+class RestLatency:
+    """Durée des appels REST à Discord, mesurée sur la session aiohttp de discord.py (http_trace)."""
+
+    def __init__(self, buckets=REST_BUCKETS):
+        self.buckets = buckets
+        self.counts = defaultdict(lambda: [0] * len(self.buckets))  # {méthode: nombre d'appels par borne}
+        self.total = Counter()
+        self.calls = Counter()
+        self.errors = Counter()
+
+    def trace_config(self):
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_start.append(self._on_request_start)
+        trace_config.on_request_end.append(self._on_request_end)
+        trace_config.on_request_exception.append(self._on_request_exception)
+        return trace_config
+
+    async def _on_request_start(self, session, context, params):
+        context.start = time.perf_counter()
+
+    async def _on_request_end(self, session, context, params):
+        self.observe(params.method, time.perf_counter() - context.start)
+        if params.response.status >= 400:
+            self.errors[params.method] += 1
+
+    async def _on_request_exception(self, session, context, params):
+        self.observe(params.method, time.perf_counter() - context.start)
+        self.errors[params.method] += 1
+
+    def observe(self, method, elapsed):
+        self.calls[method] += 1
+        self.total[method] += elapsed
+        counts = self.counts[method]
+        for i, bound in enumerate(self.buckets):
+            if elapsed <= bound:
+                counts[i] += 1
+
+def format_value(value):
+    if isinstance(value, float) and not math.isfinite(value):
+        return "NaN" if math.isnan(value) else "+Inf"
+    return str(value)
+
+class MetricsWriter:
+    """Texte au format d'exposition Prometheus."""
+
+    def __init__(self):
+        self.lines = []
+
+    def metric(self, name, kind, description, samples):
+        """samples : [(étiquettes, valeur)] ou [(suffixe, étiquettes, valeur)]."""
+        self.lines.append(f"# HELP {name} {description}")
+        self.lines.append(f"# TYPE {name} {kind}")
+        for sample in samples:
+            suffix, labels, value = sample if len(sample) == 3 else ("", *sample)
+            label_text = ",".join(f'{key}="{label}"' for key, label in labels.items())
+            self.lines.append(f"{name}{suffix}{{{label_text}}} {format_value(value)}" if label_text else f"{name}{suffix} {format_value(value)}")
+
+    def text(self):
+        return "\n".join(self.lines) + "\n"
+
+class HealthServer:
+    """Serveur HTTP (aiohttp) exécuté sur la boucle d'événements du bot.
+
+    - /livez : la boucle d'événements répond.
+    - /readyz : connecté à la passerelle (toutes les shards) et toutes les extensions chargées.
+    - /metrics : messages traités par étape, actions de modération, latences REST et passerelle.
+    """
+
+    def __init__(self, bot, host, port):
+        self.bot = bot
+        self.host = host
+        self.port = port
+        self.runner = None
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/livez", self.livez)
+        app.router.add_get("/readyz", self.readyz)
+        app.router.add_get("/metrics", self.metrics)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+        log.info("Serveur de santé sur http://%s:%s (/livez, /readyz, /metrics)", self.host, self.port)
+
+    async def stop(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
+
+    def gateway_latencies(self):
+        """[(shard_id, latence en secondes)] des shards de ce processus."""
+        if hasattr(self.bot, "latencies"):
+            return self.bot.latencies
+        return [(0, self.bot.latency)]
+
+    def gateway_connected(self):
+        if not self.bot.is_ready() or self.bot.is_closed():
+            return False
+        shards = getattr(self.bot, "shards", None)
+        return not shards or all(not shard.is_closed() for shard in shards.values())
+
+    async def livez(self, request):
+        return web.Response(text="ok\n")
+
+    async def readyz(self, request):
+        checks = {
+            "gateway": self.gateway_connected(),
+            "extensions": self.bot.extensions_ready,
+        }
+        body = "".join(f"{name}: {'ok' if ok else 'en attente'}\n" for name, ok in checks.items())
+        return web.Response(text=body, status=200 if all(checks.values()) else 503)
+
+    async def metrics(self, request):
+        bot = self.bot
+        pipeline = bot.pipeline.stats()
+        queue = bot.moderation_queue.stats()
+        rest = bot.rest_latency
+        writer = MetricsWriter()
+
+        writer.metric("youm_ready", "gauge", "1 si le bot est prêt (passerelle et extensions).",
+                      [({}, int(self.gateway_connected() and bot.extensions_ready))])
+        writer.metric("youm_guilds", "gauge", "Serveurs gérés par ce processus.", [({}, len(bot.guilds))])
+        writer.metric("youm_gateway_latency_seconds", "gauge", "Latence du heartbeat de la passerelle, par shard.",
+                      [({"shard": shard_id}, latency) for shard_id, latency in self.gateway_latencies()])
+
+        writer.metric("youm_messages_total", "counter", "Messages analysés par le pipeline de modération.", [({}, bot.pipeline.messages)])
+        writer.metric("youm_stage_messages_total", "counter", "Messages traités par chaque étape de modération.",
+                      [({"stage": name}, stage["calls"]) for name, stage in pipeline.items()])
+        writer.metric("youm_stage_stops_total", "counter", "Messages supprimés (traitement interrompu) par étape.",
+                      [({"stage": name}, stage["stops"]) for name, stage in pipeline.items()])
+        writer.metric("youm_stage_errors_total", "counter", "Erreurs par étape de modération.",
+                      [({"stage": name}, stage["errors"]) for name, stage in pipeline.items()])
+        writer.metric("youm_stage_seconds_total", "counter", "Temps passé par étape de modération.",
+                      [({"stage": name}, bot.pipeline.time_total_ns[name] / 1e9) for name in pipeline])
+
+        writer.metric("youm_handler_latency_seconds", "summary", "Latence par gestionnaire (étapes, actions, commandes slash, retard de la boucle).", [
+            sample
+            for name, histogram in sorted(bot.perf.histograms.items())
+            for sample in (
+                *(("", {"handler": name, "quantile": q / 100}, histogram.percentile(q)) for q in (50, 95, 99)),
+                ("_sum", {"handler": name}, histogram.total),
+                ("_count", {"handler": name}, histogram.count),
+            )
+        ])
+
+        writer.metric("youm_moderation_queue_depth", "gauge", "Actions de modération en attente.", [({}, queue["depth"])])
+        writer.metric("youm_moderation_actions_total", "counter", "Actions de modération par type et résultat.", [
+            ({"action": name, "result": result}, action[result])
+            for name, action in queue["actions"].items()
+            for result in ("submitted", "coalesced", "completed", "failed")
+        ])
+        writer.metric("youm_moderation_action_seconds_total", "counter", "Délai cumulé entre la soumission et la fin des actions.",
+                      [({"action": name}, bot.moderation_queue.latency_total[priority]) for priority, name in ACTION_NAMES.items()])
+
+        samples = []
+        for method in sorted(rest.calls):
+            for bound, count in zip(rest.buckets, rest.counts[method]):
+                samples.append(("_bucket", {"method": method, "le": bound}, count))
+            samples.append(("_bucket", {"method": method, "le": "+Inf"}, rest.calls[method]))
+            samples.append(("_sum", {"method": method}, rest.total[method]))
+            samples.append(("_count", {"method": method}, rest.calls[method]))
+        writer.metric("youm_rest_request_duration_seconds", "histogram", "Durée des appels REST à Discord.", samples)
+        writer.metric("youm_rest_request_errors_total", "counter", "Appels REST en échec (erreur réseau ou statut >= 400).",
+                      [({"method": method}, count) for method, count in sorted(rest.errors.items())])
+        return web.Response(text=writer.text(), headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
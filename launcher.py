@@ -0,0 +1,219 @@
+"""Lance le bot en plusieurs processus, chacun chargé d'un groupe de shards.
+
+Usage : python launcher.py
+
+Variables d'environnement :
+  SHARD_COUNT    nombre total de shards (par défaut : valeur recommandée par Discord)
+  SHARD_WORKERS  nombre de processus (par défaut : 1 par tranche de 4 shards)
+
+Chaque processus exécute bot.py avec SHARD_MODE=process et ses SHARD_IDS. Un serveur
+n'appartient qu'à une shard, donc qu'à un processus : l'état en mémoire des cogs
+(fenêtres anti-spam, limites de GIF) n'a pas besoin d'être partagé. Chaque processus
+a son propre dossier d'instantanés ; la base SQLite (mode WAL) est commune.
+
+Avant de lancer les processus, le lanceur ouvre une fois la base (création du schéma,
+reprise des anciennes bases). Si la répartition des shards a changé depuis le dernier
+lancement (SHARD_COUNT ou SHARD_WORKERS), les blocs des instantanés sont redistribués
+serveur par serveur vers le dossier du processus qui possède désormais leur shard.
+"""
+import asyncio
+import json
+import logging
+import os
+import shutil
+import signal
+import sys
+import time
+
+import aiohttp
+import discord
+from dotenv import load_dotenv
+
+from snapshot import SnapshotFile
+from storage import DATABASE_PATH, Storage
+
+log = logging.getLogger("launcher")
+
+GATEWAY_URL = "https://discord.com/api/v10/gateway/bot"
+SHARDS_PER_WORKER = 4
+# Discord n'accepte qu'une identification par tranche de 5 s et par groupe max_concurrency
+IDENTIFY_INTERVAL = 5.0
+RESTART_DELAY_MIN = 5.0
+RESTART_DELAY_MAX = 300.0
+# Un processus resté en vie plus longtemps que ceci est considéré comme stable (délai de redémarrage réinitialisé)
+STABLE_AFTER = 600.0
+
+async def gateway_info(token):
+    """(nombre de shards recommandé, max_concurrency) d'après /gateway/bot."""
+    async with aiohttp.ClientSession() as session:
+        async with session.get(GATEWAY_URL, headers={"Authorization": f"Bot {token}"}) as response:
+            response.raise_for_status()
+            data = await response.json()
+    return data["shards"], data["session_start_limit"]["max_concurrency"]
+
+def split_shards(shard_count, workers):
+    """Répartit les shards 0..shard_count-1 en `workers` groupes contigus de tailles proches."""
+    size, extra = divmod(shard_count, workers)
+    groups = []
+    start = 0
+    for worker in range(workers):
+        end = start + size + (1 if worker < extra else 0)
+        groups.append(list(range(start, end)))
+        start = end
+    return [group for group in groups if group]
+
+def snapshot_dir(number):
+    return os.path.join(os.getenv("SNAPSHOT_DIR", "snapshots"), f"worker-{number}")
+
+def shard_id(server_id, shard_count):
+    return (server_id >> 22) % shard_count
+
+def redistribute_snapshots(groups, shard_count):
+    """Répartit les blocs des instantanés des processus selon la nouvelle répartition des shards.
+
+    Les blocs sont par serveur : chacun est recopié dans le dossier du processus qui possède
+    la shard du serveur. Sans changement de répartition (layout.json), rien n'est fait.
+    """
+    root = os.getenv("SNAPSHOT_DIR", "snapshots")
+    layout_path = os.path.join(root, "layout.json")
+    layout = {"shard_count": shard_count, "groups": groups}
+    try:
+        with open(layout_path, encoding="utf-8") as f:
+            if json.load(f) == layout:
+                return
+    except (OSError, ValueError):
+        pass
+    owners = {shard: number for number, group in enumerate(groups) for shard in group}
+    directories = [os.path.join(root, name) for name in sorted(os.listdir(root))] if os.path.isdir(root) else []
+    directories = [path for path in directories if os.path.basename(path).startswith("worker-") and os.path.isdir(path)]
+    blocks = {}  # {nom du fichier: {processus: {server_id: (bloc, expiration)}}}
+    servers = set()
+    for directory in directories:
+        for name in os.listdir(directory):
+            if not name.endswith(".snap"):
+                continue
+            snapshot = SnapshotFile(os.path.join(directory, name))
+            snapshot.open()
+            for server_id, (_, _, expires_at) in list(snapshot.index.items()):
+                data = snapshot.take(server_id)
+                if data is None:
+                    continue
+                worker = owners[shard_id(server_id, shard_count)]
+                blocks.setdefault(name, {}).setdefault(worker, {})[server_id] = (data, expires_at)
+                servers.add(server_id)
+            snapshot.close()
+    for directory in directories:
+        shutil.rmtree(directory)
+    for name, workers in blocks.items():
+        for worker, worker_blocks in workers.items():
+            SnapshotFile(os.path.join(snapshot_dir(worker), name)).write(worker_blocks, {})
+    if directories:
+        log.warning(
+            "Répartition des shards modifiée (%d shard(s), %d processus) : instantanés de %d serveur(s) redistribués.",
+            shard_count, len(groups), len(servers),
+        )
+    os.makedirs(root, exist_ok=True)
+    with open(layout_path, "w", encoding="utf-8") as f:
+        json.dump(layout, f)
+
+async def prepare_storage():
+    """Crée le schéma et reprend les anciennes bases avant le démarrage des processus (une seule reprise)."""
+    storage = Storage(os.getenv("STORAGE_PATH", DATABASE_PATH))
+    await storage.open()
+    await storage.close()
+
+class Worker:
+    def __init__(self, number, shard_ids, shard_count):
+        self.number = number
+        self.shard_ids = shard_ids
+        self.shard_count = shard_count
+        self.process = None
+        self.started_at = 0.0
+        self.restart_delay = RESTART_DELAY_MIN
+
+    def env(self):
+        env = dict(os.environ)
+        env.update({
+            "SHARD_MODE": "process",
+            "SHARD_IDS": ",".join(map(str, self.shard_ids)),
+            "SHARD_COUNT": str(self.shard_count),
+            "SHARD_WORKER": str(self.number),
+            "SNAPSHOT_DIR": snapshot_dir(self.number),
+        })
+        return env
+
+    async def start(self):
+        self.started_at = time.monotonic()
+        self.process = await asyncio.create_subprocess_exec(sys.executable, "bot.py", env=self.env())
+        log.info("Processus %d (shards %d-%d) démarré, pid %d", self.number, self.shard_ids[0], self.shard_ids[-1], self.process.pid)
+
+class Launcher:
+    def __init__(self, workers, identify_delay):
+        self.workers = workers
+        self.identify_delay = identify_delay  # délai entre deux démarrages de processus
+        self.stopping = asyncio.Event()
+
+    def stop(self):
+        """Arrêt demandé : transmet SIGTERM aux processus, qui enregistrent leurs instantanés."""
+        self.stopping.set()
+        for worker in self.workers:
+            if worker.process is not None and worker.process.returncode is None:
+                worker.process.send_signal(signal.SIGTERM)
+
+    async def supervise(self, worker):
+        """Redémarre le processus s'il s'arrête de lui-même, avec un délai croissant."""
+        while not self.stopping.is_set():
+            code = await worker.process.wait()
+            if self.stopping.is_set():
+                break
+            if time.monotonic() - worker.started_at > STABLE_AFTER:
+                worker.restart_delay = RESTART_DELAY_MIN
+            log.error("Processus %d arrêté (code %s), redémarrage dans %.0f s", worker.number, code, worker.restart_delay)
+            try:
+                await asyncio.wait_for(self.stopping.wait(), worker.restart_delay)
+                break
+            except asyncio.TimeoutError:
+                pass
+            worker.restart_delay = min(worker.restart_delay * 2, RESTART_DELAY_MAX)
+            await worker.start()
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            try:
+                loop.add_signal_handler(sig, self.stop)
+            except NotImplementedError:
+                pass  # Windows
+        supervisors = []
+        for worker in self.workers:
+            if self.stopping.is_set():
+                break
+            await worker.start()
+            supervisors.append(asyncio.create_task(self.supervise(worker)))
+            # Laisser les shards du processus s'identifier avant de lancer le suivant
+            try:
+                await asyncio.wait_for(self.stopping.wait(), self.identify_delay * len(worker.shard_ids))
+            except asyncio.TimeoutError:
+                pass
+        await asyncio.gather(*supervisors)
+        await asyncio.gather(*(worker.process.wait() for worker in self.workers if worker.process is not None))
+
+async def main():
+    load_dotenv()
+    discord.utils.setup_logging(level=os.getenv("LOG_LEVEL", "INFO").upper())
+    token = os.getenv("DISCORD_TOKEN")
+    recommended, max_concurrency = await gateway_info(token)
+    shard_count = int(os.getenv("SHARD_COUNT") or recommended)
+    workers = int(os.getenv("SHARD_WORKERS") or -(-shard_count // SHARDS_PER_WORKER))
+    groups = split_shards(shard_count, max(1, min(workers, shard_count)))
+    log.info("%d shard(s) (recommandé : %d) sur %d processus, max_concurrency %d", shard_count, recommended, len(groups), max_concurrency)
+    await prepare_storage()
+    redistribute_snapshots(groups, shard_count)
+    launcher = Launcher(
+        [Worker(number, shard_ids, shard_count) for number, shard_ids in enumerate(groups)],
+        IDENTIFY_INTERVAL / max_concurrency,
+    )
+    await launcher.run()
+
+if __name__ == "__main__":
+    asyncio.run(main())
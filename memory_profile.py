@@ -0,0 +1,56 @@
+import os
+
+import discord
+
+# Profil de cache de la passerelle : "full" (par défaut) reprend les réglages par défaut de discord.py,
+# "low" (sur demande) ne garde que ce que les cogs lisent
+MEMORY_PROFILE = os.getenv("MEMORY_PROFILE", "full").lower()
+
+# Les cogs de modération ne lisent que le message reçu (auteur et permissions inclus dans
+# l'événement) : ni le cache des membres, ni celui des messages, ni les états vocaux,
+# ni les événements de saisie.
+PROFILES = {
+    "full": {"members": True, "messages": 1000, "voice_states": True, "typing": True},
+    "low": {"members": False, "messages": None, "voice_states": False, "typing": False},
+}
+
+NEEDS_LABELS = {
+    "members": "du cache des membres",
+    "messages": "du cache des messages",
+    "voice_states": "des états vocaux",
+}
+
+class CacheProfileError(RuntimeError):
+    """Un cog a besoin d'un cache désactivé par le profil mémoire."""
+
+def bot_options(intents, profile=MEMORY_PROFILE):
+    """Arguments de cache à passer au constructeur du bot pour le profil donné."""
+    if profile not in PROFILES:
+        raise ValueError(f"MEMORY_PROFILE invalide : {profile!r} (attendu : {', '.join(PROFILES)})")
+    settings = PROFILES[profile]
+    intents.voice_states = settings["voice_states"]
+    intents.typing = settings["typing"]
+    if settings["members"]:
+        member_cache_flags = discord.MemberCacheFlags.from_intents(intents)
+    else:
+        member_cache_flags = discord.MemberCacheFlags.none()
+    return {
+        "intents": intents,
+        "member_cache_flags": member_cache_flags,
+        "max_messages": settings["messages"],
+        "chunk_guilds_at_startup": settings["members"] and intents.members,
+    }
+
+def require_cache(bot, cog_name, **needs):
+    """Échoue clairement si le profil mémoire a retiré un cache utilisé par une extension.
+
+    Appelé par bot.load_extension pour les caches déclarés dans bot.EXTENSION_CACHES ;
+    un cog peut aussi l'appeler dans cog_load : require_cache(self.bot, "MonCog", members=True)
+    """
+    settings = PROFILES[bot.memory_profile]
+    missing = [NEEDS_LABELS[need] for need, wanted in needs.items() if wanted and not settings[need]]
+    if missing:
+        raise CacheProfileError(
+            f"{cog_name} a besoin {', '.join(missing)}, désactivé(s) par MEMORY_PROFILE={bot.memory_profile} "
+            f"(utiliser MEMORY_PROFILE=full)"
+        )
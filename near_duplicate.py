@@ -0,0 +1,114 @@
+import hashlib
+import random
+import re
+import unicodedata
+from collections import deque
+from functools import lru_cache
+
+# Signature MinHash de 64 valeurs, découpée en 16 bandes de 4 lignes pour l'index LSH
+NUM_PERMUTATIONS = 64
+LSH_BANDS = 16
+LSH_ROWS = NUM_PERMUTATIONS // LSH_BANDS
+SHINGLE_SIZE = 3
+# Seul le début d'un message est découpé : le coût de la signature reste borné quelle que soit sa longueur
+MAX_SHINGLED_CHARS = 256
+
+# Chaque "permutation" est un masque XOR appliqué à une empreinte 64 bits déjà uniforme
+_rng = random.Random(0x59_6F_75_6D)
+_PERMUTATION_MASKS = [_rng.getrandbits(64) for _ in range(NUM_PERMUTATIONS)]
+
+_NON_WORD = re.compile(r"[\W_]+")
+_REPEATED_CHARS = re.compile(r"(.)\1+")
+
+def normalize(text):
+    """Forme canonique d'un message : casse, accents, ponctuation et répétitions ignorés."""
+    text = unicodedata.normalize("NFKD", text.casefold())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    text = _NON_WORD.sub(" ", text)
+    text = _REPEATED_CHARS.sub(r"\1", text)
+    return " ".join(text.split())
+
+def shingles(text, size=SHINGLE_SIZE):
+    """Ensemble des sous-chaînes de `size` caractères d'un texte normalisé."""
+    if len(text) <= size:
+        return {text}
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+@lru_cache(maxsize=4096)
+def minhash(normalized):
+    """Signature MinHash (tuple de NUM_PERMUTATIONS entiers) d'un message déjà normalisé (normalize).
+
+    Seuls les MAX_SHINGLED_CHARS premiers caractères sont pris en compte ; les signatures
+    des messages répétés (le cas du spam) sont gardées en cache.
+    """
+    hashes = [
+        int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for shingle in shingles(normalized[:MAX_SHINGLED_CHARS])
+    ]
+    return tuple(min(map(mask.__xor__, hashes)) for mask in _PERMUTATION_MASKS)
+
+def band_keys(signature):
+    """Clés LSH d'une signature : une par bande."""
+    return [(band, hash(signature[band * LSH_ROWS:(band + 1) * LSH_ROWS])) for band in range(LSH_BANDS)]
+
+def similarity(signature, other):
+    """Estimation de la similarité de Jaccard entre deux signatures."""
+    return sum(a == b for a, b in zip(signature, other)) / NUM_PERMUTATIONS
+
+class NearDuplicateEntry:
+    __slots__ = ("author_id", "record", "signature", "keys")
+
+    def __init__(self, author_id, record, signature, keys):
+        self.author_id = author_id
+        self.record = record
+        self.signature = signature
+        self.keys = keys
+
+class NearDuplicateIndex:
+    """Index LSH des messages récents d'un serveur.
+
+    Une recherche ne compare la signature qu'aux messages partageant au moins
+    une bande, au lieu de parcourir toute la fenêtre.
+    """
+
+    __slots__ = ("entries", "buckets")
+
+    def __init__(self):
+        self.entries = deque()  # [NearDuplicateEntry], du plus ancien au plus récent
+        self.buckets = {}  # {clé de bande: {NearDuplicateEntry}}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def expire(self, now, time_window):
+        """Retire les messages plus anciens que time_window secondes."""
+        cutoff = now - time_window
+        entries = self.entries
+        buckets = self.buckets
+        while entries and entries[0].record.timestamp < cutoff:
+            entry = entries.popleft()
+            for key in entry.keys:
+                bucket = buckets[key]
+                bucket.discard(entry)
+                if not bucket:
+                    del buckets[key]
+
+    def add(self, author_id, record, signature):
+        keys = band_keys(signature)
+        entry = NearDuplicateEntry(author_id, record, signature, keys)
+        self.entries.append(entry)
+        for key in keys:
+            self.buckets.setdefault(key, set()).add(entry)
+        return entry
+
+    def similar(self, author_id, signature, threshold):
+        """Messages de l'auteur dont la similarité avec la signature atteint le seuil."""
+        candidates = set()
+        for key in band_keys(signature):
+            bucket = self.buckets.get(key)
+            if bucket:
+                candidates.update(bucket)
+        return [
+            entry.record for entry in candidates
+            if entry.author_id == author_id and similarity(entry.signature, signature) >= threshold
+        ]
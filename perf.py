@@ -0,0 +1,146 @@
+import asyncio
+import bisect
+import logging
+import os
+import time
+from collections import Counter
+
+from discord import app_commands
+
+log = logging.getLogger(__name__)
+
+# Durée (ms) à partir de laquelle un événement est signalé comme lent
+PERF_SLOW_MS = float(os.getenv("PERF_SLOW_MS", "250"))
+# Au plus un avertissement par gestionnaire et par intervalle (s) : les suivants sont seulement comptés
+PERF_WARN_INTERVAL = float(os.getenv("PERF_WARN_INTERVAL", "60"))
+# Période (s) de la sonde de retard de la boucle d'événements
+PERF_LAG_INTERVAL = float(os.getenv("PERF_LAG_INTERVAL", "0.5"))
+
+# Bornes des intervalles de l'histogramme : progression géométrique de raison 1,25, de 10 µs à ~100 s.
+# Un centile est estimé par la borne supérieure de son intervalle (au plus 25 % d'erreur).
+BUCKET_BOUNDS = tuple(1e-5 * 1.25 ** i for i in range(73))
+
+class LatencyHistogram:
+    """Histogramme de durées à intervalles fixes : enregistrement en O(log n), mémoire constante."""
+
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKET_BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, q):
+        """Durée (s) sous laquelle se trouvent q % des événements."""
+        if not self.count:
+            return 0.0
+        rank = self.count * q / 100
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(BUCKET_BOUNDS[i] if i < len(BUCKET_BOUNDS) else self.max, self.max)
+        return self.max
+
+class PerfMonitor:
+    """Latences par gestionnaire (étapes du pipeline, actions de modération, commandes slash)
+    et retard de la boucle d'événements.
+
+    Un événement plus long que slow_threshold produit un avertissement, échantillonné :
+    au plus un par gestionnaire et par warn_interval, avec le nombre d'événements lents
+    non signalés depuis le précédent.
+    """
+
+    def __init__(self, slow_threshold=PERF_SLOW_MS / 1000, warn_interval=PERF_WARN_INTERVAL, lag_interval=PERF_LAG_INTERVAL):
+        self.slow_threshold = slow_threshold
+        self.warn_interval = warn_interval
+        self.lag_interval = lag_interval
+        self.histograms = {}
+        self.slow = Counter()
+        self.suppressed = Counter()
+        self.last_warning = {}
+        self.lag_task = None
+
+    def observe(self, name, seconds):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = LatencyHistogram()
+        histogram.observe(seconds)
+        if seconds >= self.slow_threshold:
+            self._slow_event(name, seconds)
+
+    def _slow_event(self, name, seconds):
+        self.slow[name] += 1
+        now = time.monotonic()
+        last = self.last_warning.get(name)
+        if last is not None and now - last < self.warn_interval:
+            self.suppressed[name] += 1
+            return
+        self.last_warning[name] = now
+        log.warning(
+            "Événement lent : %s en %.0f ms (seuil %.0f ms, %d autre(s) non signalé(s))",
+            name, seconds * 1000, self.slow_threshold * 1000, self.suppressed.pop(name, 0),
+        )
+
+    def start(self):
+        """Démarre la sonde de retard de la boucle d'événements."""
+        if self.lag_task is None:
+            self.lag_task = asyncio.create_task(self._probe_lag())
+
+    async def stop(self):
+        if self.lag_task is not None:
+            self.lag_task.cancel()
+            try:
+                await self.lag_task
+            except asyncio.CancelledError:
+                pass
+            self.lag_task = None
+
+    async def _probe_lag(self):
+        """Mesure le retard du réveil d'un sleep : temps pendant lequel la boucle était occupée ailleurs."""
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.lag_interval)
+            self.observe("event_loop_lag", max(0.0, loop.time() - start - self.lag_interval))
+
+    def stats(self):
+        """{gestionnaire: nombre, centiles et maximum en millisecondes}."""
+        return {
+            name: {
+                "count": histogram.count,
+                "p50_ms": histogram.percentile(50) * 1000,
+                "p95_ms": histogram.percentile(95) * 1000,
+                "p99_ms": histogram.percentile(99) * 1000,
+                "max_ms": histogram.max * 1000,
+                "slow": self.slow[name],
+            }
+            for name, histogram in self.histograms.items()
+        }
+
+class InstrumentedTree(app_commands.CommandTree):
+    """Arbre des commandes slash qui mesure la durée de chaque commande (jusqu'à la fin du callback)."""
+
+    async def interaction_check(self, interaction):
+        interaction.extras["perf_start"] = time.perf_counter()
+        return True
+
+    def observe_command(self, interaction):
+        start = interaction.extras.pop("perf_start", None)
+        if start is not None and interaction.command is not None:
+            self.client.perf.observe(f"/{interaction.command.qualified_name}", time.perf_counter() - start)
+
+    async def on_app_command_completion(self, interaction, command):
+        self.observe_command(interaction)
+
+    async def on_error(self, interaction, error):
+        self.observe_command(interaction)
+        await super().on_error(interaction, error)
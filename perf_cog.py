@@ -0,0 +1,44 @@
+import discord
+from discord import app_commands
+from discord.ext import commands
+
+# Nombre maximum de gestionnaires affichés (limite de taille des messages Discord)
+MAX_ROWS = 20
+
+def admin_only():
+    async def predicate(interaction: discord.Interaction) -> bool:
+        return interaction.user.guild_permissions.administrator
+    return app_commands.check(predicate)
+
+class Perf(commands.Cog):
+    """Affiche les latences mesurées par bot.perf (étapes du pipeline, actions, commandes slash)."""
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.perf = bot.perf
+
+    @app_commands.command(name="perf", description="Affiche les latences par gestionnaire et le retard de la boucle d'événements.")
+    @admin_only()
+    async def perf_command(self, interaction: discord.Interaction):
+        stats = self.perf.stats()
+        if not stats:
+            await interaction.response.send_message("Aucune mesure pour le moment.", ephemeral=True)
+            return
+        # Les gestionnaires les plus lents d'abord
+        rows = sorted(stats.items(), key=lambda item: item[1]["p99_ms"], reverse=True)[:MAX_ROWS]
+        width = max(len(name) for name, _ in rows)
+        lines = [f"{'gestionnaire':<{width}}  {'nombre':>8}  {'p50':>8}  {'p95':>8}  {'p99':>8}  {'max':>8}  lents"]
+        for name, stat in rows:
+            lines.append(
+                f"{name:<{width}}  {stat['count']:>8}  {stat['p50_ms']:>6.1f}ms  {stat['p95_ms']:>6.1f}ms  "
+                f"{stat['p99_ms']:>6.1f}ms  {stat['max_ms']:>6.0f}ms  {stat['slow']}"
+            )
+        hidden = len(stats) - len(rows)
+        footer = f"\n{hidden} autre(s) gestionnaire(s) non affiché(s)." if hidden else ""
+        await interaction.response.send_message(
+            f"Latences (seuil de lenteur : {self.perf.slow_threshold * 1000:.0f} ms) :\n```\n" + "\n".join(lines) + "\n```" + footer,
+            ephemeral=True
+        )
+
+async def setup(bot):
+    await bot.add_cog(Perf(bot))
@@ -0,0 +1,110 @@
+import logging
+import time
+from collections import Counter
+
+from gif_classifier import is_gif_message
+from gif_identity import canonical_key, message_urls
+from near_duplicate import normalize
+from spam_window import content_hash
+
+log = logging.getLogger(__name__)
+
+# Ordre fixe des étapes de modération : un message supprimé par une étape n'est plus vu par les suivantes
+STAGE_ORDER = {
+    "trace": 0,  # enregistrement facultatif (event_trace.py) : voit tous les messages
+    "ban_gif": 10,
+    "gif_limit": 20,
+    "anti_spam": 30,
+}
+
+class MessageContext:
+    """Message analysé une seule fois, partagé par toutes les étapes."""
+
+    __slots__ = ("message", "guild_id", "channel_id", "author_id", "content", "urls", "gif_keys",
+                 "content_hash", "normalized", "normalized_hash", "is_gif")
+
+    def __init__(self, message):
+        self.message = message
+        self.guild_id = message.guild.id
+        self.channel_id = message.channel.id
+        self.author_id = message.author.id
+        self.content = message.content
+        self.urls = message_urls(message)
+        self.gif_keys = {canonical_key(url) for url in self.urls}
+        self.content_hash = content_hash(self.content)
+        self.normalized = normalize(self.content)
+        self.normalized_hash = content_hash(self.normalized)
+        self.is_gif = is_gif_message(message, self.urls)
+
+class Stage:
+    __slots__ = ("name", "order", "handler")
+
+    def __init__(self, name, order, handler):
+        self.name = name
+        self.order = order
+        self.handler = handler
+
+class ModerationPipeline:
+    """Unique point d'entrée des messages pour les cogs de modération.
+
+    Chaque cog enregistre une étape `handler(context)` ; une étape qui renvoie
+    True (message supprimé) interrompt le traitement du message.
+    La durée de chaque étape est aussi transmise à perf (histogrammes de /perf), s'il est fourni.
+    """
+
+    def __init__(self, perf=None):
+        self.perf = perf
+        self.stages = []
+        self.messages = 0
+        self.calls = Counter()
+        self.stops = Counter()
+        self.errors = Counter()
+        self.time_total_ns = Counter()
+        self.time_max_ns = Counter()
+
+    def register(self, name, handler):
+        """Ajoute (ou remplace) l'étape `name` à sa place dans STAGE_ORDER."""
+        self.unregister(name)
+        self.stages.append(Stage(name, STAGE_ORDER[name], handler))
+        self.stages.sort(key=lambda stage: stage.order)
+
+    def unregister(self, name):
+        self.stages = [stage for stage in self.stages if stage.name != name]
+
+    async def dispatch(self, message):
+        """Analyse le message puis l'envoie aux étapes, dans l'ordre."""
+        if message.author.bot or message.guild is None or not self.stages:
+            return
+        self.messages += 1
+        context = MessageContext(message)
+        for stage in self.stages:
+            start = time.perf_counter_ns()
+            try:
+                stop = await stage.handler(context)
+            except Exception as e:
+                self.errors[stage.name] += 1
+                log.exception("Étape de modération '%s' : %s", stage.name, e)
+                stop = False
+            elapsed = time.perf_counter_ns() - start
+            self.calls[stage.name] += 1
+            self.time_total_ns[stage.name] += elapsed
+            if elapsed > self.time_max_ns[stage.name]:
+                self.time_max_ns[stage.name] = elapsed
+            if self.perf is not None:
+                self.perf.observe(f"stage:{stage.name}", elapsed / 1e9)
+            if stop:
+                self.stops[stage.name] += 1
+                break
+
+    def stats(self):
+        """Temps passé par étape (moyenne et maximum en millisecondes)."""
+        return {
+            stage.name: {
+                "calls": self.calls[stage.name],
+                "stops": self.stops[stage.name],
+                "errors": self.errors[stage.name],
+                "avg_ms": self.time_total_ns[stage.name] / self.calls[stage.name] / 1e6 if self.calls[stage.name] else 0.0,
+                "max_ms": self.time_max_ns[stage.name] / 1e6,
+            }
+            for stage in self.stages
+        }
@@ -0,0 +1,166 @@
+"""Rejoue des traces (event_trace.py) dans la détection anti-spam et la limite de GIF, pour plusieurs réglages à la fois.
+
+Usage : python replay.py traces/ [--spam-limit 3,5] [--time-window 10,30] [--max-channels 5,8] [--gif-limit 5,10]
+                                 [--gif-window 60] [--gif-scope channel] [--gif-algorithm sliding] [--output replay.json]
+
+La trace est lue une seule fois, sans attendre entre les messages : chaque message
+est transmis à toutes les combinaisons de réglages, qui ont chacune leurs propres
+fenêtres (SpamTracker, GifLimiter, comme les cogs). Tous les serveurs de la trace
+sont considérés comme ayant l'anti-spam et la limite de GIF activés. La liste des
+GIF interdits et la détection de raid ne sont pas rejouées ; la recherche de
+quasi-doublons non plus (seuil de similarité 1, le réglage par défaut).
+
+Pour chaque combinaison : utilisateurs signalés pour spam, messages supprimés par
+l'anti-spam, utilisateurs qui auraient été bannis et GIF supprimés par la limite.
+"""
+import argparse
+import itertools
+import json
+import time
+
+from anti_spam_cog import DEFAULT_SPAM_CONFIG, MAX_TRACKED_USERS
+from event_trace import ADMINISTRATOR, IS_GIF, read_trace, trace_files
+from gif_cog import MAX_LIMITER_ENTRIES
+from gif_limiter import GifLimiter
+from spam_window import SpamRecord, SpamTracker
+from storage import DEFAULT_GIF_CONFIG
+
+# Intervalle (s, temps de la trace) entre deux nettoyages des fenêtres inactives, comme les tâches des cogs
+SWEEP_INTERVAL = 60
+
+class Simulation:
+    """Fenêtres anti-spam et limites de GIF pour un (spam_limit, time_window, gif_limit).
+
+    max_channels_before_ban ne change que la décision de bannir : toutes ses valeurs
+    sont évaluées par la même simulation.
+    """
+
+    def __init__(self, spam_limit, time_window, gif_limit, max_channels, gif_window, gif_scope, gif_algorithm):
+        self.spam_limit = spam_limit
+        self.time_window = time_window
+        self.gif_limit = gif_limit
+        self.max_channels = max_channels
+        self.gif_window = gif_window
+        self.gif_scope = gif_scope
+        self.gif_algorithm = gif_algorithm
+        self.user_messages = SpamTracker(MAX_TRACKED_USERS)
+        self.limiter = GifLimiter(MAX_LIMITER_ENTRIES)
+        self.flagged_users = set()
+        self.flagged_messages = set()
+        self.banned_users = {value: set() for value in max_channels}
+        self.gif_deleted = 0
+
+    def process(self, index, now, guild, channel, author, content, flags):
+        # Même ordre que le pipeline : un GIF supprimé par la limite n'est pas vu par l'anti-spam
+        if flags & IS_GIF and not flags & ADMINISTRATOR:
+            allowed = self.limiter.allow(
+                guild, channel, author, self.gif_scope, self.gif_algorithm, self.gif_limit, self.gif_window, now,
+            )
+            if not allowed:
+                self.gif_deleted += 1
+                return
+
+        window = self.user_messages.window(guild, author)
+        window.expire(now, self.time_window)
+        if window.add(SpamRecord(index, channel, content, now)) <= self.spam_limit:
+            return
+        identical_messages = window.matching(content)
+        self.flagged_users.add((guild, author))
+        self.flagged_messages.update(record.message_id for record in identical_messages)
+        channels = len({record.channel_id for record in identical_messages})
+        for value, banned in self.banned_users.items():
+            if channels > value:
+                banned.add((guild, author))
+
+    def sweep(self, now):
+        self.user_messages.sweep(now, lambda server_id: self.time_window)
+        self.limiter.sweep(now)
+
+    def results(self):
+        return [
+            {
+                "spam_limit": self.spam_limit,
+                "time_window": self.time_window,
+                "max_channels_before_ban": value,
+                "gif_limit": self.gif_limit,
+                "flagged_users": len(self.flagged_users),
+                "flagged_messages": len(self.flagged_messages),
+                "banned_users": len(banned),
+                "gif_deleted": self.gif_deleted,
+            }
+            for value, banned in self.banned_users.items()
+        ]
+
+def replay(paths, spam_limits, time_windows, max_channels, gif_limits, gif_window, gif_scope, gif_algorithm):
+    """Rejoue les fichiers de trace pour toutes les combinaisons de réglages. Renvoie (résultats, statistiques)."""
+    simulations = [
+        Simulation(spam_limit, time_window, gif_limit, max_channels, gif_window, gif_scope, gif_algorithm)
+        for spam_limit, time_window, gif_limit in itertools.product(spam_limits, time_windows, gif_limits)
+    ]
+    messages = 0
+    first = last = None
+    next_sweep = None
+    start = time.perf_counter()
+    for path in trace_files(paths):
+        for now, guild, channel, author, content, normalized, flags in read_trace(path):
+            if first is None:
+                first = now
+                next_sweep = now + SWEEP_INTERVAL
+            last = now
+            for simulation in simulations:
+                simulation.process(messages, now, guild, channel, author, content, flags)
+            messages += 1
+            if now >= next_sweep:
+                for simulation in simulations:
+                    simulation.sweep(now)
+                next_sweep = now + SWEEP_INTERVAL
+    elapsed = time.perf_counter() - start
+    duration = last - first if messages else 0.0
+    stats = {
+        "messages": messages,
+        "trace_seconds": duration,
+        "replay_seconds": elapsed,
+        "speedup": duration / elapsed if elapsed else 0.0,
+    }
+    results = [result for simulation in simulations for result in simulation.results()]
+    return results, stats
+
+def int_list(value):
+    return [int(item) for item in value.split(",")]
+
+def main():
+    spam_limit, time_window, _, _, _, max_channels_before_ban, _, _ = DEFAULT_SPAM_CONFIG
+    gif_limit, gif_window, _, gif_scope, gif_algorithm = DEFAULT_GIF_CONFIG
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("paths", nargs="+", help="fichiers ou dossiers de trace (TRACE_DIR)")
+    parser.add_argument("--spam-limit", type=int_list, default=[spam_limit], help="valeurs de spam_limit, séparées par des virgules")
+    parser.add_argument("--time-window", type=int_list, default=[time_window], help="valeurs de time_window (s)")
+    parser.add_argument("--max-channels", type=int_list, default=[max_channels_before_ban], help="valeurs de max_channels_before_ban")
+    parser.add_argument("--gif-limit", type=int_list, default=[gif_limit], help="valeurs de gif_limit")
+    parser.add_argument("--gif-window", type=int, default=gif_window, help="période de la limite de GIF (s)")
+    parser.add_argument("--gif-scope", choices=("channel", "user"), default=gif_scope, help="limite par salon ou par utilisateur")
+    parser.add_argument("--gif-algorithm", choices=("sliding", "bucket"), default=gif_algorithm, help="algorithme de la limite de GIF")
+    parser.add_argument("--output", help="fichier JSON des résultats")
+    args = parser.parse_args()
+
+    results, stats = replay(
+        args.paths, args.spam_limit, args.time_window, args.max_channels, args.gif_limit,
+        args.gif_window, args.gif_scope, args.gif_algorithm,
+    )
+    print(
+        f"{stats['messages']} messages rejoués ({stats['trace_seconds']:.0f} s de trace) en {stats['replay_seconds']:.2f} s, "
+        f"{len(results)} réglages, x{stats['speedup']:.0f} le temps réel"
+    )
+    print(f"{'spam_limit':>10}  {'période':>7}  {'salons':>6}  {'gif_limit':>9}  {'signalés':>8}  {'messages':>8}  {'bannis':>6}  {'GIF':>6}")
+    for result in results:
+        print(
+            f"{result['spam_limit']:>10}  {result['time_window']:>6}s  {result['max_channels_before_ban']:>6}  {result['gif_limit']:>9}  "
+            f"{result['flagged_users']:>8}  {result['flagged_messages']:>8}  {result['banned_users']:>6}  {result['gif_deleted']:>6}"
+        )
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"stats": stats, "results": results}, f, indent=2, ensure_ascii=False)
+        print(f"Résultats écrits dans {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+import json
+import math
+import os
+import time
+
+import discord
+from discord import app_commands
+from discord.ext import commands, tasks
+
+# Intervalle (s) de publication de l'état des shards de ce processus dans la base partagée
+SHARD_STATUS_INTERVAL = float(os.getenv("SHARD_STATUS_INTERVAL", "30"))
+SHARD_STATUS_PREFIX = "shard_status:"
+
+def admin_only():
+    async def predicate(interaction: discord.Interaction) -> bool:
+        return interaction.user.guild_permissions.administrator
+    return app_commands.check(predicate)
+
+class ShardStatus(commands.Cog):
+    """Publie l'état des shards de ce processus et affiche celui de toutes les shards.
+
+    Avec launcher.py, chaque processus ne connaît que ses propres shards : l'état est
+    donc partagé par la base (métadonnées shard_status:<id>), relue par /shards.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.storage = bot.storage
+
+    async def cog_load(self):
+        self.publish_status.start()
+
+    def local_status(self):
+        """{shard_id: état} des shards gérées par ce processus."""
+        now = time.time()
+        worker = os.getenv("SHARD_WORKER")
+        shards = getattr(self.bot, "shards", None)
+        if not shards:
+            # Connexion unique : une seule shard, la 0
+            return {0: {
+                "latency": self.bot.latency,
+                "guilds": len(self.bot.guilds),
+                "connected": not self.bot.is_closed() and self.bot.is_ready(),
+                "worker": worker,
+                "updated": now,
+            }}
+        guilds = {}
+        for guild in self.bot.guilds:
+            guilds[guild.shard_id] = guilds.get(guild.shard_id, 0) + 1
+        return {
+            shard_id: {
+                "latency": shard.latency,
+                "guilds": guilds.get(shard_id, 0),
+                "connected": not shard.is_closed(),
+                "worker": worker,
+                "updated": now,
+            }
+            for shard_id, shard in shards.items()
+        }
+
+    @tasks.loop(seconds=SHARD_STATUS_INTERVAL)
+    async def publish_status(self):
+        for shard_id, status in self.local_status().items():
+            await self.storage.set_meta(f"{SHARD_STATUS_PREFIX}{shard_id}", json.dumps(status))
+
+    @publish_status.before_loop
+    async def before_publish_status(self):
+        await self.bot.wait_until_ready()
+
+    @app_commands.command(name="shards", description="Affiche l'état de toutes les shards du bot.")
+    @admin_only()
+    async def shards(self, interaction: discord.Interaction):
+        statuses = {
+            int(key[len(SHARD_STATUS_PREFIX):]): json.loads(value)
+            for key, value in (await self.storage.load_meta(SHARD_STATUS_PREFIX)).items()
+        }
+        # L'état de ce processus est toujours à jour, même entre deux publications
+        statuses.update(self.local_status())
+        now = time.time()
+        shard_count = self.bot.shard_count or 1
+        lines = []
+        for shard_id in range(shard_count):
+            status = statuses.get(shard_id)
+            if status is None:
+                lines.append(f"Shard {shard_id} : aucun état publié")
+                continue
+            age = now - status["updated"]
+            latency = f"{status['latency'] * 1000:.0f} ms" if math.isfinite(status["latency"]) else "—"
+            state = "connectée" if status["connected"] else "déconnectée"
+            if age > 3 * SHARD_STATUS_INTERVAL:
+                state = f"sans nouvelles depuis {age:.0f} s"
+            worker = f", processus {status['worker']}" if status["worker"] is not None else ""
+            current = " (ici)" if interaction.guild.shard_id == shard_id else ""
+            lines.append(f"Shard {shard_id}{current} : {state}, latence {latency}, {status['guilds']} serveur(s){worker}")
+        total = sum(status["guilds"] for shard_id, status in statuses.items() if shard_id < shard_count)
+        await interaction.response.send_message(
+            f"Shards : {shard_count}, serveurs : {total}\n" + "\n".join(lines),
+            ephemeral=True
+        )
+
+    def cog_unload(self):
+        self.publish_status.cancel()
+
+async def setup(bot):
+    await bot.add_cog(ShardStatus(bot))
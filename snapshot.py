@@ -0,0 +1,221 @@
+import asyncio
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+
+from gif_limiter import SlidingWindowState, TokenBucketState
+from near_duplicate import NUM_PERMUTATIONS
+from spam_window import SpamRecord
+
+log = logging.getLogger(__name__)
+
+# Dossier des instantanés et intervalle (s) entre deux sauvegardes périodiques
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "snapshots")
+SNAPSHOT_INTERVAL = float(os.getenv("SNAPSHOT_INTERVAL", "300"))
+
+# Fichier : en-tête, blocs par serveur, index des blocs, pied de page (position et taille de l'index).
+# Les horodatages sont enregistrés en temps réel (time.time()) : l'horloge monotone repart de zéro au redémarrage.
+MAGIC = b"YBSN"
+VERSION = 1
+HEADER = struct.Struct("<4sHd")  # magic, version, date de sauvegarde
+INDEX_ENTRY = struct.Struct("<QQId")  # server_id, position, taille, expiration du bloc
+FOOTER = struct.Struct("<QI")  # position de l'index, nombre d'entrées
+
+SPAM_WINDOW = struct.Struct("<QI")  # user_id, nombre de messages
+SPAM_RECORD = struct.Struct("<QQQd")  # message_id, channel_id, content_hash, horodatage
+NEAR_DUPLICATE = struct.Struct(f"<QQQQd{NUM_PERMUTATIONS}Q")  # author_id, message_id, channel_id, content_hash, horodatage, signature MinHash
+GIF_COUNTS = struct.Struct("<II")  # nombre d'états à fenêtre glissante, nombre de seaux à jetons
+SLIDING_STATE = struct.Struct("<QQdIIdd")  # channel_id, user_id, window, current, previous, window_start, updated
+BUCKET_STATE = struct.Struct("<QQddd")  # channel_id, user_id, window, tokens, updated
+
+def wall_offset():
+    """Décalage entre l'horloge réelle et l'horloge monotone : réel = monotone + décalage."""
+    return time.time() - time.monotonic()
+
+def encode_spam_windows(windows, offset):
+    """Bloc d'un serveur à partir de [(user_id, [SpamRecord])]."""
+    parts = []
+    for user_id, records in windows:
+        parts.append(SPAM_WINDOW.pack(user_id, len(records)))
+        parts.extend(
+            SPAM_RECORD.pack(record.message_id, record.channel_id, record.content_hash, record.timestamp + offset)
+            for record in records
+        )
+    return b"".join(parts)
+
+def decode_spam_windows(data, offset):
+    """Renvoie [(user_id, [SpamRecord])], horodatages convertis en temps monotone."""
+    windows = []
+    position = 0
+    while position < len(data):
+        user_id, count = SPAM_WINDOW.unpack_from(data, position)
+        position += SPAM_WINDOW.size
+        records = [
+            SpamRecord(message_id, channel_id, digest, timestamp - offset)
+            for message_id, channel_id, digest, timestamp in SPAM_RECORD.iter_unpack(data[position:position + count * SPAM_RECORD.size])
+        ]
+        position += count * SPAM_RECORD.size
+        windows.append((user_id, records))
+    return windows
+
+def encode_near_duplicates(entries, offset):
+    """Bloc d'un serveur à partir de [(author_id, SpamRecord, signature)] (index LSH des quasi-doublons)."""
+    return b"".join(
+        NEAR_DUPLICATE.pack(author_id, record.message_id, record.channel_id, record.content_hash, record.timestamp + offset, *signature)
+        for author_id, record, signature in entries
+    )
+
+def decode_near_duplicates(data, offset):
+    """Renvoie [(author_id, SpamRecord, signature)], horodatages convertis en temps monotone."""
+    return [
+        (author_id, SpamRecord(message_id, channel_id, digest, timestamp - offset), signature)
+        for author_id, message_id, channel_id, digest, timestamp, *signature in NEAR_DUPLICATE.iter_unpack(data)
+    ]
+
+def copy_gif_state(state):
+    """Valeurs d'un état de limite (les états sont modifiés en place : on les copie avant l'encodage)."""
+    if isinstance(state, TokenBucketState):
+        return (True, state.window, state.tokens, state.updated)
+    return (False, state.window, state.current, state.previous, state.window_start, state.updated)
+
+def encode_gif_states(states, offset):
+    """Bloc d'un serveur à partir de [(channel_id, user_id, copy_gif_state(état))]."""
+    sliding = []
+    buckets = []
+    for channel_id, user_id, (is_bucket, window, *values) in states:
+        if is_bucket:
+            tokens, updated = values
+            buckets.append(BUCKET_STATE.pack(channel_id, user_id, window, tokens, updated + offset))
+        else:
+            current, previous, window_start, updated = values
+            sliding.append(SLIDING_STATE.pack(channel_id, user_id, window, current, previous, window_start + offset, updated + offset))
+    return GIF_COUNTS.pack(len(sliding), len(buckets)) + b"".join(sliding) + b"".join(buckets)
+
+def encode_blocks(encode, servers, offset):
+    """{server_id: (état copié, expiration)} -> {server_id: (bloc, expiration)}."""
+    return {server_id: (encode(state, offset), expires_at) for server_id, (state, expires_at) in servers.items()}
+
+def decode_gif_states(data, offset):
+    """Renvoie [(channel_id, user_id, état)], horodatages convertis en temps monotone."""
+    sliding_count, bucket_count = GIF_COUNTS.unpack_from(data)
+    position = GIF_COUNTS.size
+    states = []
+    end = position + sliding_count * SLIDING_STATE.size
+    for channel_id, user_id, window, current, previous, window_start, updated in SLIDING_STATE.iter_unpack(data[position:end]):
+        state = SlidingWindowState(window, window_start - offset)
+        state.current = current
+        state.previous = previous
+        state.updated = updated - offset
+        states.append((channel_id, user_id, state))
+    position = end
+    for channel_id, user_id, window, tokens, updated in BUCKET_STATE.iter_unpack(data[position:position + bucket_count * BUCKET_STATE.size]):
+        state = TokenBucketState(window, updated - offset, 0)
+        state.tokens = tokens
+        states.append((channel_id, user_id, state))
+    return states
+
+class SnapshotFile:
+    """Instantané binaire de l'état d'un cog, découpé en un bloc par serveur.
+
+    À l'ouverture, seul l'index est lu (fichier projeté en mémoire) : le bloc d'un
+    serveur n'est décodé qu'à son premier message, via take(). Les blocs encore
+    non repris sont recopiés tels quels lors de la sauvegarde suivante, sauf s'ils
+    ont expiré.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+        self.map = None
+        self.index = {}  # {server_id: (position, taille, expiration)}
+        self.lock = threading.Lock()  # une seule écriture à la fois (sauvegarde périodique ou à l'arrêt)
+
+    def __contains__(self, server_id):
+        return server_id in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def open(self):
+        """Lit l'index de l'instantané, s'il existe. Un fichier illisible est ignoré."""
+        if not os.path.exists(self.path) or os.path.getsize(self.path) < HEADER.size + FOOTER.size:
+            return
+        self.file = open(self.path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, version, saved_at = HEADER.unpack_from(self.map)
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"format inconnu ({magic!r}, version {version})")
+            index_position, count = FOOTER.unpack_from(self.map, len(self.map) - FOOTER.size)
+            now = time.time()
+            for server_id, position, length, expires_at in INDEX_ENTRY.iter_unpack(
+                self.map[index_position:index_position + count * INDEX_ENTRY.size]
+            ):
+                if expires_at > now:
+                    self.index[server_id] = (position, length, expires_at)
+        except (ValueError, struct.error) as e:
+            log.error("Instantané %s ignoré : %s", self.path, e)
+            self.index = {}
+            self._close()
+            return
+        log.info("Instantané %s du %s : %d serveur(s) à reprendre.", self.path, time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(saved_at)), len(self.index))
+
+    def take(self, server_id):
+        """Renvoie (et retire de l'index) le bloc d'un serveur, ou None s'il a expiré."""
+        position, length, expires_at = self.index.pop(server_id)
+        if expires_at <= time.time():
+            return None
+        return self.map[position:position + length]
+
+    def write(self, blocks, carried=None):
+        """Écrit un nouvel instantané : blocks {server_id: (données, expiration)}, plus les blocs
+        non repris de l'instantané précédent (carried, copie de l'index). Remplacement atomique."""
+        with self.lock:
+            return self._write(blocks, dict(self.index) if carried is None else carried)
+
+    def _write(self, blocks, carried):
+        now = time.time()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        temporary = f"{self.path}.tmp"
+        entries = []
+        with open(temporary, "wb") as output:
+            output.write(HEADER.pack(MAGIC, VERSION, now))
+            position = HEADER.size
+            for server_id, (data, expires_at) in blocks.items():
+                output.write(data)
+                entries.append(INDEX_ENTRY.pack(server_id, position, len(data), expires_at))
+                position += len(data)
+            for server_id, (old_position, length, expires_at) in carried.items():
+                if server_id in blocks or expires_at <= now:
+                    continue
+                output.write(self.map[old_position:old_position + length])
+                entries.append(INDEX_ENTRY.pack(server_id, position, length, expires_at))
+                position += length
+            output.write(b"".join(entries))
+            output.write(FOOTER.pack(position, len(entries)))
+            output.flush()
+            os.fsync(output.fileno())
+        # L'ancien fichier reste projeté en mémoire (même supprimé) tant que des blocs restent à reprendre
+        os.replace(temporary, self.path)
+        return len(entries)
+
+    async def save(self, encode, servers, offset):
+        """Sauvegarde périodique : l'état est copié par l'appelant sur la boucle d'événements,
+        l'encodage et l'écriture se font dans un thread."""
+        carried = dict(self.index)
+        return await asyncio.to_thread(lambda: self.write(encode_blocks(encode, servers, offset), carried))
+
+    def close(self):
+        with self.lock:
+            self._close()
+
+    def _close(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
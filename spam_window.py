@@ -0,0 +1,127 @@
+import hashlib
+import sys
+from collections import OrderedDict, deque
+
+def content_hash(content):
+    """Empreinte stable (64 bits) du contenu d'un message."""
+    return int.from_bytes(hashlib.blake2b(content.encode("utf-8"), digest_size=8).digest(), "big")
+
+class SpamRecord:
+    """Trace compacte d'un message : aucune référence vers les objets discord.
+
+    deleted indique que sa suppression a déjà été demandée : le message reste
+    compté dans la fenêtre, mais n'est plus supprimé une seconde fois.
+    """
+
+    __slots__ = ("message_id", "channel_id", "content_hash", "timestamp", "deleted")
+
+    def __init__(self, message_id, channel_id, content_hash, timestamp):
+        self.message_id = message_id
+        self.channel_id = channel_id
+        self.content_hash = content_hash
+        self.timestamp = timestamp
+        self.deleted = False
+
+class SpamWindow:
+    """Fenêtre glissante des messages récents d'un utilisateur.
+
+    Les messages sont conservés dans l'ordre d'arrivée (horodatage monotone),
+    et un compteur par empreinte permet de savoir en O(1) combien de messages
+    identiques se trouvent dans la fenêtre.
+    """
+
+    __slots__ = ("entries", "counts")
+
+    def __init__(self):
+        self.entries = deque()  # [SpamRecord], du plus ancien au plus récent
+        self.counts = {}  # {content_hash: nombre d'occurrences dans la fenêtre}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def expire(self, now, time_window):
+        """Retire les messages plus anciens que time_window secondes."""
+        cutoff = now - time_window
+        entries = self.entries
+        counts = self.counts
+        while entries and entries[0].timestamp < cutoff:
+            digest = entries.popleft().content_hash
+            remaining = counts[digest] - 1
+            if remaining:
+                counts[digest] = remaining
+            else:
+                del counts[digest]
+
+    def add(self, record):
+        """Ajoute un message et renvoie le nombre de messages identiques dans la fenêtre."""
+        self.entries.append(record)
+        count = self.counts.get(record.content_hash, 0) + 1
+        self.counts[record.content_hash] = count
+        return count
+
+    def count(self, digest):
+        """Nombre de messages ayant cette empreinte dans la fenêtre."""
+        return self.counts.get(digest, 0)
+
+    def matching(self, digest):
+        """Messages de la fenêtre ayant cette empreinte (utilisé uniquement lors d'une détection)."""
+        return [record for record in self.entries if record.content_hash == digest]
+
+    def size_bytes(self):
+        """Estimation de la mémoire occupée par la fenêtre et ses messages."""
+        size = sys.getsizeof(self) + sys.getsizeof(self.entries) + sys.getsizeof(self.counts)
+        if self.entries:
+            size += len(self.entries) * sys.getsizeof(self.entries[0])
+        return size
+
+class SpamTracker:
+    """Ensemble borné des fenêtres anti-spam, indexées par (server_id, user_id).
+
+    Les fenêtres sont rangées de la moins récemment utilisée à la plus récente :
+    au-delà de max_entries, la plus ancienne est évincée.
+    """
+
+    def __init__(self, max_entries):
+        self.windows = OrderedDict()  # {(server_id, user_id): SpamWindow}
+        self.max_entries = max_entries
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self.windows)
+
+    def window(self, server_id, user_id):
+        """Renvoie (et crée au besoin) la fenêtre d'un utilisateur."""
+        key = (server_id, user_id)
+        window = self.windows.get(key)
+        if window is None:
+            window = self.windows[key] = SpamWindow()
+            if len(self.windows) > self.max_entries:
+                self.windows.popitem(last=False)
+                self.evicted += 1
+        else:
+            self.windows.move_to_end(key)
+        return window
+
+    def sweep(self, now, time_window_for):
+        """Expire les fenêtres et supprime celles des utilisateurs inactifs.
+
+        time_window_for(server_id) donne la période anti-spam du serveur.
+        Renvoie le nombre de fenêtres supprimées.
+        """
+        idle = []
+        for key, window in self.windows.items():
+            window.expire(now, time_window_for(key[0]))
+            if not window:
+                idle.append(key)
+        for key in idle:
+            del self.windows[key]
+        return len(idle)
+
+    def stats(self):
+        """Nombre de fenêtres, de messages suivis et estimation de la mémoire utilisée."""
+        records = 0
+        size = sys.getsizeof(self.windows)
+        for key, window in self.windows.items():
+            records += len(window)
+            size += sys.getsizeof(key) + window.size_bytes()
+        return {"users": len(self.windows), "records": records, "bytes": size, "evicted": self.evicted}
@@ -0,0 +1,410 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from gif_identity import canonical_key
+
+log = logging.getLogger(__name__)
+
+# Base unique du bot, et anciennes bases par cog dont les données sont reprises au premier démarrage
+DATABASE_PATH = os.getenv("STORAGE_PATH", "youm_bot.db")
+# Écriture différée des configurations : délai (s) avant l'écriture groupée des modifications, et
+# durabilité ("full" : écriture synchrone à chaque modification, "normal" : écriture groupée,
+# "off" : écriture groupée sans attendre le disque). Un délai de 0 écrit chaque modification aussitôt.
+FLUSH_INTERVAL = float(os.getenv("STORAGE_FLUSH_INTERVAL", "2"))
+DURABILITY = os.getenv("STORAGE_DURABILITY", "normal").lower()
+SYNCHRONOUS_MODES = {"full": "FULL", "normal": "NORMAL", "off": "OFF"}
+LEGACY_DATABASES = {
+    "anti_spam_config.db": ("spam_config",),
+    "server_config.db": ("gif_config",),
+    "banned_gifs.db": ("banned_gifs", "banned_gif_hashes"),
+}
+
+# Colonnes de configuration, dans l'ordre des tuples renvoyés aux cogs
+SPAM_CONFIG_COLUMNS = (
+    "spam_limit", "time_window", "is_enabled", "alert_channel_id", "staff_role_id",
+    "max_channels_before_ban", "similarity_threshold", "raid_author_threshold",
+)
+GIF_CONFIG_COLUMNS = ("gif_limit", "time_window", "is_enabled", "limit_scope", "limit_algorithm")
+DEFAULT_GIF_CONFIG = (5, 60, False, "channel", "sliding")
+# Ligne des réglages par défaut d'un serveur ; dans les lignes des salons, NULL signifie « hérité du serveur »
+GUILD_DEFAULT_CHANNEL = 0
+# Version de gif_config à partir de laquelle les réglages sont hiérarchiques (PRAGMA user_version des anciennes bases)
+GIF_HIERARCHY_VERSION = 1
+# Version de gif_identity.canonical_key : les identifiants enregistrés sont recalculés quand elle change
+CANONICAL_KEY_VERSION = 2
+
+SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS meta (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS spam_config (
+        server_id INTEGER PRIMARY KEY,
+        spam_limit INTEGER DEFAULT 3,
+        time_window INTEGER DEFAULT 10,
+        is_enabled BOOLEAN DEFAULT 0,
+        alert_channel_id INTEGER,
+        staff_role_id INTEGER,
+        max_channels_before_ban INTEGER DEFAULT 4,
+        similarity_threshold REAL DEFAULT 1.0,
+        raid_author_threshold INTEGER DEFAULT 0
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS gif_config (
+        server_id INTEGER,
+        channel_id INTEGER,
+        gif_limit INTEGER,
+        time_window INTEGER,
+        is_enabled BOOLEAN,
+        limit_scope TEXT,
+        limit_algorithm TEXT,
+        PRIMARY KEY (server_id, channel_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS banned_gifs (
+        server_id INTEGER,
+        gif_url TEXT,
+        canonical_key TEXT,
+        PRIMARY KEY (server_id, gif_url)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_banned_gifs_canonical_key ON banned_gifs (server_id, canonical_key)",
+    # Autres identifiants canoniques d'un même GIF interdit (ex. clés média Tenor d'un lien tenor.com/view)
+    """
+    CREATE TABLE IF NOT EXISTS banned_gif_aliases (
+        server_id INTEGER,
+        gif_url TEXT,
+        canonical_key TEXT,
+        PRIMARY KEY (server_id, gif_url, canonical_key)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS banned_gif_hashes (
+        server_id INTEGER,
+        source TEXT,
+        phash INTEGER
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_banned_gif_hashes_server ON banned_gif_hashes (server_id, source)",
+)
+
+# Requêtes fixes : le cache d'instructions de sqlite3 ne les prépare qu'une fois
+SELECT_SPAM_CONFIGS = f"SELECT server_id, {', '.join(SPAM_CONFIG_COLUMNS)} FROM spam_config"
+REPLACE_SPAM_CONFIG = f"INSERT OR REPLACE INTO spam_config (server_id, {', '.join(SPAM_CONFIG_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+SELECT_GIF_CONFIGS = f"SELECT server_id, channel_id, {', '.join(GIF_CONFIG_COLUMNS)} FROM gif_config"
+REPLACE_GIF_CONFIG = f"INSERT OR REPLACE INTO gif_config (server_id, channel_id, {', '.join(GIF_CONFIG_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?, ?)"
+DELETE_GIF_CONFIG = "DELETE FROM gif_config WHERE server_id = ? AND channel_id = ?"
+SELECT_BANNED_GIFS = (
+    "SELECT server_id, gif_url, canonical_key FROM banned_gifs "
+    "UNION ALL SELECT server_id, gif_url, canonical_key FROM banned_gif_aliases"
+)
+SELECT_BANNED_GIF_HASHES = "SELECT server_id, source, phash FROM banned_gif_hashes"
+SELECT_SERVER_BANNED_GIF_HASHES = "SELECT source, phash FROM banned_gif_hashes WHERE server_id = ?"
+INSERT_BANNED_GIF = "INSERT OR IGNORE INTO banned_gifs (server_id, gif_url, canonical_key) VALUES (?, ?, ?)"
+INSERT_BANNED_GIF_ALIAS = "INSERT OR IGNORE INTO banned_gif_aliases (server_id, gif_url, canonical_key) VALUES (?, ?, ?)"
+INSERT_BANNED_GIF_HASH = "INSERT INTO banned_gif_hashes (server_id, source, phash) VALUES (?, ?, ?)"
+SELECT_BANNED_GIF_KEYS = (
+    "SELECT canonical_key FROM banned_gifs WHERE server_id = ? AND gif_url = ? "
+    "UNION ALL SELECT canonical_key FROM banned_gif_aliases WHERE server_id = ? AND gif_url = ?"
+)
+DELETE_BANNED_GIF = "DELETE FROM banned_gifs WHERE server_id = ? AND gif_url = ?"
+DELETE_BANNED_GIF_ALIASES = "DELETE FROM banned_gif_aliases WHERE server_id = ? AND gif_url = ?"
+DELETE_BANNED_GIF_HASHES = "DELETE FROM banned_gif_hashes WHERE server_id = ? AND source = ?"
+SELECT_SERVER_BANNED_GIFS = "SELECT gif_url FROM banned_gifs WHERE server_id = ? UNION SELECT DISTINCT source FROM banned_gif_hashes WHERE server_id = ?"
+
+class Storage:
+    """Accès à la base SQLite du bot depuis la boucle d'événements.
+
+    Une seule connexion (mode WAL), utilisée exclusivement par un thread dédié :
+    les requêtes y sont exécutées dans l'ordre d'envoi, et la boucle d'événements
+    ne fait qu'attendre leur résultat. Chaque méthode publique est une transaction.
+
+    Les configurations sont en écriture différée : les cogs modifient d'abord leur
+    cache, puis confient la nouvelle valeur à set_*_config ; les modifications sont
+    regroupées (une ligne par entité, la dernière valeur l'emporte) et écrites en une
+    seule transaction après flush_interval secondes, ou à la fermeture.
+    """
+
+    def __init__(self, path=DATABASE_PATH, flush_interval=FLUSH_INTERVAL, durability=DURABILITY):
+        if durability not in SYNCHRONOUS_MODES:
+            raise ValueError(f"STORAGE_DURABILITY invalide : {durability!r} (attendu : {', '.join(SYNCHRONOUS_MODES)})")
+        self.path = path
+        self.conn = None
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="storage")
+        self.durability = durability
+        self.flush_interval = flush_interval
+        self.write_through = durability == "full" or flush_interval <= 0
+        self.pending = {}  # {("spam_config", server_id) ou ("gif_config", server_id, channel_id): valeurs, None = suppression}
+        self.flush_timer = None
+        self.flush_task = None
+        self.flushes = 0
+        self.flushed_rows = 0
+        self.calls = 0
+        self.loop_time_ns = 0  # temps passé dans la boucle d'événements par le stockage
+        self.worker_time_ns = 0  # temps passé par le thread dédié à exécuter les requêtes
+        self.worker_time_max_ns = 0
+
+    async def run(self, func, *args):
+        """Exécute func(conn, *args) dans une transaction, sur le thread dédié."""
+        start = time.perf_counter_ns()
+        future = asyncio.get_running_loop().run_in_executor(self.executor, self._execute, func, args)
+        self.loop_time_ns += time.perf_counter_ns() - start
+        return await future
+
+    def _execute(self, func, args):
+        start = time.perf_counter_ns()
+        try:
+            with self.conn:
+                return func(self.conn, *args)
+        finally:
+            elapsed = time.perf_counter_ns() - start
+            self.calls += 1
+            self.worker_time_ns += elapsed
+            if elapsed > self.worker_time_max_ns:
+                self.worker_time_max_ns = elapsed
+
+    async def open(self):
+        """Ouvre la base, crée le schéma et reprend les données des anciennes bases."""
+        await asyncio.get_running_loop().run_in_executor(self.executor, self._open)
+
+    def _open(self):
+        self.conn = sqlite3.connect(self.path, check_same_thread=False, cached_statements=256)
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute(f"PRAGMA synchronous = {SYNCHRONOUS_MODES[self.durability]}")
+        with self.conn:
+            for statement in SCHEMA:
+                self.conn.execute(statement)
+        for legacy_path, tables in LEGACY_DATABASES.items():
+            if os.path.exists(legacy_path):
+                self._migrate_legacy(legacy_path, tables)
+        self._refresh_canonical_keys()
+
+    def _migrate_legacy(self, legacy_path, tables):
+        """Copie (une seule fois) les tables d'une ancienne base, colonnes communes uniquement.
+
+        Plusieurs processus (launcher.py) peuvent ouvrir la base en même temps : la reprise
+        se fait sous verrou d'écriture (BEGIN IMMEDIATE) et l'indicateur « migrated » est
+        relu une fois le verrou obtenu, pour qu'un seul processus copie les données.
+        """
+        meta_key = f"migrated:{legacy_path}"
+        if self.conn.execute("SELECT 1 FROM meta WHERE key = ?", (meta_key,)).fetchone():
+            return
+        self.conn.execute("ATTACH DATABASE ? AS legacy", (legacy_path,))
+        try:
+            with self.conn:
+                self.conn.execute("BEGIN IMMEDIATE")
+                if self.conn.execute("SELECT 1 FROM meta WHERE key = ?", (meta_key,)).fetchone():
+                    return
+                legacy_version = self.conn.execute("PRAGMA legacy.user_version").fetchone()[0]
+                for table in tables:
+                    legacy_columns = [row[1] for row in self.conn.execute(f"PRAGMA legacy.table_info({table})")]
+                    if not legacy_columns:
+                        continue
+                    main_columns = {row[1] for row in self.conn.execute(f"PRAGMA main.table_info({table})")}
+                    columns = ", ".join(column for column in legacy_columns if column in main_columns)
+                    copied = self.conn.execute(f"INSERT OR IGNORE INTO main.{table} ({columns}) SELECT {columns} FROM legacy.{table}").rowcount
+                    log.info("Stockage : %d lignes reprises de %s (%s).", copied, legacy_path, table)
+                if "gif_config" in tables and legacy_version < GIF_HIERARCHY_VERSION:
+                    self._normalize_gif_config()
+                if "banned_gifs" in tables:
+                    self._backfill_canonical_keys()
+                self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (meta_key, str(int(time.time()))))
+        finally:
+            self.conn.execute("DETACH DATABASE legacy")
+
+    def _normalize_gif_config(self):
+        """Anciennes configurations GIF (une ligne complète par salon) : les valeurs par défaut deviennent
+        héritées, les valeurs manquantes aussi, et les lignes entièrement héritées sont supprimées."""
+        self.conn.execute(
+            f"UPDATE gif_config SET {', '.join(f'{column} = NULLIF({column}, ?)' for column in GIF_CONFIG_COLUMNS)} WHERE channel_id != ?",
+            (*DEFAULT_GIF_CONFIG, GUILD_DEFAULT_CHANNEL),
+        )
+        self.conn.execute(
+            f"DELETE FROM gif_config WHERE channel_id != ? AND {' AND '.join(f'{column} IS NULL' for column in GIF_CONFIG_COLUMNS)}",
+            (GUILD_DEFAULT_CHANNEL,),
+        )
+
+    def _refresh_canonical_keys(self):
+        """Recalcule les identifiants canoniques des GIF interdits après un changement de canonical_key
+        (par exemple, un domaine se terminant par « giphy.com » n'est plus pris pour Giphy)."""
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'canonical_key_version'").fetchone()
+        if row is not None and int(row[0]) >= CANONICAL_KEY_VERSION:
+            return
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            rows = self.conn.execute("SELECT server_id, gif_url, canonical_key FROM banned_gifs").fetchall()
+            updates = [(key, server_id, gif_url) for server_id, gif_url, old_key in rows if (key := canonical_key(gif_url)) != old_key]
+            self.conn.executemany("UPDATE banned_gifs SET canonical_key = ? WHERE server_id = ? AND gif_url = ?", updates)
+            self.conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('canonical_key_version', ?)", (str(CANONICAL_KEY_VERSION),),
+            )
+        if updates:
+            log.info("Stockage : %d identifiant(s) canonique(s) de GIF interdits recalculé(s).", len(updates))
+
+    def _backfill_canonical_keys(self):
+        rows = self.conn.execute("SELECT server_id, gif_url FROM banned_gifs WHERE canonical_key IS NULL").fetchall()
+        self.conn.executemany(
+            "UPDATE banned_gifs SET canonical_key = ? WHERE server_id = ? AND gif_url = ?",
+            [(canonical_key(gif_url), server_id, gif_url) for server_id, gif_url in rows],
+        )
+
+    async def _stage(self, key, values):
+        """Enregistre une modification en attente (écrite aussitôt si write_through)."""
+        self.pending[key] = values
+        if self.write_through:
+            await self.flush()
+        elif self.flush_timer is None:
+            self.flush_timer = asyncio.get_running_loop().call_later(self.flush_interval, self._start_flush)
+
+    def _start_flush(self):
+        self.flush_timer = None
+        self.flush_task = asyncio.create_task(self.flush())
+
+    async def flush(self):
+        """Écrit toutes les modifications en attente en une transaction. Renvoie le nombre de lignes écrites."""
+        if self.flush_timer is not None:
+            self.flush_timer.cancel()
+            self.flush_timer = None
+        if not self.pending:
+            return 0
+        batch, self.pending = self.pending, {}
+        try:
+            written = await self.run(self._write_batch, batch)
+        except Exception as e:
+            # Les modifications plus récentes, arrivées pendant l'écriture, restent prioritaires
+            for key, values in batch.items():
+                self.pending.setdefault(key, values)
+            log.error("Écriture des configurations en attente : %s", e)
+            if self.flush_timer is None and self.conn is not None:
+                self.flush_timer = asyncio.get_running_loop().call_later(max(self.flush_interval, 1), self._start_flush)
+            return 0
+        self.flushes += 1
+        self.flushed_rows += written
+        return written
+
+    @staticmethod
+    def _write_batch(conn, batch):
+        spam_rows = []
+        gif_rows = []
+        gif_deletes = []
+        for key, values in batch.items():
+            if key[0] == "spam_config":
+                spam_rows.append((key[1], *values))
+            elif values is None:
+                gif_deletes.append(key[1:])
+            else:
+                gif_rows.append((*key[1:], *values))
+        conn.executemany(REPLACE_SPAM_CONFIG, spam_rows)
+        conn.executemany(REPLACE_GIF_CONFIG, gif_rows)
+        conn.executemany(DELETE_GIF_CONFIG, gif_deletes)
+        return len(batch)
+
+    async def close(self):
+        """Écrit les modifications en attente puis ferme la base."""
+        if self.flush_task is not None:
+            await asyncio.gather(self.flush_task, return_exceptions=True)
+        if self.conn is not None:
+            await self.flush()
+            if self.flush_timer is not None:
+                self.flush_timer.cancel()
+                self.flush_timer = None
+            if self.pending:
+                log.error("%d configuration(s) non enregistrée(s) à la fermeture de la base.", len(self.pending))
+            await asyncio.get_running_loop().run_in_executor(self.executor, self.conn.close)
+            self.conn = None
+        self.executor.shutdown(wait=True)
+
+    def stats(self):
+        """Nombre de transactions, temps de blocage de la boucle d'événements et temps d'exécution (ms)."""
+        return {
+            "calls": self.calls,
+            "loop_ms": self.loop_time_ns / 1e6,
+            "worker_ms": self.worker_time_ns / 1e6,
+            "worker_max_ms": self.worker_time_max_ns / 1e6,
+            "pending": len(self.pending),
+            "flushes": self.flushes,
+            "flushed_rows": self.flushed_rows,
+        }
+
+    # Métadonnées (empreinte des commandes synchronisées, etc.)
+
+    async def get_meta(self, key):
+        return await self.run(lambda conn: (conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone() or (None,))[0])
+
+    async def set_meta(self, key, value):
+        await self.run(lambda conn: conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value)))
+
+    async def load_meta(self, prefix):
+        """{clé: valeur} des métadonnées dont la clé commence par prefix."""
+        return await self.run(lambda conn: dict(conn.execute(
+            "SELECT key, value FROM meta WHERE substr(key, 1, ?) = ?", (len(prefix), prefix)
+        ).fetchall()))
+
+    # Configuration anti-spam
+
+    async def load_spam_configs(self):
+        """{server_id: configuration} pour tous les serveurs configurés."""
+        return await self.run(lambda conn: {row[0]: row[1:] for row in conn.execute(SELECT_SPAM_CONFIGS)})
+
+    async def set_spam_config(self, server_id, config):
+        """Enregistre (en différé) la configuration complète d'un serveur, dans l'ordre de SPAM_CONFIG_COLUMNS."""
+        await self._stage(("spam_config", server_id), tuple(config))
+
+    # Configuration des limites de GIF
+
+    async def load_gif_configs(self):
+        """Lignes (server_id, channel_id, *GIF_CONFIG_COLUMNS), réglages des serveurs compris."""
+        return await self.run(lambda conn: conn.execute(SELECT_GIF_CONFIGS).fetchall())
+
+    async def set_gif_config(self, server_id, channel_id, values):
+        """Enregistre (en différé) les réglages d'un salon, ou ceux du serveur si channel_id vaut GUILD_DEFAULT_CHANNEL."""
+        await self._stage(("gif_config", server_id, channel_id), tuple(values))
+
+    async def delete_gif_config(self, server_id, channel_id):
+        await self._stage(("gif_config", server_id, channel_id), None)
+
+    # GIF interdits
+
+    async def load_banned_gifs(self):
+        """Lignes (server_id, gif_url, canonical_key)."""
+        return await self.run(lambda conn: conn.execute(SELECT_BANNED_GIFS).fetchall())
+
+    async def load_banned_gif_hashes(self):
+        """Lignes (server_id, source, empreinte signée)."""
+        return await self.run(lambda conn: conn.execute(SELECT_BANNED_GIF_HASHES).fetchall())
+
+    async def add_banned_gif(self, server_id, gif_url, key, aliases=()):
+        """Interdit un GIF et ses autres identifiants canoniques. Renvoie True s'il n'était pas déjà interdit."""
+        def add(conn):
+            if not conn.execute(INSERT_BANNED_GIF, (server_id, gif_url, key)).rowcount:
+                return False
+            conn.executemany(INSERT_BANNED_GIF_ALIAS, [(server_id, gif_url, alias) for alias in aliases])
+            return True
+        return await self.run(add)
+
+    async def add_banned_gif_hashes(self, server_id, source, signed_hashes):
+        await self.run(lambda conn: conn.executemany(INSERT_BANNED_GIF_HASH, [(server_id, source, phash) for phash in signed_hashes]))
+
+    async def remove_banned_gif(self, server_id, gif_url):
+        """Retire un GIF interdit. Renvoie les identifiants canoniques supprimés et, si des empreintes
+        ont été supprimées, les empreintes restantes du serveur (source, empreinte signée), sinon None."""
+        def remove(conn):
+            keys = [row[0] for row in conn.execute(SELECT_BANNED_GIF_KEYS, (server_id, gif_url, server_id, gif_url))]
+            conn.execute(DELETE_BANNED_GIF, (server_id, gif_url))
+            conn.execute(DELETE_BANNED_GIF_ALIASES, (server_id, gif_url))
+            if not conn.execute(DELETE_BANNED_GIF_HASHES, (server_id, gif_url)).rowcount:
+                return keys, None
+            return keys, conn.execute(SELECT_SERVER_BANNED_GIF_HASHES, (server_id,)).fetchall()
+        return await self.run(remove)
+
+    async def get_banned_gifs(self, server_id):
+        return await self.run(lambda conn: [row[0] for row in conn.execute(SELECT_SERVER_BANNED_GIFS, (server_id, server_id))])